@@ -0,0 +1 @@
+# graphforge benchmarks
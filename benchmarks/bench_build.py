@@ -0,0 +1,216 @@
+# benchmarks/bench_build.py
+"""
+build() / build_refactor_graph() のエンドツーエンドベンチマーク（ネットワーク・Ollama 不要）
+
+    python -m benchmarks.bench_build [--builds 5] [--group-sizes 1,4,12] [--parallel 1,4]
+                                     [--ttft 0.05] [--tps 2000] [--chars 1500] [--dist lognormal]
+                                     [--prefill-tps 1000] [--layouts shared,focused]
+                                     [--out benchmarks/results/xxx.json] [--baseline 前回の.json]
+
+LLM は benchmarks/fake_llm.py の模擬バックエンドに置き換え、モデルの遅延を固定した上で
+オーケストレーション側のコスト（スケジューリング・チェック・書き出し）を測る。
+group_size（同時生成数）× parallel（Ollama の同時リクエスト上限）の組み合わせごとに、
+スループット・p50/p95 のビルド時間・最大 RSS・ノードごとの所要時間とオーバーヘッドを JSON に保存する。
+--layouts で共通プレフィックス（shared）とファイルごとのセクション（focused）のプロンプト構成を比べる。
+"""
+import argparse
+import dataclasses
+import json
+import logging
+import pathlib
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any
+
+from benchmarks.fake_llm import DISTRIBUTIONS, FakeLLM, use_fake_llm
+import config
+from langgraph_v21 import llm
+from langgraph_v21.graph_build import build, prepare_state
+from langgraph_v21.llm_cache import get_cache
+from langgraph_v21.refactor_graph import build_refactor_graph, prepare_refactor_state
+from langgraph_v21.telemetry import load_trace, setup_logging
+
+DESIGN = """# Task manager
+- FastAPI backend with CRUD for tasks (title, done, due date)
+- React frontend listing tasks with a card per task
+"""
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * p
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def peak_rss_mb() -> float:
+    """プロセス開始以来の最大 RSS（Linux は KB、macOS は byte 単位で返る）。"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def stage_overhead(spans: list[dict[str, Any]]) -> dict[str, dict[str, float]]:
+    """ノードごとの所要時間と、そのうち LLM 待ち（最も長い LLM 呼び出し）以外の時間。"""
+    llm_time: dict[int, float] = {}
+    parents = {s["span_id"]: s.get("parent_id") for s in spans}
+    nodes = {s["span_id"] for s in spans if s.get("kind") == "node"}
+    for s in spans:
+        if s.get("kind") != "llm":
+            continue
+        # LLM スパンの祖先のノードに、最も長い呼び出しの時間を割り当てる
+        node = s.get("parent_id")
+        while node is not None and node not in nodes:
+            node = parents.get(node)
+        if node is not None:
+            llm_time[node] = max(llm_time.get(node, 0.0), s["duration"])
+    stages = {}
+    for s in spans:
+        if s.get("kind") == "node":
+            stages[s["name"]] = {"duration": s["duration"],
+                                 "overhead": max(s["duration"] - llm_time.get(s["span_id"], 0.0), 0.0)}
+    return stages
+
+
+def summarize(latencies: list[float], wall: float, stages: list[dict[str, dict[str, float]]]) -> dict[str, Any]:
+    names = list(dict.fromkeys(name for run in stages for name in run))
+    return {
+        "runs": len(latencies),
+        "throughput_per_hour": round(len(latencies) / wall * 3600, 1) if wall else 0.0,
+        "p50_sec": round(percentile(latencies, 0.5), 4),
+        "p95_sec": round(percentile(latencies, 0.95), 4),
+        "mean_sec": round(statistics.fmean(latencies), 4) if latencies else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stages": {
+            name: {
+                "mean_sec": round(statistics.fmean(r[name]["duration"] for r in stages if name in r), 4),
+                "overhead_sec": round(statistics.fmean(r[name]["overhead"] for r in stages if name in r), 4),
+            }
+            for name in names
+        },
+    }
+
+
+def bench_build(builds: int, group_size: int, workdir: pathlib.Path, backend: FakeLLM) -> dict[str, Any]:
+    """毎回新しい出力先でビルドする（前回の指紋による再利用・プロンプトキャッシュを持ち越さない）。"""
+    graph = build(group_size=group_size)
+    latencies, stages = [], []
+    wall = time.perf_counter()
+    for _ in range(builds):
+        backend.forget()
+        state = prepare_state(DESIGN, out_dir=tempfile.mkdtemp(prefix="build-", dir=workdir))
+        trace = setup_logging(state["project_dir"], level=logging.WARNING)
+        t = time.perf_counter()
+        graph.invoke(state)
+        latencies.append(time.perf_counter() - t)
+        stages.append(stage_overhead(load_trace(state["project_dir"], trace.build_id)))
+    return summarize(latencies, time.perf_counter() - wall, stages)
+
+
+def bench_refactor(runs: int, workdir: pathlib.Path) -> dict[str, Any]:
+    graph = build_refactor_graph()
+    latencies, stages = [], []
+    wall = time.perf_counter()
+    for i in range(runs):
+        state = prepare_refactor_state(
+            project_dir=workdir, target_file="main.py",
+            original_code="import os\n\nvalue = 1\n", prompt=f"Rename value (run {i})", sections="{}",
+        )
+        trace = setup_logging(str(workdir), level=logging.WARNING)
+        t = time.perf_counter()
+        graph.invoke(state)
+        latencies.append(time.perf_counter() - t)
+        stages.append(stage_overhead(load_trace(str(workdir), trace.build_id)))
+    return summarize(latencies, time.perf_counter() - wall, stages)
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any]):
+    """前回の結果と p50 / スループットを比べて表示する。"""
+    print(f"\n=== vs baseline ({baseline.get('revision')}) ===")
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        p50 = (result["p50_sec"] / base["p50_sec"] - 1) * 100 if base["p50_sec"] else 0.0
+        tput = (result["throughput_per_hour"] / base["throughput_per_hour"] - 1) * 100 \
+            if base["throughput_per_hour"] else 0.0
+        print(f"  {name:<32} p50 {p50:+6.1f}%  throughput {tput:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="build / refactor end-to-end benchmark (fake LLM)")
+    parser.add_argument("--builds", type=int, default=5, help="組み合わせごとのビルド回数")
+    parser.add_argument("--group-sizes", default="1,4,12", help="build(group_size) の値（カンマ区切り）")
+    parser.add_argument("--parallel", default="1,4", help="Ollama の同時リクエスト上限（カンマ区切り）")
+    parser.add_argument("--ttft", type=float, default=0.05, help="初トークンまでの平均秒数")
+    parser.add_argument("--tps", type=float, default=2000.0, help="生成速度（トークン / 秒）")
+    parser.add_argument("--chars", type=int, default=1500, help="応答の平均文字数")
+    parser.add_argument("--dist", choices=DISTRIBUTIONS, default="lognormal", help="遅延・サイズの分布")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--prefill-tps", type=float, default=1000.0, help="プロンプト評価速度（トークン / 秒）")
+    parser.add_argument("--layouts", default="shared,focused",
+                        help="プロンプト構成（shared: 共通プレフィックス / focused: ファイルごとのセクション）")
+    parser.add_argument("--out", default=None, help="結果 JSON の保存先（省略時 benchmarks/results/）")
+    parser.add_argument("--baseline", default=None, help="比較する前回の結果 JSON")
+    args = parser.parse_args()
+
+    group_sizes = [int(x) for x in args.group_sizes.split(",")]
+    parallels = [int(x) for x in args.parallel.split(",")]
+    layouts = args.layouts.split(",")
+    backend = FakeLLM(ttft=args.ttft, tokens_per_sec=args.tps, response_chars=args.chars,
+                      distribution=args.dist, seed=args.seed, prefill_tps=args.prefill_tps)
+    get_cache().bypass = True  # 毎回 LLM（模擬）まで到達させる
+    config.VALIDATE_BUILD = False  # 模擬応答は動くアプリではないのでスモーク検証は測らない
+
+    results: dict[str, Any] = {}
+    with use_fake_llm(backend), tempfile.TemporaryDirectory(prefix="graphforge-bench-") as tmp:
+        workdir = pathlib.Path(tmp)
+        for layout in layouts:
+            config.SHARED_PROMPT_PREFIX = layout == "shared"
+            for parallel in parallels:
+                llm.set_parallelism(parallel)
+                for group_size in group_sizes:
+                    name = f"build g={group_size} p={parallel} {layout}"
+                    results[name] = bench_build(args.builds, group_size, workdir, backend)
+                    r = results[name]
+                    print(f"  {name:<32} p50 {r['p50_sec']:7.3f}s  p95 {r['p95_sec']:7.3f}s  "
+                          f"{r['throughput_per_hour']:9.1f} builds/h  rss {r['peak_rss_mb']:.0f} MB")
+        results["refactor"] = bench_refactor(args.builds, workdir)
+        r = results["refactor"]
+        print(f"  {'refactor':<32} p50 {r['p50_sec']:7.3f}s  p95 {r['p95_sec']:7.3f}s  "
+              f"{r['throughput_per_hour']:9.1f} runs/h")
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "backend": {f.name: getattr(backend, f.name) for f in dataclasses.fields(backend) if f.init},
+        "layouts": layouts,
+        "builds": args.builds,
+        "results": results,
+    }
+    out = pathlib.Path(args.out) if args.out else \
+        pathlib.Path("benchmarks/results") / f"bench_build-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\n結果を保存しました → {out}")
+    if args.baseline:
+        compare(report, json.loads(pathlib.Path(args.baseline).read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# benchmarks/bench_import.py
+"""
+起動時の import コストのベンチマーク（python -X importtime）
+
+    python -m benchmarks.bench_import [--repeat 5] [--modules dashboard,langgraph_v21.jobs,...]
+                                      [--out benchmarks/results/xxx.json] [--baseline 前回の.json]
+
+モジュールごとに新しいインタープリタで `import X` だけを実行し、-X importtime の出力から
+インタープリタ起動分を除いた import 時間（repeat 回の最小値）と、重いパッケージの内訳を JSON に保存する。
+LIGHT_MODULES（ダッシュボードの再実行・CLI の起動で毎回読まれるもの）が HEAVY_PACKAGES を
+読み込んでいたら一覧に出し、終了コード 1 で返す。
+"""
+import argparse
+import json
+import pathlib
+import platform
+import subprocess
+import sys
+import time
+from typing import Any
+
+from benchmarks.bench_build import git_revision
+
+# ダッシュボード / ジョブキューから毎回読まれるモジュール
+LIGHT_MODULES = [
+    "langgraph_v21.checkpoint",
+    "langgraph_v21.jobs",
+    "langgraph_v21.llm",
+    "langgraph_v21.project_browser",
+    "langgraph_v21.router",
+    "langgraph_v21.telemetry",
+    "dashboard",
+    "dashboard_editor",
+]
+# ビルド・改修を実際に行うときだけ読まれるモジュール（比較用）
+BUILD_MODULES = ["langgraph_v21.graph_build", "langgraph_v21.refactor_graph", "langgraph_v21.batch_refactor"]
+HEAVY_PACKAGES = {"langgraph", "langchain_core", "langchain_ollama", "requests", "jinja2", "sqlalchemy"}
+TOP_PACKAGES = 8
+
+
+def importtime(code: str) -> tuple[list[tuple[int, int, int, str]], str | None]:
+    """([(indent, self_us, cumulative_us, name), ...], エラー)。import に失敗したらエラー出力の最後の行を返す。"""
+    res = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                         capture_output=True, text=True, cwd=pathlib.Path(__file__).resolve().parent.parent)
+    rows = []
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append(((len(name) - len(name.lstrip())) // 2, int(own), int(cumulative), name.strip()))
+    error = None
+    if res.returncode != 0:
+        error = next((l for l in reversed(res.stderr.splitlines()) if not l.startswith("import time:")), "error")
+    return rows, error
+
+
+def measure(module: str, startup: set[str]) -> dict[str, Any]:
+    """module の import 1 回分。startup はインタープリタ起動時に読まれるモジュール（除外する）。"""
+    rows, error = importtime(f"import {module}")
+    rows = [r for r in rows if r[3] not in startup]
+    # 内訳はトップレベルのパッケージごとの self 時間の合計（入れ子の import を二重に数えない）
+    packages: dict[str, int] = {}
+    for _, own, _, name in rows:
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0) + own
+    return {
+        "import_ms": round(sum(cumulative for indent, _, cumulative, _ in rows if indent == 0) / 1000, 2),
+        "modules": len(rows),
+        "heavy": sorted(set(packages) & HEAVY_PACKAGES),
+        "top": {name: round(us / 1000, 2)
+                for name, us in sorted(packages.items(), key=lambda kv: -kv[1])[:TOP_PACKAGES]},
+        "error": error,
+    }
+
+
+def bench_import(module: str, repeat: int, startup: set[str]) -> dict[str, Any]:
+    """repeat 回測って import 時間が最小の回を返す（OS のページキャッシュなどの揺らぎを除く）。"""
+    runs = [measure(module, startup) for _ in range(repeat)]
+    return min(runs, key=lambda r: r["import_ms"])
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any]):
+    print(f"\n=== vs baseline ({baseline.get('revision')}) ===")
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base["import_ms"] or result["error"] or base["error"]:
+            continue
+        print(f"  {name:<32} {base['import_ms']:8.1f} ms → {result['import_ms']:8.1f} ms "
+              f"({(result['import_ms'] / base['import_ms'] - 1) * 100:+6.1f}%)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="import-time benchmark (python -X importtime)")
+    parser.add_argument("--repeat", type=int, default=5, help="モジュールごとの計測回数（最小値を採る）")
+    parser.add_argument("--modules", default=",".join(LIGHT_MODULES + BUILD_MODULES), help="対象（カンマ区切り）")
+    parser.add_argument("--out", default=None, help="結果 JSON の保存先（省略時 benchmarks/results/）")
+    parser.add_argument("--baseline", default=None, help="比較する前回の結果 JSON")
+    args = parser.parse_args()
+
+    startup = {name for *_, name in importtime("pass")[0]}
+    results: dict[str, Any] = {}
+    violations = []
+    for module in args.modules.split(","):
+        r = results[module] = bench_import(module, args.repeat, startup)
+        if r["error"]:
+            print(f"  {module:<32} 計測できません: {r['error']}")
+            continue
+        top = ", ".join(f"{k} {v:.0f}" for k, v in list(r["top"].items())[:4])
+        print(f"  {module:<32} {r['import_ms']:8.1f} ms  {r['modules']:5d} modules  [{top}]")
+        if module in LIGHT_MODULES and r["heavy"]:
+            violations.append(f"{module}: {', '.join(r['heavy'])}")
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    out = pathlib.Path(args.out) if args.out else \
+        pathlib.Path("benchmarks/results") / f"bench_import-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\n結果を保存しました → {out}")
+    if args.baseline:
+        compare(report, json.loads(pathlib.Path(args.baseline).read_text(encoding="utf-8")))
+    if violations:
+        print("\n起動時に重いパッケージを読み込んでいます:\n  " + "\n  ".join(violations))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
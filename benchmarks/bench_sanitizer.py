@@ -0,0 +1,80 @@
+# benchmarks/bench_sanitizer.py
+"""
+LLM 出力クレンジングのマイクロベンチマーク
+
+    python -m benchmarks.bench_sanitizer [--kb 500] [--repeat 5]
+
+<think> が大きい数百 KB の応答で、旧 4 段階正規表現処理・一括クレンジング・
+トークン単位のストリームクレンジングを比較する。
+"""
+import argparse
+import random
+import re
+import time
+
+from langgraph_v21.sanitizer import Sanitizer, clean_llm_output
+
+
+def legacy_clean(text: str) -> str:
+    text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+    idx = text.rfind('```')
+    text = text[:idx] if idx != -1 else text
+    text = re.sub(r'^```[^\n]*\n', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\n```', '\n', text)
+    return re.sub(r'`([^`]*)`', lambda m: f"`{m.group(1).strip()}`", text).strip()
+
+
+def make_response(kb: int, seed: int = 0) -> str:
+    """think 6 割・コード 4 割の応答を作る。"""
+    rng = random.Random(seed)
+    words = ["def", "return", "self", "value", "`name`", "import", "x", "=", "(", ")", "# note"]
+    def lines(n_bytes):
+        out, size = [], 0
+        while size < n_bytes:
+            line = " ".join(rng.choice(words) for _ in range(rng.randint(3, 12)))
+            out.append(line)
+            size += len(line) + 1
+        return "\n".join(out)
+    think = lines(kb * 1024 * 6 // 10)
+    code = lines(kb * 1024 * 4 // 10)
+    return f"<think>\n{think}\n</think>\nHere is the file:\n```python\n{code}\n```\nHope this helps."
+
+
+def bench(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="sanitizer micro-benchmark")
+    parser.add_argument("--kb", type=int, default=500, help="応答サイズ (KB)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--token-size", type=int, default=8, help="ストリーム時の 1 トークンの文字数")
+    args = parser.parse_args()
+
+    text = make_response(args.kb)
+    tokens = [text[i:i + args.token_size] for i in range(0, len(text), args.token_size)]
+    assert clean_llm_output(text) == legacy_clean(text)
+
+    def stream():
+        s = Sanitizer()
+        for t in tokens:
+            s.feed(t)
+        s.finish()
+
+    results = {
+        "legacy_regex": bench(lambda: legacy_clean(text), args.repeat),
+        "clean_llm_output": bench(lambda: clean_llm_output(text), args.repeat),
+        f"stream({len(tokens)} tokens)": bench(stream, args.repeat),
+    }
+    print(f"response: {len(text) / 1024:.0f} KB")
+    for name, sec in results.items():
+        print(f"  {name:<28} {sec * 1000:8.2f} ms  ({len(text) / 1024 / 1024 / sec:7.1f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
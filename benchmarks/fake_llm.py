@@ -0,0 +1,122 @@
+# benchmarks/fake_llm.py
+"""
+ベンチマーク用の決定的な模擬 LLM バックエンド（ネットワーク・Ollama 不要）
+
+llm.DUMMY_BACKEND に差し替えて使う。応答の遅延とサイズはプロンプトのハッシュを種にした
+乱数で決まるので、同じ設定・同じプロンプトなら毎回同じ値になる。
+応答は生成中のファイルキーに合わせた、静的チェックを通る内容にする（修復ループを起こさない）。
+
+prefill_tps を指定するとプロンプト評価の時間も模擬する。最後のメッセージより前（system など）が
+以前のリクエストと一致すれば、その分は評価済みとして扱う（Ollama のプロンプトキャッシュの近似）。
+"""
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+from langgraph_v21 import llm
+from langgraph_v21.router import current_file
+
+DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+
+@dataclass
+class FakeLLM:
+    """
+    Args:
+        ttft: 初トークンまでの平均秒数
+        tokens_per_sec: 生成速度（トークン / 秒）。0 なら待たない
+        response_chars: 応答の平均文字数
+        distribution: 遅延・サイズのばらつき（fixed / uniform / lognormal）
+        chars_per_token: 1 トークンの文字数
+        seed: 乱数の種
+        prefill_tps: プロンプト評価速度（トークン / 秒）。0 なら待たない
+        prefix_cache: 評価済みの先頭メッセージを再評価しない
+    """
+    ttft: float = 0.05
+    tokens_per_sec: float = 400.0
+    response_chars: int = 2000
+    distribution: str = "lognormal"
+    chars_per_token: int = 4
+    seed: int = 0
+    prefill_tps: float = 0.0
+    prefix_cache: bool = True
+    _prefixes: set[str] = field(default_factory=set, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def forget(self):
+        """評価済みの先頭メッセージを忘れる（モデルのアンロード相当）。"""
+        with self._lock:
+            self._prefixes.clear()
+
+    def prefill_seconds(self, prompt: Any) -> float:
+        if not self.prefill_tps:
+            return 0.0
+        messages = llm.to_messages(prompt)
+        prefix = json.dumps(messages[:-1], ensure_ascii=False)
+        chars = sum(len(m["content"]) for m in messages)
+        with self._lock:
+            if self.prefix_cache and messages[:-1] and prefix in self._prefixes:
+                chars = len(messages[-1]["content"])
+            self._prefixes.add(prefix)
+        return chars / self.chars_per_token / self.prefill_tps
+
+    def _rng(self, prompt: Any) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}\0{prompt}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _sample(self, rng: random.Random, mean: float) -> float:
+        if self.distribution == "fixed" or mean <= 0:
+            return mean
+        if self.distribution == "uniform":
+            return rng.uniform(0.5 * mean, 1.5 * mean)
+        # 平均が mean になる対数正規分布（σ=0.5: 長い裾を持つ LLM レイテンシの近似）
+        sigma = 0.5
+        return rng.lognormvariate(0, sigma) * mean / math.exp(sigma ** 2 / 2)
+
+    def chat(self, prompt: Any) -> str:
+        rng = self._rng(prompt)
+        return render_response(current_file(), max(int(self._sample(rng, self.response_chars)), 16))
+
+    def stream(self, prompt: Any) -> Iterator[str]:
+        rng = self._rng(prompt)
+        text = render_response(current_file(), max(int(self._sample(rng, self.response_chars)), 16))
+        time.sleep(self._sample(rng, self.ttft) + self.prefill_seconds(prompt))
+        step = self.chars_per_token
+        delay = 1.0 / self.tokens_per_sec if self.tokens_per_sec else 0.0
+        for i in range(0, len(text), step):
+            if delay:
+                time.sleep(delay)
+            yield text[i:i + step]
+
+
+def render_response(filekey: str | None, size: int) -> str:
+    """ファイル種別ごとに、静的チェックを通るおよそ size 文字の本文を作る。"""
+    if filekey and filekey.endswith(".json"):
+        filler = "x" * max(size - 60, 0)
+        return json.dumps({"openapi": "3.0.0", "info": {"title": "bench", "description": filler}, "paths": {}})
+    if filekey and filekey.endswith((".jsx", ".js")):
+        lines = ["export default function Component() {"]
+        while sum(len(line) + 1 for line in lines) < size:
+            lines.append(f"  const value{len(lines)} = {len(lines)};")
+        return "\n".join(lines + ["  return null;", "}"])
+    lines = ["import os", ""]
+    while sum(len(line) + 1 for line in lines) < size:
+        lines.append(f"value_{len(lines)} = {len(lines)}")
+    return "\n".join(lines)
+
+
+@contextmanager
+def use_fake_llm(backend: FakeLLM) -> Iterator[FakeLLM]:
+    """with 内の LLM 呼び出しをすべて backend に送る。"""
+    saved = llm.USE_DUMMY, llm.DUMMY_BACKEND
+    llm.USE_DUMMY, llm.DUMMY_BACKEND = True, backend
+    try:
+        yield backend
+    finally:
+        llm.USE_DUMMY, llm.DUMMY_BACKEND = saved
@@ -1,20 +1,119 @@
+import os
+
 MODEL = "qwen3:8b"  # Consider "phi3" for faster inference (20s vs 30-60s per call)
 OLLAMA_BASE_URL = "http://localhost:11434"
-DEFAULT_GROUP_SIZE = 3
+FAST_MODEL = os.getenv("GRAPHFORGE_FAST_MODEL", "phi3")  # 定型ファイル向けの軽量モデル（未取得なら MODEL にフォールバック）
+# Ollama への同時リクエスト数（サーバーの OLLAMA_NUM_PARALLEL と合わせる）
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+LLM_CONNECT_TIMEOUT = 5.0   # 秒
+LLM_READ_TIMEOUT = 120.0    # 秒。トークン間の無応答の上限
+LLM_DEADLINE = 900.0        # 秒。1 リクエスト全体の期限
+LLM_MAX_RETRIES = 3
+LLM_RETRY_BACKOFF = 0.5     # 秒。リトライごとに倍（ジッター付き）
+# モデルを読み込んだままにする時間。アンロードされるとプロンプトキャッシュ（KV）も失われる
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# モデルのティア（langgraph_v21/router.py）。base_urls を複数並べると処理中の少ないサーバーへ振り分ける
+MODEL_TIERS = {
+    "default": {"model": MODEL, "base_urls": [OLLAMA_BASE_URL]},
+    "fast": {"model": FAST_MODEL, "base_urls": [OLLAMA_BASE_URL]},
+}
+# ファイルキーごとのティア。ここにないファイルは default
+FILE_MODEL_ROUTES = {
+    "frontend/vite.config.js": "fast",
+    "frontend/index.html": "fast",
+    ".github/workflows/test.yml": "fast",
+}
+DEFAULT_GROUP_SIZE = 12  # 同時に LLM へ投げる生成リクエスト数の上限（Ollama 側は OLLAMA_NUM_PARALLEL で調整）
+# 静的チェックで指摘されたファイルの修復リトライ（ファイルごと）
+MAX_REPAIR_ATTEMPTS = 2
+REPAIR_BACKOFF = 1.0  # 秒。試行ごとに倍にする
+# LLM 応答キャッシュ（langgraph_v21/llm_cache.py）
+LLM_CACHE_PATH = ".graphforge_cache/llm_cache.sqlite3"
+LLM_CACHE_MAX_ENTRIES = 5000
+LLM_CACHE_MAX_BYTES = 200 * 1024 * 1024
+LLM_CACHE_MAX_AGE = 30 * 24 * 3600  # 秒。None で無期限
+# 大きなファイルの改修（langgraph_v21/patching.py）: 指示に関係する関数・クラスだけを差分で直す
+REFACTOR_CHUNK_MIN_LINES = 200   # これ以上の行数の Python ファイルをユニット単位で改修する
+REFACTOR_UNIT_MAX_LINES = 120    # これより長いクラスはメソッドごとに分ける
+REFACTOR_UNIT_CONCURRENCY = 4    # 同時に改修するユニット数
+# 生成後のスモーク検証（langgraph_v21/validation.py）: main.py の起動と tests/test_main.py の実行。
+# 生成コードを実行するので既定はオフ（GRAPHFORGE_VALIDATE=1 で有効）
+VALIDATE_BUILD = os.getenv("GRAPHFORGE_VALIDATE", "0") != "0"
+VALIDATION_PYTHON = os.getenv("GRAPHFORGE_VALIDATION_PYTHON")  # 設定するとこの python で検証する（venv を作らない）
+VENV_CACHE_DIR = ".graphforge_cache/venvs"  # 依存の組み合わせごとの venv
+VENV_INSTALL_TIMEOUT = 600.0   # 秒
+VALIDATION_TIMEOUT = 60.0      # 秒。1 チェックあたり
+VALIDATION_MEMORY_MB = 2048
+VALIDATION_CPU_SECONDS = 120
+VALIDATION_WORKERS = os.cpu_count() or 2
+VALIDATION_BASE_PACKAGES = ["pytest", "httpx"]  # TestClient と pytest の実行に必要
+# 検証用の venv に入れてよいパッケージ（pip の名前）。プロジェクトの requirements.txt が全行バージョン固定なら
+# そちらを使い、そうでなければ import から求めたパッケージがすべてこの中にあるときだけ venv を作る
+VALIDATION_ALLOWED_PACKAGES = {
+    "fastapi", "starlette", "uvicorn", "pydantic", "pydantic-settings", "email-validator", "sqlalchemy",
+    "aiosqlite", "psycopg2-binary", "asyncpg", "pymysql", "alembic", "httpx", "requests", "pytest",
+    "pytest-asyncio", "python-multipart", "python-dotenv", "python-jose", "pyjwt", "passlib", "bcrypt",
+    "jinja2", "pyyaml", "orjson",
+}
+# import 名と pip のパッケージ名が異なるもの
+PIP_PACKAGE_NAMES = {
+    "yaml": "pyyaml", "jose": "python-jose", "jwt": "pyjwt", "multipart": "python-multipart",
+    "dotenv": "python-dotenv", "PIL": "pillow", "sklearn": "scikit-learn", "bs4": "beautifulsoup4",
+}
+# ダッシュボードのバックグラウンドジョブ（langgraph_v21/jobs.py）
+# LLM への同時リクエスト数は llm.py が base URL ごとに制限するので、ジョブを並べても Ollama は溢れない
+JOB_DB_PATH = ".graphforge_cache/jobs.sqlite3"
+JOB_WORKERS = int(os.getenv("GRAPHFORGE_JOB_WORKERS", "1"))
+# ビルドのチェックポイント（langgraph_v21/checkpoint.py）。生成物と混ざらないようプロジェクトの外に置く
+CHECKPOINT_DIR = ".graphforge_cache/checkpoints"
+# プロンプトに載せる設計セクション（langgraph_v21/context.py）
+# parse_design はこのキーを持つ JSON に構造化し、各ファイルには FILE_SECTIONS のセクションだけを全文で渡す
+DESIGN_SECTIONS = ["overview", "data_model", "api", "frontend", "testing", "deployment"]
+FILE_SECTIONS = {
+    "main.py": ["overview", "api"],
+    "schemas.py": ["data_model"],
+    "routes/*.py": ["api", "data_model"],
+    "tests/test_main.py": ["api", "testing"],
+    "openapi.json": ["api", "data_model"],
+    ".github/workflows/test.yml": ["testing", "deployment"],
+    "frontend/src/main.jsx": ["frontend"],
+    "frontend/src/App.jsx": ["frontend", "api"],
+    "frontend/src/pages/Home.jsx": ["frontend", "api"],
+    "frontend/src/components/*.jsx": ["frontend", "data_model"],
+    "frontend/package.json": ["frontend"],
+    "frontend/vite.config.js": ["frontend", "deployment"],
+    "frontend/index.html": ["overview", "frontend"],
+    "models.py": ["data_model"],
+    "database.py": ["data_model", "deployment"],
+}
+SECTION_TOKEN_BUDGET = 3000   # 1 プロンプトの設計セクション部分の上限（トークン）
+SECTION_SUMMARY_CHARS = 160   # 対象外セクションの要約の長さ
+CHARS_PER_TOKEN = 4           # トークン数の概算
+# 1 にすると全ファイル共通の system メッセージ（設計セクション全体）を先頭に置き、ファイルごとの指示をその後ろに付ける。
+# 先頭が一致するのでサーバー側のプロンプトキャッシュが効くが、1 件あたりのプロンプトは長くなる。
+# 既定（0）はファイルごとに必要なセクションだけを SECTION_TOKEN_BUDGET 内で送る
+SHARED_PROMPT_PREFIX = os.getenv("GRAPHFORGE_SHARED_PREFIX", "0") != "0"
+# ファイル計画（graph_build.file_plan）: 全プロジェクト共通のファイル + 設計のエンティティごとのファイル
 FILE_KEYS = [
     "main.py",
     "schemas.py",
-    "routes/task.py",
     "tests/test_main.py",
     "openapi.json",
     ".github/workflows/test.yml",
+    "frontend/src/main.jsx",
     "frontend/src/App.jsx",
     "frontend/src/pages/Home.jsx",
-    "frontend/src/components/TaskCard.jsx",
     "frontend/package.json",
     "frontend/vite.config.js",
     "frontend/index.html",
 ]
+# {name} は snake_case、{Name} は CamelCase のエンティティ名。設計にエンティティがなければ DEFAULT_ENTITIES
+ENTITY_FILE_KEYS = ["routes/{name}.py", "frontend/src/components/{Name}Card.jsx"]
+DEFAULT_ENTITIES = ["task"]
+MAX_ENTITIES = 8
+# DB 層（parse_db_schema → gen_db_files）。API / フロントエンドの生成と並行して作る
+DB_FILE_KEYS = ["models.py", "database.py", "docker-compose.yml"]
+DB_DEFAULTS = {"image": "postgres:16", "user": "app", "password": "app", "name": "app", "port": "5432"}
 
 DOCKER_COMPOSE_TEMPLATE = """
 version: '3.8'
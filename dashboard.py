@@ -2,11 +2,19 @@ import streamlit as st
 import json
 from pathlib import Path
 from datetime import datetime
+import time
 import uuid
-from langgraph_v21.graph_build import build, prepare_state, extract_python_dependencies, extract_node_dependencies
-from langgraph_v21.structure_writer import record_structure
-import ollama
-import traceback
+from langgraph_v21.checkpoint import has_checkpoint
+from langgraph_v21.deps import scan_dependencies
+from langgraph_v21.jobs import FAILED, QUEUED, RUNNING, get_queue
+from langgraph_v21.project_browser import (
+    PREVIEW_BYTES, build_zip, index_project, paginate, read_preview, summarize_state,
+)
+from langgraph_v21.router import get_router
+from langgraph_v21.sanitizer import strip_think
+from langgraph_v21.telemetry import critical_path, load_trace
+
+POLL_INTERVAL = 1.0  # 秒。実行中ジョブの状態を読み直す間隔
 
 def safe_write_file(path: Path, content: str):
     try:
@@ -26,23 +34,22 @@ def run_dashboard():
 
     user_input = st.chat_input("仕様アイデアを入力してみてください")
 
+    for msg in st.session_state.chat_history:
+        st.chat_message(msg["role"]).markdown(msg["content"])
+
     if user_input:
         st.session_state.chat_history.append({"role": "user", "content": user_input})
-        with st.spinner("LLM（Qwen3:8B）と対話中..."):
-            try:
-                response = ollama.chat(
-                    model="qwen3:8b",
-                    messages=st.session_state.chat_history
-                )
-                assistant_reply = response['message']['content']
-            except Exception as e:
-                st.error(f"❌ LLM応答失敗: {e}")
-                st.stop()
+        st.chat_message("user").markdown(user_input)
+        # 応答はトークン単位で受信しながら表示する
+        try:
+            assistant_reply = st.chat_message("assistant").write_stream(
+                strip_think(get_router().stream(st.session_state.chat_history))
+            )
+        except Exception as e:
+            st.error(f"❌ LLM応答失敗: {e}")
+            st.stop()
         st.session_state.chat_history.append({"role": "assistant", "content": assistant_reply})
 
-    for msg in st.session_state.chat_history:
-        st.chat_message(msg["role"]).markdown(msg["content"])
-
     st.divider()
     st.header("📄 LLM対話から仕様.mdを生成して編集")
 
@@ -76,17 +83,8 @@ def run_dashboard():
             st.error(f"❌ プロジェクトディレクトリ作成失敗: {project_path} - {e}")
             st.stop()
 
-        st.code(md, language="markdown")
-        st.write("📥 仕様書のLangGraph渡し → `.md → AppState → build().invoke()`")
-
-        with st.spinner("⚙️ LangGraphでコードを生成中..."):
-            try:
-                state = prepare_state(md, out_dir=str(app_path))
-                result = build().invoke(state)
-                record_structure(state)
-
-                readme_path = app_path / "README.md"
-                readme_content = f"""# {project_name}
+        readme_path = app_path / "README.md"
+        readme_content = f"""# {project_name}
 
 このプロジェクトは LangGraph により自動生成されました。
 
@@ -101,49 +99,141 @@ cd {app_path.as_posix()}
 python main.py
 ```
 """
-                safe_write_file(readme_path, readme_content)
-
-                st.success(f"🎉 コード生成成功！プロジェクト: `{project_name}`")
-                st.markdown("### 📂 出力ファイル一覧")
-                for path in sorted(app_path.rglob("*")):
-                    if path.is_file():
-                        st.markdown(f"- `{path.relative_to(app_path)}`")
-                        try:
-                            with open(path, "rb") as f:
-                                st.download_button(f"📥 {path.name}", data=f.read(), file_name=path.name)
-                        except Exception as e:
-                            st.warning(f"⚠️ ダウンロード準備失敗: {path.name} - {e}")
-
-                st.text_input("📝 プロジェクト名をリネーム", value=project_name, key="rename_target")
-
-                st.write("🧪 LangGraphの戻り値:")
-                st.json(result)
-
-                main_py = app_path / "main.py"
-                if main_py.exists():
-                    st.markdown("### 🧪 ローカル実行方法（main.py あり）")
-                    st.code(f"cd {app_path.as_posix()}\npython main.py", language="bash")
-
-                st.markdown("## 🧩 依存モジュール")
-
-                st.subheader("🐍 Python依存モジュール")
-                py_deps = extract_python_dependencies(str(app_path))
-                if py_deps:
-                    st.code("pip install " + " ".join(sorted(py_deps)), language="bash")
-                    req_txt = "\n".join(sorted(py_deps))
-                    (app_path / "requirements.txt").write_text(req_txt, encoding="utf-8")
-                    st.success("📄 requirements.txt を自動生成しました。")
-                else:
-                    st.info("📦 外部依存モジュールは検出されませんでした。")
-
-                st.subheader("📦 Node.js依存モジュール")
-                node_deps = extract_node_dependencies(str(app_path))
-                if node_deps:
-                    st.code("npm install", language="bash")
-                    st.json(node_deps)
-                else:
-                    st.info("📦 frontend/package.json が見つからないか、依存定義がありません。")
-
-            except Exception as e:
-                st.error(f"❌ LangGraph実行エラー: {type(e).__name__} - {e}")
-                st.code(traceback.format_exc(), language="python")
\ No newline at end of file
+        safe_write_file(readme_path, readme_content)
+
+        # 生成はバックグラウンドのジョブで実行し、ページを再読み込みしても続行・再表示できるようにする
+        job_id = get_queue().submit("build", {"design": md, "project_dir": str(app_path)})
+        st.session_state.build_job = job_id
+        st.query_params["build_job"] = job_id
+
+    job_id = st.session_state.get("build_job") or st.query_params.get("build_job")
+    if job_id:
+        show_build_job(job_id)
+
+    with st.expander("🗂 最近のビルドジョブ"):
+        for job in get_queue().list(limit=10, kind="build"):
+            label = f"{job['id']} — {job['status']} — {Path(job['payload']['project_dir']).parent.name}"
+            if st.button(label, key=f"job-{job['id']}"):
+                st.session_state.build_job = job["id"]
+                st.query_params["build_job"] = job["id"]
+                st.rerun()
+
+def show_build_job(job_id: str):
+    queue = get_queue()
+    job = queue.get(job_id)
+    if job is None:
+        st.warning(f"⚠️ ジョブが見つかりません: {job_id}")
+        return
+
+    app_path = Path(job["payload"]["project_dir"])
+    project_name = app_path.parent.name
+    st.code(job["payload"]["design"], language="markdown")
+    st.write(f"📥 ジョブ `{job_id}`: `.md → AppState → build()` — 状態: **{job['status']}**")
+    if job["progress"]:
+        st.code("\n".join(job["progress"][-20:]), language="text")
+
+    if job["status"] in (QUEUED, RUNNING):
+        if job["status"] == QUEUED:
+            st.info(f"⏳ 実行待ち（前に {queue.position(job_id)} 件）")
+        else:
+            st.info("⚙️ LangGraphでコードを生成中...（ページを閉じても生成は続きます）")
+        time.sleep(POLL_INTERVAL)
+        st.rerun()
+    if job["status"] == FAILED:
+        st.error(f"❌ LangGraph実行エラー: {job['error']}")
+        if has_checkpoint(str(app_path)) and st.button("▶️ 中断したところから再開", key=f"resume-{job_id}"):
+            new_id = queue.submit("build", dict(job["payload"], resume=True))
+            st.session_state.build_job = new_id
+            st.query_params["build_job"] = new_id
+            st.rerun()
+        return
+
+    result = job["result"] or {}
+    st.success(f"🎉 コード生成成功！プロジェクト: `{project_name}`")
+    show_project_browser(app_path, project_name)
+
+    st.text_input("📝 プロジェクト名をリネーム", value=project_name, key="rename_target")
+
+    # 畳んだ状態では描画しない（ファイル本文は要約してサイズだけ表示）
+    if st.toggle("🧪 LangGraphの戻り値を表示", key=f"state-{job_id}"):
+        st.json(summarize_state(result))
+
+    show_critical_path(app_path, result.get("build_id"))
+
+    main_py = app_path / "main.py"
+    if main_py.exists():
+        st.markdown("### 🧪 ローカル実行方法（main.py あり）")
+        st.code(f"cd {app_path.as_posix()}\npython main.py", language="bash")
+
+    st.markdown("## 🧩 依存モジュール")
+
+    st.subheader("🐍 Python依存モジュール")
+    deps = result.get("deps") or scan_dependencies(str(app_path))
+    py_deps = deps["python"]
+    if py_deps:
+        st.code("pip install " + " ".join(sorted(py_deps)), language="bash")
+        if (app_path / "requirements.txt").exists():
+            st.success("📄 requirements.txt をビルド時に生成しました。")
+    else:
+        st.info("📦 外部依存モジュールは検出されませんでした。")
+
+    st.subheader("📦 Node.js依存モジュール")
+    node_deps = deps["node"]
+    if node_deps:
+        st.code("npm install", language="bash")
+        st.json(node_deps)
+    else:
+        st.info("📦 frontend/package.json が見つからないか、依存定義がありません。")
+
+def show_project_browser(app_path: Path, project_name: str):
+    """出力ファイルをページ単位で一覧し、選んだファイルだけを読み込む。"""
+    st.markdown("### 📂 出力ファイル一覧")
+    entries = index_project(app_path)
+    total = sum(e["size"] for e in entries)
+    st.caption(f"{len(entries)} ファイル / {total / 1024:.1f} KB")
+
+    query = st.text_input("🔍 パスで絞り込み", key=f"browse-q-{project_name}")
+    page_key = f"browse-p-{project_name}"
+    page_entries, pages = paginate(entries, st.session_state.get(page_key, 1), query)
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages  # 絞り込みでページ数が減った
+    if pages > 1:
+        st.number_input("ページ", min_value=1, max_value=pages, step=1, key=page_key)
+    selected = st.selectbox(
+        "ファイル", [e["path"] for e in page_entries], index=None, placeholder="表示するファイルを選択",
+        format_func=lambda p: next(f"{p}（{e['size']:,} B）" for e in page_entries if e["path"] == p),
+        key=f"browse-f-{project_name}",
+    )
+    if selected:
+        try:
+            text, truncated = read_preview(app_path, selected)
+        except Exception as e:
+            st.warning(f"⚠️ 読み込み失敗: {selected} - {e}")
+        else:
+            st.code(text, language=Path(selected).suffix.lstrip(".") or None)
+            if truncated:
+                st.caption(f"先頭 {PREVIEW_BYTES // 1024} KB のみ表示しています。全体は zip でダウンロードしてください。")
+
+    # zip はボタンを押したときだけ作る（内容が変わらなければ前回の zip を使う）
+    if st.button("📦 プロジェクトを zip にまとめる", key=f"zip-{project_name}"):
+        st.session_state[f"zip-{project_name}"] = str(build_zip(app_path, project_name))
+    zip_path = st.session_state.get(f"zip-{project_name}")
+    if zip_path and Path(zip_path).exists():
+        with open(zip_path, "rb") as f:
+            st.download_button(f"📥 {project_name}.zip", data=f, file_name=f"{project_name}.zip",
+                               mime="application/zip", key=f"dl-zip-{project_name}")
+
+def show_critical_path(app_path: Path, build_id: str | None):
+    """ビルドのトレースから、所要時間を決めたノード / ファイルを表示する。"""
+    spans = load_trace(str(app_path), build_id)
+    if not spans:
+        return
+    st.markdown("### ⏱ クリティカルパス")
+    rows = critical_path(spans)
+    st.bar_chart({r["node"]: r["duration"] for r in rows})
+    st.dataframe(rows, use_container_width=True)
+    llm = [s for s in spans if s.get("kind") == "llm"]
+    hits = sum(1 for s in llm if s.get("cache") == "hit")
+    retries = sum(s.get("retries", 0) for s in llm)
+    total = sum(r["duration"] for r in rows)
+    st.caption(f"合計 {total:.1f}s / LLM 呼び出し {len(llm)} 回（キャッシュヒット {hits}・リトライ {retries}）")
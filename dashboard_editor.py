@@ -1,8 +1,11 @@
 import streamlit as st
 from pathlib import Path
-import json
 import difflib
-from langgraph_v21.refactor_graph import build_refactor_graph, prepare_refactor_state
+import time
+from langgraph_v21.jobs import FAILED, QUEUED, RUNNING, get_queue
+from langgraph_v21.project_browser import list_projects, load_json
+
+POLL_INTERVAL = 1.0  # 秒。実行中ジョブの状態を読み直す間隔
 
 
 def load_structure(struct_dir: Path):
@@ -11,7 +14,8 @@ def load_structure(struct_dir: Path):
         st.warning("structure.json が存在しません。設計構造が不明です。")
         return None
     try:
-        return json.loads(structure_path.read_text(encoding="utf-8"))
+        # 再実行のたびに読み直さないよう、更新されていなければ前回の内容を使う
+        return load_json(structure_path)
     except Exception as e:
         st.error(f"❌ structure.json の読み込みエラー: {e}")
         return None
@@ -22,7 +26,7 @@ def refactor_ui():
     st.header("🔧 既存コード改修（LangGraphワークフロー付き）")
 
     build_root = Path("build")
-    available_projects = sorted([p.name for p in build_root.iterdir() if p.is_dir()])
+    available_projects = list_projects(build_root)
     selected_project = st.selectbox("📁 改修対象プロジェクトを選択", available_projects)
 
     if not selected_project:
@@ -68,6 +72,11 @@ def refactor_ui():
             st.info("このプロジェクトには対象ファイルが記録されていません。")
             return
 
+    mode = st.radio("🗂 改修モード", ["単一ファイル", "複数ファイル一括"], horizontal=True)
+    if mode == "複数ファイル一括":
+        batch_refactor_ui(struct_dir, structure, file_options)
+        return
+
     target_file = st.selectbox("✏️ 改修対象ファイルを選択", file_options)
     # 初期パス: プロジェクト直下
     full_path = code_root / target_file
@@ -106,38 +115,132 @@ def refactor_ui():
             st.session_state.confirm_ready = True
 
     if st.session_state.confirm_ready and st.button("🛠 改修を実行"):
-        with st.spinner("LangGraph ワークフロー実行中..."):
-            try:
-                state = prepare_refactor_state(
-                    project_dir=struct_dir,
-                    target_file=target_file,
-                    original_code=original_code,
-                    prompt=refactor_prompt,
-                    sections=structure.get("sections", "")
-                )
-                graph = build_refactor_graph()
-                result = graph.invoke(state)
-
-                revised = result.get("revised_code", "")
-
-                st.subheader("🆕 改修後コード（プレビュー）")
-                st.code(revised, language=lang)
-
-                diff = difflib.unified_diff(
-                    original_code.splitlines(),
-                    revised.splitlines(),
-                    fromfile="元コード",
-                    tofile="改修後コード",
-                    lineterm=""
-                )
-                st.subheader("🔀 差分プレビュー")
-                st.code("\n".join(diff), language="diff")
-
-                if st.button("💾 上書き保存"):
-                    full_path.write_text(revised, encoding="utf-8")
-                    st.success("✅ ファイルを保存しました。")
-            except Exception as e:
-                st.error(f"❌ 改修中にエラーが発生しました: {e}")
+        # 改修はバックグラウンドのジョブで実行し、再読み込み後もジョブ ID から結果を表示する
+        job_id = get_queue().submit("refactor", {
+            "project_dir": str(struct_dir),
+            "target_file": target_file,
+            "original_code": original_code,
+            "prompt": refactor_prompt,
+            "sections": structure.get("sections", ""),
+        })
+        st.session_state.refactor_job = job_id
+        st.query_params["refactor_job"] = job_id
+
+    job_id = st.session_state.get("refactor_job") or st.query_params.get("refactor_job")
+    if job_id:
+        show_refactor_job(job_id, target_file, full_path, lang)
+
+def show_refactor_job(job_id: str, target_file: str, full_path: Path, lang: str | None):
+    queue = get_queue()
+    job = queue.get(job_id)
+    if job is None:
+        st.warning(f"⚠️ ジョブが見つかりません: {job_id}")
+        return
+    if job["payload"]["target_file"] != target_file:
+        st.info(f"ℹ️ 直前の改修ジョブ `{job_id}` は {job['payload']['target_file']} が対象です。")
+        return
+
+    if job["status"] in (QUEUED, RUNNING):
+        if job["status"] == QUEUED:
+            st.info(f"⏳ 実行待ち（前に {queue.position(job_id)} 件）")
+        else:
+            # 改修コードは受信しながらプレビューする
+            st.subheader("⏳ 改修コード受信中")
+            st.code(job["partial"], language=lang)
+        time.sleep(POLL_INTERVAL)
+        st.rerun()
+    if job["status"] == FAILED:
+        st.error(f"❌ 改修中にエラーが発生しました: {job['error']}")
+        return
+
+    original_code = job["payload"]["original_code"]
+    revised = (job["result"] or {}).get("revised_code", "")
+
+    st.subheader("🆕 改修後コード（プレビュー）")
+    st.code(revised, language=lang)
+
+    # ユニット単位で改修した場合は、改修したユニットだけの差分が結果に入っている
+    diff = (job["result"] or {}).get("diff") or "\n".join(difflib.unified_diff(
+        original_code.splitlines(),
+        revised.splitlines(),
+        fromfile="元コード",
+        tofile="改修後コード",
+        lineterm=""
+    ))
+    st.subheader("🔀 差分プレビュー")
+    st.code(diff, language="diff")
+
+    if st.button("💾 上書き保存"):
+        full_path.write_text(revised, encoding="utf-8")
+        st.success("✅ ファイルを保存しました。")
+
+def batch_refactor_ui(struct_dir: Path, structure: dict, file_options: list[str]):
+    """1 つの指示で複数ファイルをまとめて改修する。対象を選ばなければ指示に出てくる識別子から自動で選ぶ。"""
+    targets = st.multiselect("✏️ 改修対象ファイル（空なら自動選択）", file_options)
+    batch_prompt = st.text_area("📝 改修指示（例: `due_date` を deadline に改名）", height=120, key="batch_prompt")
+
+    if st.button("🛠 一括改修を実行"):
+        if len(batch_prompt.strip()) < 10:
+            st.warning("⚠️ 指示が短すぎます。もう少し詳しく書いてください。")
+        else:
+            job_id = get_queue().submit("batch_refactor", {
+                "project_dir": str(struct_dir),
+                "prompt": batch_prompt,
+                "sections": structure.get("sections", ""),
+                "files": targets,
+            })
+            st.session_state.batch_job = job_id
+            st.query_params["batch_job"] = job_id
+
+    job_id = st.session_state.get("batch_job") or st.query_params.get("batch_job")
+    if job_id:
+        show_batch_job(job_id)
+
+
+def show_batch_job(job_id: str):
+    queue = get_queue()
+    job = queue.get(job_id)
+    if job is None:
+        st.warning(f"⚠️ ジョブが見つかりません: {job_id}")
+        return
+    if job["status"] in (QUEUED, RUNNING):
+        if job["status"] == QUEUED:
+            st.info(f"⏳ 実行待ち（前に {queue.position(job_id)} 件）")
+        else:
+            st.info("⏳ 一括改修を実行中…")
+        time.sleep(POLL_INTERVAL)
+        st.rerun()
+    if job["status"] == FAILED:
+        st.error(f"❌ 改修中にエラーが発生しました: {job['error']}")
+        return
+
+    result = job["result"] or {}
+    diffs = result.get("diffs") or {}
+    st.write(f"対象: {', '.join(result.get('files') or [])}")
+    if not diffs:
+        st.info("変更はありませんでした。")
+        return
+    for key, diff in diffs.items():
+        with st.expander(f"🔀 {key}", expanded=len(diffs) <= 3):
+            st.code(diff, language="diff")
+
+    checked = result.get("check_result") == "OK"
+    if checked:
+        st.success("✅ 整合性チェック: OK")
+    else:
+        st.warning(f"⚠️ 整合性チェック: {result.get('check_result')}")
+        # チェックを通らなかった改修は、明示的に確認したときだけ保存できる
+        checked = st.checkbox("整合性チェックの問題を確認したうえで保存する", key=f"force_save_{job_id}")
+    if st.button("💾 すべて保存", disabled=not checked):
+        # batch_refactor は LangGraph ごと読み込むので、保存するときだけ import する
+        from langgraph_v21.batch_refactor import apply_changes
+        try:
+            apply_changes(job["payload"]["project_dir"], {k: result["revised"][k] for k in diffs})
+        except Exception as e:
+            st.error(f"❌ 保存に失敗しました（どのファイルも変更していません）: {e}")
+        else:
+            st.success(f"✅ {len(diffs)} ファイルを保存しました。")
+
 
 if __name__ == "__main__":
     refactor_ui()
\ No newline at end of file
@@ -0,0 +1,203 @@
+# langgraph_v21/batch.py
+"""
+設計文書をまとめてビルドする非対話のバッチ CLI（夜間のサンプル再生成など）
+
+    python -m langgraph_v21.batch SPECS [--out-dir build/batch] [--concurrency 4] [--llm-parallel 4]
+                                        [--group-size 12] [--no-cache] [--skip-done]
+
+SPECS は設計文書（*.md / *.txt）を置いたディレクトリ、または 1 行 1 件の JSONL
+（{"name": "...", "design": "..."}）。コンパイル済みのグラフ・HTTP セッション・LLM キャッシュは全ビルドで共有し、
+Ollama への同時リクエスト数は llm.set_parallelism で Ollama サーバー（base URL）ごとに抑える
+（全ビルド合計での上限。ルーターが複数のサーバーを使う場合、全体では --llm-parallel × サーバー数まで並ぶ）。
+1 件終わるごとに <out-dir>/manifest.json（プロジェクトごとの状態・所要時間と、時間あたりのプロジェクト数）を更新する。
+"""
+import argparse
+import contextvars
+import json
+import logging
+import os
+import pathlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, TypedDict
+
+import config
+from langgraph_v21 import llm
+from langgraph_v21.graph_build import get_build_graph, prepare_state
+from langgraph_v21.llm_cache import get_cache
+from langgraph_v21.structure_writer import record_structure
+from langgraph_v21.telemetry import setup_logging
+
+MANIFEST_FILE = "manifest.json"
+SPEC_SUFFIXES = (".md", ".markdown", ".txt")
+OK, ISSUES, FAILED = "ok", "issues", "failed"
+
+
+class Spec(TypedDict):
+    name: str
+    design: str
+
+
+class ProjectResult(TypedDict):
+    name: str
+    project_dir: str
+    status: str              # ok / issues（静的チェックの指摘が残った）/ failed（例外）
+    seconds: float
+    build_id: str | None
+    check_result: str | None
+    written: int
+    error: str | None
+
+
+# ---------- 入力 ----------
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "-", name).strip("-") or "spec"
+
+
+def load_specs(path: str | pathlib.Path) -> list[Spec]:
+    """ディレクトリ（ファイル 1 つが 1 件）または JSONL から設計文書を読む。名前の重複には連番を付ける。"""
+    path = pathlib.Path(path)
+    specs: list[Spec] = []
+    if path.is_dir():
+        for p in sorted(path.iterdir()):
+            if p.is_file() and p.suffix.lower() in SPEC_SUFFIXES:
+                specs.append(Spec(name=p.stem, design=p.read_text(encoding="utf-8")))
+    else:
+        for i, line in enumerate(path.read_text(encoding="utf-8").splitlines(), 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            design = item.get("design") or item.get("spec")
+            if not design:
+                raise ValueError(f"{path}:{i}: design がありません")
+            specs.append(Spec(name=str(item.get("name") or item.get("id") or f"spec-{i}"), design=design))
+    seen: dict[str, int] = {}
+    for spec in specs:
+        base = _slug(spec["name"])
+        seen[base] = seen.get(base, 0) + 1
+        spec["name"] = base if seen[base] == 1 else f"{base}-{seen[base]}"
+    return specs
+
+
+# ---------- マニフェスト ----------
+def load_manifest(out_dir: str | pathlib.Path) -> dict[str, Any]:
+    path = pathlib.Path(out_dir) / MANIFEST_FILE
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+
+
+def write_manifest(out_dir: str | pathlib.Path, manifest: dict[str, Any]):
+    path = pathlib.Path(out_dir) / MANIFEST_FILE
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def projects_per_hour(count: int, wall: float) -> float:
+    return round(count / wall * 3600, 1) if wall > 0 else 0.0
+
+
+# ---------- 実行 ----------
+def run_one(graph, spec: Spec, out_dir: pathlib.Path) -> ProjectResult:
+    state = prepare_state(spec["design"], out_dir=str(out_dir / spec["name"] / "app"))
+    trace = setup_logging(state["project_dir"], level=logging.WARNING)
+    started = time.perf_counter()
+    try:
+        result = graph.invoke(state)
+        record_structure(result)
+    except Exception as e:
+        return ProjectResult(name=spec["name"], project_dir=state["project_dir"], status=FAILED,
+                             seconds=round(time.perf_counter() - started, 3), build_id=trace.build_id,
+                             check_result=None, written=0, error=f"{type(e).__name__}: {e}")
+    check = result.get("check_result")
+    return ProjectResult(name=spec["name"], project_dir=state["project_dir"],
+                         status=OK if check == "OK" else ISSUES,
+                         seconds=round(time.perf_counter() - started, 3), build_id=trace.build_id,
+                         check_result=check, written=len(result.get("written", [])), error=None)
+
+
+def run_batch(specs: list[Spec], out_dir: str | pathlib.Path, concurrency: int = 2,
+              group_size: int = config.DEFAULT_GROUP_SIZE, skip_done: bool = False, graph=None) -> dict[str, Any]:
+    """
+    specs を concurrency 件ずつ同時にビルドし、マニフェストを返す（out_dir にも書き出す）。
+
+    Args:
+        skip_done: 前回のマニフェストで ok だったプロジェクトは作り直さない
+        graph: 共有するコンパイル済みグラフ（省略時 get_build_graph(group_size)）
+    """
+    out_dir = pathlib.Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    previous = {p["name"]: p for p in load_manifest(out_dir).get("projects", [])} if skip_done else {}
+    graph = graph or get_build_graph(group_size)
+
+    results: dict[str, ProjectResult] = {
+        s["name"]: previous[s["name"]] for s in specs if previous.get(s["name"], {}).get("status") == OK
+    }
+    todo = [s for s in specs if s["name"] not in results]
+    manifest: dict[str, Any] = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "concurrency": concurrency,
+        "group_size": group_size,
+        "skipped": sorted(results),
+    }
+    lock = threading.Lock()
+    wall = time.perf_counter()
+
+    def update(result: ProjectResult | None = None):
+        with lock:
+            if result is not None:
+                results[result["name"]] = result
+            done = [results[s["name"]] for s in specs if s["name"] in results]
+            elapsed = time.perf_counter() - wall
+            built = [r for r in done if r["name"] not in manifest["skipped"]]
+            manifest.update(
+                wall_sec=round(elapsed, 3),
+                counts={status: sum(1 for r in done if r["status"] == status) for status in (OK, ISSUES, FAILED)},
+                projects_per_hour=projects_per_hour(len(built), elapsed),
+                projects=done,
+            )
+            write_manifest(out_dir, manifest)
+
+    update()
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        # ビルドごとに別のコンテキストで実行し、トレースを混ぜない
+        futures = [pool.submit(contextvars.copy_context().run, run_one, graph, spec, out_dir) for spec in todo]
+        for future in as_completed(futures):
+            result = future.result()
+            update(result)
+            print(f"  [{result['status']:<6}] {result['name']:<32} {result['seconds']:8.1f}s"
+                  + (f"  {result['error']}" if result["error"] else ""))
+    manifest["finished"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    update()
+    return manifest
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="設計文書のディレクトリ / JSONL をまとめてビルドする")
+    parser.add_argument("specs", help="設計文書（*.md / *.txt）のディレクトリ、または JSONL")
+    parser.add_argument("--out-dir", "-o", default="build/batch", help="出力先（プロジェクトごとにサブフォルダを作る）")
+    parser.add_argument("--concurrency", "-c", type=int, default=2, help="同時に走らせるビルド数")
+    parser.add_argument("--llm-parallel", type=int, default=config.OLLAMA_NUM_PARALLEL,
+                        help="Ollama サーバー（base URL）ごとの、全ビルド合計での同時リクエスト数の上限")
+    parser.add_argument("--group-size", "-g", type=int, default=config.DEFAULT_GROUP_SIZE, help="1 ビルド内の同時生成数")
+    parser.add_argument("--no-cache", action="store_true", help="LLM 応答キャッシュを使わない")
+    parser.add_argument("--skip-done", action="store_true", help="前回のマニフェストで ok のプロジェクトを飛ばす")
+    args = parser.parse_args(argv)
+
+    specs = load_specs(args.specs)
+    if not specs:
+        parser.error(f"設計文書が見つかりません: {args.specs}")
+    get_cache().bypass = args.no_cache
+    llm.set_parallelism(args.llm_parallel)
+    print(f"{len(specs)} 件をビルドします（同時 {args.concurrency} 件 / LLM 同時 {args.llm_parallel}/サーバー）→ {args.out_dir}")
+    manifest = run_batch(specs, args.out_dir, args.concurrency, args.group_size, args.skip_done)
+    counts = manifest["counts"]
+    print(f"\nok={counts[OK]} issues={counts[ISSUES]} failed={counts[FAILED]}  "
+          f"{manifest['projects_per_hour']} projects/h（{manifest['wall_sec']:.0f}s）"
+          f"\nマニフェスト → {pathlib.Path(args.out_dir) / MANIFEST_FILE}")
+    return 1 if counts[FAILED] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,249 @@
+# langgraph_v21/batch_refactor.py
+"""
+1 つの指示で複数ファイルをまとめて改修するグラフ
+
+    select（対象ファイルの決定） → refactor（ファイルごとに並行して改修） → check（結合後に 1 回だけ整合性チェック） → finalize
+
+対象ファイルを指定しなければ、プロジェクト全体の識別子索引から指示に出てくる識別子を使うファイルを選ぶ。
+各ファイルの改修は refactor_graph.run_refactor を使うので、設計セクションはファイルごとに必要なものだけが
+（最後の user メッセージとして）渡り、大きな Python ファイルはユニット単位の差分で直る。
+全ファイル共通のプレフィックスを使うのはビルドのファイル生成で GRAPHFORGE_SHARED_PREFIX=1 のときだけ。
+書き込みは apply_changes で全ファイルまとめて行い、途中で失敗したら書き込み済みのファイルを元に戻す。
+"""
+import contextvars
+import difflib
+import os
+import pathlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import NotRequired, TypedDict
+
+from langgraph.graph import StateGraph
+
+import config
+from langgraph_v21.consistency import Issue, analyze_project, format_issue
+from langgraph_v21.deps import SKIP_DIRS
+from langgraph_v21.graph_registry import compiled
+from langgraph_v21.refactor_graph import prepare_refactor_state, run_refactor
+from langgraph_v21.telemetry import current_trace, span, traced_node
+
+SOURCE_SUFFIXES = (".py", ".json", ".jsx", ".js", ".ts", ".tsx")
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_QUOTED = re.compile(r"`([A-Za-z_][A-Za-z0-9_.]*)`")
+
+
+# ---------- 状態定義 ----------
+class BatchRefactorState(TypedDict):
+    project_dir: str
+    prompt: str
+    sections: str
+    files: list[str]                     # 改修対象（project_dir からの相対パス）。空なら自動で選ぶ
+    apply: NotRequired[bool]             # チェックが通ったら書き込む
+    originals: NotRequired[dict[str, str]]
+    revised: NotRequired[dict[str, str]]
+    diffs: NotRequired[dict[str, str]]
+    issues: NotRequired[list[Issue]]
+    check_result: NotRequired[str]
+    applied: NotRequired[bool]
+    progress: NotRequired[list[str]]
+
+
+def log_progress(state: BatchRefactorState, step_desc: str):
+    msg = f"[STEP {current_trace().next_step()}] {step_desc}"
+    state.setdefault("progress", []).append(msg)
+
+
+# ---------- プロジェクトの読み込み / 識別子索引 ----------
+def relative_key(project_dir: str, path: str) -> str:
+    """structure.json の written（絶対パス）もプロジェクトからの相対パスにそろえる。"""
+    p = pathlib.Path(path)
+    try:
+        return p.resolve().relative_to(pathlib.Path(project_dir).resolve()).as_posix() if p.is_absolute() \
+            else p.as_posix()
+    except ValueError:
+        return p.as_posix()
+
+
+def read_project(project_dir: str) -> dict[str, str]:
+    """プロジェクト内のソースファイル {相対パス: 内容}。"""
+    root = pathlib.Path(project_dir)
+    files = {}
+    for dirpath, dirs, names in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in names:
+            if name.endswith(SOURCE_SUFFIXES):
+                path = pathlib.Path(dirpath) / name
+                try:
+                    files[path.relative_to(root).as_posix()] = path.read_text(encoding="utf-8")
+                except (OSError, UnicodeDecodeError):
+                    continue
+    return files
+
+
+def symbol_index(files: dict[str, str]) -> dict[str, set[str]]:
+    """識別子 → それを含むファイル。言語をまたいで同じ名前（フィールド名など）を追えるよう字句で数える。"""
+    index: dict[str, set[str]] = {}
+    for key, content in files.items():
+        for word in set(_WORD.findall(content)):
+            index.setdefault(word, set()).add(key)
+    return index
+
+
+def affected_files(prompt: str, files: dict[str, str]) -> list[str]:
+    """
+    指示に関係するファイル。`囲んだ` 名前があればそれを、なければ snake_case / camelCase の
+    識別子を、それもなければ半数未満のファイルにしか現れない語を手がかりにする。
+    """
+    index = symbol_index(files)
+    quoted = {part for name in _QUOTED.findall(prompt) for part in name.split(".")}
+    words = set(_WORD.findall(prompt))
+    candidates = (
+        quoted
+        or {w for w in words if "_" in w.strip("_") or re.search(r"[a-z][A-Z]", w)}
+        or {w for w in words if len(w) > 2 and len(index.get(w, ())) < max(len(files) / 2, 1)}
+    )
+    hits = set().union(*(index.get(w, set()) for w in candidates)) if candidates else set()
+    return sorted(hits)
+
+
+# ---------- ノード定義 ----------
+def read_requested(project_dir: str, key: str) -> str | None:
+    """明示的に指定されたファイル（SOURCE_SUFFIXES 以外も含む）。プロジェクトの外や読めないものは None。"""
+    root = pathlib.Path(project_dir).resolve()
+    path = (root / key).resolve()
+    if not path.is_relative_to(root) or not path.is_file():
+        return None
+    try:
+        return path.read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def select_files(state: BatchRefactorState) -> BatchRefactorState:
+    project = read_project(state["project_dir"])
+    keys = [relative_key(state["project_dir"], f) for f in state.get("files") or []]
+    if not keys:
+        keys = affected_files(state["prompt"], project)
+        log_progress(state, f"対象ファイルを自動選択: {', '.join(keys) or '（なし）'}")
+    # 指定されたファイルは拡張子にかかわらず読む（docker-compose.yml, index.html など）
+    for key in keys:
+        if key not in project and (content := read_requested(state["project_dir"], key)) is not None:
+            project[key] = content
+    missing = [k for k in keys if k not in project]
+    if missing:
+        raise FileNotFoundError(f"改修対象が見つかりません: {', '.join(missing)}")
+    state["files"] = keys
+    state["originals"] = {k: project[k] for k in keys}
+    return state
+
+
+def refactor_one(state: BatchRefactorState, key: str) -> str:
+    others = [k for k in state["files"] if k != key]
+    # 同じ変更を他のファイルにも当てていることを伝え、名前や型をそろえさせる
+    prompt = state["prompt"] + (f"\n\n（同じ指示で同時に改修するファイル: {', '.join(others)}）" if others else "")
+    file_state = prepare_refactor_state(state["project_dir"], key, state["originals"][key], prompt, state["sections"])
+    with span("file", key):
+        return run_refactor(file_state)["revised_code"]
+
+
+def refactor_files(state: BatchRefactorState) -> BatchRefactorState:
+    log_progress(state, f"{len(state['files'])} ファイルを並行して改修")
+    with ThreadPoolExecutor(max_workers=max(min(config.OLLAMA_NUM_PARALLEL, len(state["files"])), 1)) as pool:
+        # テレメトリのスパンを引き継ぐため、呼び出し元のコンテキストで実行する
+        futures = {k: pool.submit(contextvars.copy_context().run, refactor_one, state, k) for k in state["files"]}
+        state["revised"] = {k: f.result() for k, f in futures.items()}
+    state["diffs"] = {
+        k: "\n".join(difflib.unified_diff(state["originals"][k].splitlines(), v.splitlines(),
+                                          f"a/{k}", f"b/{k}", lineterm=""))
+        for k, v in state["revised"].items() if v != state["originals"][k]
+    }
+    log_progress(state, f"改修完了: 変更 {len(state['diffs'])} / {len(state['files'])} ファイル")
+    return state
+
+
+def batch_check(state: BatchRefactorState) -> BatchRefactorState:
+    """改修後のファイルをプロジェクトに重ねて 1 回だけ解析し、改修で新たに生じた問題を返す。"""
+    before = read_project(state["project_dir"])
+    after = {**before, **state["revised"]}
+    known = {format_issue(i) for i in analyze_project(before)}
+    issues = [i for i in analyze_project(after) if format_issue(i) not in known]
+    state["issues"] = issues
+    state["check_result"] = "STATIC_ISSUES " + "; ".join(format_issue(i) for i in issues) if issues else "OK"
+    log_progress(state, f"整合性チェック: {state['check_result']}")
+    return state
+
+
+def finalize(state: BatchRefactorState) -> BatchRefactorState:
+    state["applied"] = False
+    if state.get("apply") and state["check_result"] == "OK" and state["diffs"]:
+        apply_changes(state["project_dir"], {k: state["revised"][k] for k in state["diffs"]})
+        state["applied"] = True
+        log_progress(state, f"{len(state['diffs'])} ファイルを書き込みました")
+    return state
+
+
+# ---------- 書き込み ----------
+def apply_changes(project_dir: str, files: dict[str, str]):
+    """
+    全ファイルを一時ファイルに書いてから置き換える。置き換えの途中で失敗したら、
+    置き換え済みのファイルを元の内容に戻して例外を送出する（全部書くか、何も書かないか）。
+    """
+    root = pathlib.Path(project_dir)
+    staged: list[tuple[pathlib.Path, pathlib.Path]] = []
+    try:
+        for key, content in files.items():
+            path = root / key
+            tmp = path.with_name(f".{path.name}.graphforge-tmp")
+            tmp.write_text(content, encoding="utf-8")
+            staged.append((tmp, path))
+    except Exception:
+        for tmp, _ in staged:
+            tmp.unlink(missing_ok=True)
+        raise
+
+    backups = {path: path.read_bytes() for _, path in staged if path.exists()}
+    done: list[pathlib.Path] = []
+    try:
+        for tmp, path in staged:
+            os.replace(tmp, path)
+            done.append(path)
+    except Exception:
+        for path in done:
+            if path in backups:
+                path.write_bytes(backups[path])
+            else:
+                path.unlink(missing_ok=True)
+        for tmp, _ in staged:
+            tmp.unlink(missing_ok=True)
+        raise
+
+
+# ---------- グラフ定義 ----------
+def build_batch_refactor_graph():
+    builder = StateGraph(state_schema=BatchRefactorState)
+    builder.add_node("select", traced_node("select", select_files))
+    builder.add_node("refactor", traced_node("refactor", refactor_files))
+    builder.add_node("check", traced_node("check", batch_check))
+    builder.add_node("finalize", traced_node("finalize", finalize))
+    builder.set_entry_point("select")
+    builder.add_edge("select", "refactor")
+    builder.add_edge("refactor", "check")
+    builder.add_edge("check", "finalize")
+    builder.set_finish_point("finalize")
+    return builder.compile()
+
+
+def get_batch_refactor_graph():
+    return compiled("batch_refactor", build_batch_refactor_graph)
+
+
+def prepare_batch_state(project_dir: pathlib.Path | str, prompt: str, sections: str,
+                        files: list[str] | None = None, apply: bool = False) -> BatchRefactorState:
+    return {
+        "project_dir": str(project_dir),
+        "prompt": prompt,
+        "sections": sections,
+        "files": list(files or []),
+        "apply": apply,
+        "progress": [],
+    }
@@ -0,0 +1,77 @@
+# langgraph_v21/boilerplate.py
+"""
+定型ファイルを Jinja2 テンプレートから決定的に生成する
+
+templates/<ファイルキー>.j2 があるファイルは LLM を呼ばずにここで描画する。
+テンプレートがなければ None を返し、呼び出し側が LLM 生成にフォールバックする。
+"""
+import json
+import pathlib
+import re
+from typing import Any
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, TemplateNotFound
+
+TEMPLATE_DIR = pathlib.Path(__file__).parent / "templates"
+
+_env = Environment(
+    loader=FileSystemLoader(str(TEMPLATE_DIR)),
+    undefined=StrictUndefined,
+    keep_trailing_newline=True,
+    autoescape=False,
+)
+
+DEFAULT_CONTEXT: dict[str, Any] = {
+    "title": "GraphForge App",
+    "package_name": "graphforge-app",
+    "description": "",
+    "lang": "ja",
+    "api_prefix": "/api",
+    "api_url": "http://localhost:8000",
+    "python_version": "3.11",
+    "node_version": "20",
+}
+
+NAME_KEYS = ("project_name", "app_name", "name", "title", "project")
+
+
+def _find_name(data: Any, depth: int = 0) -> str | None:
+    if not isinstance(data, dict) or depth > 2:
+        return None
+    for key in NAME_KEYS:
+        if isinstance(data.get(key), str) and data[key].strip():
+            return data[key].strip()
+    for value in data.values():
+        found = _find_name(value, depth + 1)
+        if found:
+            return found
+    return None
+
+
+def slugify(name: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+    return slug or DEFAULT_CONTEXT["package_name"]
+
+
+def template_context(sections: str) -> dict[str, Any]:
+    """parse_design の sections（JSON 文字列）からテンプレート変数を作る。読めない場合は既定値。"""
+    context = dict(DEFAULT_CONTEXT)
+    try:
+        data = json.loads(sections) if sections else {}
+    except (json.JSONDecodeError, TypeError):
+        data = {}
+    name = _find_name(data)
+    if name:
+        context["title"] = name
+        context["package_name"] = slugify(name)
+    if isinstance(data, dict) and isinstance(data.get("description"), str):
+        context["description"] = data["description"]
+    return context
+
+
+def render_boilerplate(filekey: str, sections: str) -> str | None:
+    try:
+        template = _env.get_template(f"{filekey}.j2")
+    except TemplateNotFound:
+        return None
+    return template.render(**template_context(sections))
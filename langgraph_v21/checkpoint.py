@@ -0,0 +1,145 @@
+# langgraph_v21/checkpoint.py
+"""
+ビルドのチェックポイント（中断したビルドの再開用）
+
+LangGraph の InMemorySaver に、更新のたびに増えた分（新しいチェックポイント・チャネル値・書き込み）だけを
+SQLite へ追記する永続化を足したもの。各ノードの完了時点の state が残るので、プロセスが落ちても
+graph.invoke(None, run_config()) で未完了のノードから再開できる。
+値は saver の serde（JSON / msgpack）で直列化したまま保存し、pickle は使わない。保存先は生成物と混ざらないよう
+プロジェクトの外（config.CHECKPOINT_DIR/<プロジェクトのパスのハッシュ>.sqlite3）に置く。
+has_checkpoint などダッシュボードから使う関数は LangGraph を import しない（saver は初回に組み立てる）。
+"""
+import hashlib
+import json
+import pathlib
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any
+
+import config
+
+if TYPE_CHECKING:
+    from langgraph.checkpoint.memory import InMemorySaver
+
+THREAD_ID = "build"  # 1 プロジェクト = 1 スレッド
+UNSAFE_TYPES = {"pickle"}  # 読み込み時に復元しない直列化形式
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT, ns TEXT, checkpoint_id TEXT, parent_id TEXT,
+    type TEXT, data BLOB, meta_type TEXT, meta BLOB,
+    PRIMARY KEY (thread_id, ns, checkpoint_id));
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT, ns TEXT, channel TEXT, version TEXT, type TEXT, data BLOB,
+    PRIMARY KEY (thread_id, ns, channel, version));
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT, ns TEXT, checkpoint_id TEXT, task_id TEXT, idx INTEGER,
+    channel TEXT, type TEXT, data BLOB, task_path TEXT,
+    PRIMARY KEY (thread_id, ns, checkpoint_id, task_id, idx));
+"""
+
+
+def checkpoint_path(project_dir: str) -> pathlib.Path:
+    key = hashlib.sha256(str(pathlib.Path(project_dir).resolve()).encode("utf-8")).hexdigest()[:16]
+    return pathlib.Path(config.CHECKPOINT_DIR) / f"{key}.sqlite3"
+
+
+def run_config(thread_id: str = THREAD_ID) -> dict[str, Any]:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def _typed(type_: str, data: bytes) -> tuple[str, bytes]:
+    if type_ in UNSAFE_TYPES:
+        raise ValueError(f"チェックポイントに復元しない形式の値があります: {type_}")
+    return type_, data
+
+
+@lru_cache(maxsize=None)
+def saver_class() -> type["InMemorySaver"]:
+    """FileCheckpointSaver を組み立てる（langgraph の import を実際に使うときまで遅らせる）。"""
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    class FileCheckpointSaver(InMemorySaver):
+        """
+        チェックポイントを SQLite に追記して永続化する saver。
+        put / put_writes ごとにその回で増えた行だけを 1 トランザクションで書くので、
+        書き込み量は履歴の長さに依らず、途中で落ちても前回までの内容が残る。
+
+        Args:
+            path: 保存先ファイル。存在すれば読み込んで続きから使う
+        """
+
+        def __init__(self, path: str | pathlib.Path):
+            super().__init__()
+            self.path = pathlib.Path(path)
+            self._file_lock = threading.Lock()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+            self._load()
+
+        def _load(self):
+            for t, ns, cid, parent, type_, data, meta_type, meta in self._conn.execute(
+                    "SELECT thread_id, ns, checkpoint_id, parent_id, type, data, meta_type, meta FROM checkpoints"):
+                self.storage[t][ns][cid] = (_typed(type_, data), _typed(meta_type, meta), parent)
+            for t, ns, channel, version, type_, data in self._conn.execute(
+                    "SELECT thread_id, ns, channel, version, type, data FROM blobs"):
+                self.blobs[(t, ns, channel, json.loads(version))] = _typed(type_, data)
+            for t, ns, cid, task_id, idx, channel, type_, data, task_path in self._conn.execute(
+                    "SELECT thread_id, ns, checkpoint_id, task_id, idx, channel, type, data, task_path FROM writes"):
+                self.writes[(t, ns, cid)][(task_id, idx)] = (task_id, channel, _typed(type_, data), task_path)
+
+        def _execute(self, statements: list[tuple[str, list[tuple]]]):
+            with self._file_lock, self._conn:
+                for sql, rows in statements:
+                    self._conn.executemany(sql, rows)
+
+        def put(self, config, checkpoint, metadata, new_versions):
+            result = super().put(config, checkpoint, metadata, new_versions)
+            t, ns = config["configurable"]["thread_id"], config["configurable"]["checkpoint_ns"]
+            (type_, data), (meta_type, meta), parent = self.storage[t][ns][checkpoint["id"]]
+            blobs = [(t, ns, k, json.dumps(v), *self.blobs[(t, ns, k, v)]) for k, v in new_versions.items()]
+            self._execute([
+                ("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                 [(t, ns, checkpoint["id"], parent, type_, data, meta_type, meta)]),
+                ("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs),
+            ])
+            return result
+
+        def put_writes(self, config, writes, task_id, task_path=""):
+            super().put_writes(config, writes, task_id, task_path)
+            c = config["configurable"]
+            outer = (c["thread_id"], c.get("checkpoint_ns", ""), c["checkpoint_id"])
+            rows = [(*outer, tid, idx, channel, *value, path)
+                    for (tid, idx), (_, channel, value, path) in self.writes.get(outer, {}).items() if tid == task_id]
+            self._execute([("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)])
+
+        def delete_thread(self, thread_id: str):
+            super().delete_thread(thread_id)
+            self._execute([(f"DELETE FROM {table} WHERE thread_id = ?", [(thread_id,)])
+                           for table in ("checkpoints", "blobs", "writes")])
+
+        def close(self):
+            self._conn.close()
+
+    return FileCheckpointSaver
+
+
+def __getattr__(name: str):
+    if name == "FileCheckpointSaver":
+        return saver_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def has_checkpoint(project_dir: str) -> bool:
+    return checkpoint_path(project_dir).exists()
+
+
+def open_checkpointer(project_dir: str, fresh: bool = False) -> "InMemorySaver":
+    """project_dir のチェックポイントを開く。fresh=True なら前回分を捨てて新しく始める。"""
+    path = checkpoint_path(project_dir)
+    if fresh:
+        for p in (path, path.with_name(path.name + "-journal")):
+            p.unlink(missing_ok=True)
+    return saver_class()(path)
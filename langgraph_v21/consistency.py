@@ -1,15 +1,45 @@
 # langgraph_v21/consistency.py
 """
 静的コードの整合性チェックを行うモジュール
+
+check_files はファイル単体のチェック、analyze_project は生成プロジェクト全体の
+シンボル索引を作り、ファイル間の不整合（ローカル import・FastAPI ルートと openapi.json・
+JSX の相対 import）もまとめて検出する。
 """
 import ast
+import hashlib
 import json
-from typing import Dict, List
+import multiprocessing
+import posixpath
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, TypedDict
 
+# これ以上の数の Python ファイルを新たに解析するときはプロセスプールで並列化する。
+# ジョブのワーカー・バッチのスレッド・Streamlit の中から呼ばれるので、ほかのスレッドが持っているロックを
+# 引き継ぐ fork ではなく spawn でワーカーを起動する
+PARALLEL_THRESHOLD = 16
+SUMMARY_CACHE_SIZE = 2048
+HTTP_METHODS = {"get", "post", "put", "patch", "delete", "head", "options"}
+JS_EXTENSIONS = (".jsx", ".js", ".tsx", ".ts")
 
-def quick_check(files: Dict[str, str]) -> List[str]:
+
+class Issue(TypedDict):
+    """チェックで見つかった問題 1 件。state に載せるため dict として扱う。"""
+    file: str
+    kind: str  # "empty" | "todo" | "syntax" | "json" | "error" | "import" | "route" | "jsx_import"
+    line: int | None
+    message: str
+
+
+def format_issue(issue: Issue) -> str:
+    return issue["message"]
+
+
+def check_files(files: Dict[str, str]) -> List[Issue]:
     """
-    与えられたファイル群の内容を解析し、以下を検出してエラーリストを返す:
+    与えられたファイル群の内容を解析し、以下を検出して Issue のリストを返す:
     1. ファイルが空
     2. TODO コメントの存在
     3. Python ファイルの構文エラー
@@ -18,16 +48,19 @@ def quick_check(files: Dict[str, str]) -> List[str]:
     Args:
         files: ファイル名をキー、内容を値とする辞書
     Returns:
-        エラー文字列のリスト。
+        Issue のリスト。
     """
-    issues: List[str] = []
+    issues: List[Issue] = []
     for filename, content in files.items():
         # 空ファイルチェック
         if not content.strip():
-            issues.append(f"{filename} is empty")
+            issues.append(Issue(file=filename, kind="empty", line=None,
+                                message=f"{filename} is empty"))
         # TODO コメント検出
         if "TODO" in content:
-            issues.append(f"{filename} contains TODO comment")
+            line = content[:content.index("TODO")].count("\n") + 1
+            issues.append(Issue(file=filename, kind="todo", line=line,
+                                message=f"{filename} contains TODO comment"))
         # 拡張チェック
         try:
             if filename.endswith('.py'):
@@ -37,9 +70,323 @@ def quick_check(files: Dict[str, str]) -> List[str]:
                 # JSON 構文チェック
                 json.loads(content)
         except SyntaxError as e:
-            issues.append(f"SyntaxError in {filename}: {e.msg} (line {e.lineno})")
+            issues.append(Issue(file=filename, kind="syntax", line=e.lineno,
+                                message=f"SyntaxError in {filename}: {e.msg} (line {e.lineno})"))
         except json.JSONDecodeError as e:
-            issues.append(f"JSONDecodeError in {filename}: {e.msg} (line {e.lineno})")
+            issues.append(Issue(file=filename, kind="json", line=e.lineno,
+                                message=f"JSONDecodeError in {filename}: {e.msg} (line {e.lineno})"))
         except Exception as e:
-            issues.append(f"Error in {filename}: {str(e)}")
-    return issues
\ No newline at end of file
+            issues.append(Issue(file=filename, kind="error", line=None,
+                                message=f"Error in {filename}: {str(e)}"))
+    return issues
+
+
+def quick_check(files: Dict[str, str]) -> List[str]:
+    """check_files の結果をエラー文字列のリストで返す（従来の呼び出し側向け）。"""
+    return [format_issue(i) for i in check_files(files)]
+
+
+# ---------- Python ファイルの要約（プロセスプールで実行できるよう dict で返す） ----------
+def _collect_defined(body: list[ast.stmt], names: set[str]):
+    for node in body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                for n in ast.walk(target):
+                    if isinstance(n, ast.Name):
+                        names.add(n.id)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                names.add((alias.asname or alias.name).split(".")[0])
+        elif isinstance(node, (ast.If, ast.Try, ast.With)):
+            for block in ("body", "orelse", "finalbody"):
+                _collect_defined(getattr(node, block, []), names)
+            for handler in getattr(node, "handlers", []):
+                _collect_defined(handler.body, names)
+
+
+def _str_kwarg(call: ast.Call, name: str) -> str | None:
+    for kw in call.keywords:
+        if kw.arg == name and isinstance(kw.value, ast.Constant) and isinstance(kw.value.value, str):
+            return kw.value.value
+    return None
+
+
+def _ref(expr: ast.expr) -> list[str] | None:
+    """task.router → ["task", "router"]、router → ["router"]。"""
+    if isinstance(expr, ast.Name):
+        return [expr.id]
+    if isinstance(expr, ast.Attribute) and isinstance(expr.value, ast.Name):
+        return [expr.value.id, expr.attr]
+    return None
+
+
+def summarize_python(content: str) -> dict[str, Any]:
+    """import・定義名・FastAPI のアプリ / ルーター / ルートを抽出する。"""
+    try:
+        tree = ast.parse(content)
+    except SyntaxError as e:
+        return {"syntax_error": True, "lineno": e.lineno}
+    defined: set[str] = set()
+    _collect_defined(tree.body, defined)
+    summary: dict[str, Any] = {
+        "syntax_error": False,
+        "defined": sorted(defined),
+        "has_getattr": "__getattr__" in defined,
+        "imports": [],   # [level, module, name|None, asname, lineno]
+        "apps": [],      # FastAPI() を代入した変数
+        "routers": {},   # APIRouter() を代入した変数 → prefix
+        "routes": [],    # [変数, METHOD, path, lineno]
+        "includes": [],  # [app 変数, router 参照, prefix]
+    }
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                summary["imports"].append([0, alias.name, None, alias.asname, node.lineno])
+        elif isinstance(node, ast.ImportFrom):
+            for alias in node.names:
+                summary["imports"].append([node.level, node.module or "", alias.name, alias.asname, node.lineno])
+        elif isinstance(node, ast.Assign) and isinstance(node.value, ast.Call):
+            ref = _ref(node.value.func)
+            for target in node.targets:
+                if not isinstance(target, ast.Name) or not ref:
+                    continue
+                if ref[-1] == "FastAPI":
+                    summary["apps"].append(target.id)
+                elif ref[-1] == "APIRouter":
+                    summary["routers"][target.id] = _str_kwarg(node.value, "prefix") or ""
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for dec in node.decorator_list:
+                if (isinstance(dec, ast.Call) and isinstance(dec.func, ast.Attribute)
+                        and isinstance(dec.func.value, ast.Name) and dec.func.attr in HTTP_METHODS
+                        and dec.args and isinstance(dec.args[0], ast.Constant)
+                        and isinstance(dec.args[0].value, str)):
+                    summary["routes"].append([dec.func.value.id, dec.func.attr.upper(), dec.args[0].value, dec.lineno])
+        elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+              and node.func.attr == "include_router" and isinstance(node.func.value, ast.Name) and node.args):
+            ref = _ref(node.args[0])
+            if ref:
+                summary["includes"].append([node.func.value.id, ref, _str_kwarg(node, "prefix") or ""])
+    return summary
+
+
+_summary_cache: "OrderedDict[str, dict[str, Any]]" = OrderedDict()
+
+
+def _summaries(py_files: Dict[str, str]) -> Dict[str, dict[str, Any]]:
+    """内容ハッシュで要約をキャッシュし、未解析分だけを（多ければ並列で）解析する。"""
+    keys = {name: hashlib.sha256(content.encode("utf-8")).hexdigest() for name, content in py_files.items()}
+    missing = {k: py_files[name] for name, k in keys.items() if k not in _summary_cache}
+    if missing:
+        contents = list(missing.values())
+        if len(contents) >= PARALLEL_THRESHOLD:
+            with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as pool:
+                results = list(pool.map(summarize_python, contents, chunksize=4))
+        else:
+            results = [summarize_python(c) for c in contents]
+        for k, summary in zip(missing, results):
+            _summary_cache[k] = summary
+    result = {}
+    for name, k in keys.items():
+        _summary_cache.move_to_end(k)
+        result[name] = _summary_cache[k]
+    while len(_summary_cache) > SUMMARY_CACHE_SIZE:
+        _summary_cache.popitem(last=False)
+    return result
+
+
+# ---------- プロジェクト全体のチェック ----------
+def _module_name(filename: str) -> str:
+    name = filename[:-3].replace("/", ".")
+    return name[:-len(".__init__")] if name.endswith(".__init__") else name
+
+
+def _resolve_relative(module: str, level: int, current: str, is_package: bool) -> str:
+    parts = current.split(".")
+    base = parts if is_package else parts[:-1]
+    base = base[:len(base) - (level - 1)] if level > 1 else base
+    return ".".join(p for p in base + ([module] if module else []) if p)
+
+
+def _check_python_imports(summaries: Dict[str, dict], issues: List[Issue]):
+    modules = {_module_name(f): f for f in summaries}
+    packages = {m.rsplit(".", 1)[0] for m in modules if "." in m}
+    local_roots = {m.split(".")[0] for m in modules} | {p.split(".")[0] for p in packages}
+
+    def exists(mod: str) -> bool:
+        return mod in modules or mod in packages
+
+    for filename, summary in summaries.items():
+        if summary["syntax_error"]:
+            continue
+        current = _module_name(filename)
+        is_package = filename.endswith("__init__.py")
+        for level, module, name, _, lineno in summary["imports"]:
+            mod = _resolve_relative(module, level, current, is_package) if level else module
+            if not mod or (level == 0 and mod.split(".")[0] not in local_roots):
+                continue
+            if name is None:
+                if not exists(mod):
+                    issues.append(Issue(file=filename, kind="import", line=lineno,
+                                        message=f"{filename}: import {mod} but module {mod} is not in the project"))
+                continue
+            if name == "*":
+                continue
+            if exists(f"{mod}.{name}"):
+                continue
+            if mod not in modules:
+                if not exists(mod):
+                    issues.append(Issue(file=filename, kind="import", line=lineno,
+                                        message=f"{filename}: from {mod} import {name} but module {mod} is not in the project"))
+                continue
+            target = summaries[modules[mod]]
+            if target["syntax_error"] or target["has_getattr"]:
+                continue
+            if name not in target["defined"]:
+                issues.append(Issue(file=filename, kind="import", line=lineno,
+                                    message=f"{filename}: imports {name} from {modules[mod]}, which does not define it"))
+
+
+def _normalize_path(path: str) -> str:
+    path = re.sub(r"\{[^}]*\}", "{}", path)
+    path = re.sub(r"/+", "/", path)
+    return path.rstrip("/") or "/"
+
+
+class Routes(TypedDict):
+    implemented: dict[tuple[str, str], str]   # (METHOD, path) → 実装しているファイル
+    mounts: dict[str, str]                    # ルーターの prefix（include_router の分を含む）→ ファイル
+    app_file: str | None                      # FastAPI アプリを作っているファイル（main.py を優先）
+
+
+def _collect_routes(summaries: Dict[str, dict], issues: List[Issue]) -> Routes:
+    """
+    FastAPI の (METHOD, path) を、APIRouter と include_router の prefix を解決して集める。
+    include されていないルーターは、直すべき include_router の呼び出し側（アプリのファイル）の問題として報告する。
+    """
+    modules = {_module_name(f): f for f in summaries}
+    # (ファイル, ルーター変数) → include_router で付く prefix のリスト
+    included: dict[tuple[str, str], list[str]] = {}
+    app_files = [f for f, summary in summaries.items() if not summary["syntax_error"] and summary["apps"]]
+    app_file = "main.py" if "main.py" in app_files else (app_files[0] if app_files else None)
+    for filename, summary in summaries.items():
+        if summary["syntax_error"]:
+            continue
+        current = _module_name(filename)
+        aliases: dict[str, tuple[str, str | None]] = {}
+        for level, module, name, asname, _ in summary["imports"]:
+            mod = _resolve_relative(module, level, current, False) if level else module
+            if name is None:
+                aliases[asname or mod.split(".")[0]] = (mod if asname else mod.split(".")[0], None)
+            elif f"{mod}.{name}" in modules:
+                aliases[asname or name] = (f"{mod}.{name}", None)
+            else:
+                aliases[asname or name] = (mod, name)
+        for app_var, ref, prefix in summary["includes"]:
+            if len(ref) == 1 and ref[0] in summary["routers"]:
+                target = (filename, ref[0])
+            elif len(ref) == 1 and ref[0] in aliases and aliases[ref[0]][1]:
+                mod, var = aliases[ref[0]]
+                target = (modules.get(mod, ""), var)
+            elif len(ref) == 2 and ref[0] in aliases:
+                mod, var = aliases[ref[0]]
+                target = (modules.get(f"{mod}.{var}" if var else mod, ""), ref[1])
+            else:
+                continue
+            included.setdefault(target, []).append(prefix)
+
+    routes = Routes(implemented={}, mounts={}, app_file=app_file)
+    for filename, summary in summaries.items():
+        if summary["syntax_error"]:
+            continue
+        for var, own_prefix in summary["routers"].items():
+            if app_file and (filename, var) not in included and any(r[0] == var for r in summary["routes"]):
+                issues.append(Issue(file=app_file, kind="route", line=None,
+                                    message=f"{filename}: router '{var}' is never included by the FastAPI app "
+                                            f"(add app.include_router in {app_file})"))
+            for prefix in included.get((filename, var), [""]):
+                routes["mounts"][_normalize_path(prefix + own_prefix)] = filename
+        for var, method, path, _ in summary["routes"]:
+            if var in summary["routers"]:
+                prefixes = included.get((filename, var), [""])
+                for prefix in prefixes:
+                    routes["implemented"][(method, _normalize_path(prefix + summary["routers"][var] + path))] = filename
+            elif var in summary["apps"]:
+                routes["implemented"][(method, _normalize_path(path))] = filename
+    return routes
+
+
+def _owner(path: str, routes: Routes) -> str | None:
+    """path を実装すべきファイル。prefix が最も長く一致するルーターのファイル、なければアプリのファイル。"""
+    matches = [(len(prefix), f) for prefix, f in routes["mounts"].items()
+               if prefix != "/" and (path == prefix or path.startswith(prefix + "/"))]
+    return max(matches)[1] if matches else routes["app_file"]
+
+
+def _check_openapi(routes: Routes, openapi: str, issues: List[Issue], filename: str = "openapi.json"):
+    """
+    openapi.json（設計の API セクションから作る計画）と実装のルートを突き合わせる。
+    計画からずれているのは実装側なので、どちら向きの不一致も直すべき Python ファイルに付ける。
+    """
+    try:
+        spec = json.loads(openapi)
+    except json.JSONDecodeError:
+        return
+    paths = spec.get("paths") if isinstance(spec, dict) else None
+    implemented = routes["implemented"]
+    if not isinstance(paths, dict) or not implemented:
+        return
+    declared = {
+        (method.upper(), _normalize_path(path))
+        for path, ops in paths.items() if isinstance(ops, dict)
+        for method in ops if method.lower() in HTTP_METHODS
+    }
+    for method, path in sorted(declared - set(implemented)):
+        issues.append(Issue(file=_owner(path, routes) or filename, kind="route", line=None,
+                            message=f"{filename} declares {method} {path} but no FastAPI route implements it"))
+    for method, path in sorted(set(implemented) - declared):
+        issues.append(Issue(file=implemented[(method, path)], kind="route", line=None,
+                            message=f"{filename} does not document {method} {path}, which the FastAPI app implements"))
+
+
+JS_IMPORT_RE = re.compile(r"""^\s*import\s+(?:[^'";]*?\s+from\s+)?['"]([^'"]+)['"]""", re.MULTILINE)
+
+
+def _check_js_imports(files: Dict[str, str], issues: List[Issue], on_disk: set[str]):
+    known = set(files) | on_disk
+    for filename, content in files.items():
+        if not filename.endswith(JS_EXTENSIONS):
+            continue
+        for m in JS_IMPORT_RE.finditer(content):
+            spec = m.group(1)
+            if not spec.startswith("."):
+                continue
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(filename), spec))
+            candidates = [target] + [target + ext for ext in JS_EXTENSIONS] + \
+                         [f"{target}/index{ext}" for ext in JS_EXTENSIONS]
+            if not any(c in known for c in candidates):
+                line = content[:m.start(1)].count("\n") + 1
+                issues.append(Issue(file=filename, kind="jsx_import", line=line,
+                                    message=f"{filename}: import '{spec}' does not match any generated file"))
+
+
+def analyze_project(files: Dict[str, str], on_disk: set[str] | None = None) -> List[Issue]:
+    """
+    プロジェクト全体を 1 回で解析し、ファイル単体の問題とファイル間の不整合を返す。
+
+    Args:
+        files: ファイルキー（プロジェクトからの相対パス）をキー、内容を値とする辞書
+        on_disk: files 以外にプロジェクト内に存在するファイル（JSX import の解決用）
+    Returns:
+        Issue のリスト。
+    """
+    issues = check_files(files)
+    summaries = _summaries({k: v for k, v in files.items() if k.endswith(".py")})
+    _check_python_imports(summaries, issues)
+    routes = _collect_routes(summaries, issues)
+    if "openapi.json" in files:
+        _check_openapi(routes, files["openapi.json"], issues)
+    _check_js_imports(files, issues, on_disk or set())
+    return issues
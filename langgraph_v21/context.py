@@ -0,0 +1,141 @@
+# langgraph_v21/context.py
+"""
+プロンプトに載せる設計セクションの選択とトークン予算内への詰め込み
+
+parse_design が作る sections（JSON 文字列）をトップレベルのキーごとのセクション表に分け、
+ファイルごとに config.FILE_SECTIONS のセクションを全文で、それ以外を 1 行の要約で渡す。
+全文だけで予算を超える場合は、各セクションを長さに比例して切り詰める。
+
+config.SHARED_PROMPT_PREFIX（GRAPHFORGE_SHARED_PREFIX=1、既定はオフ）のときは、全ファイルで同一の system メッセージ（全セクション）を先頭に置く。
+Ollama は直前のリクエストと一致する先頭部分の KV を使い回すので、2 件目以降はプロンプト評価がほぼ不要になる。
+"""
+import json
+import re
+from fnmatch import fnmatch
+from functools import lru_cache
+from typing import Any
+
+import config
+
+SYSTEM_PROMPT = (
+    "You generate the files of a FastAPI + React project one at a time. "
+    "Follow the design sections below and reply with the content of the requested file only."
+)
+TRIM_MARK = " …（省略）"
+SUMMARY_MARK = "（要約）"
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // config.CHARS_PER_TOKEN)
+
+
+def _render(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+@lru_cache(maxsize=32)
+def parse_sections(sections: str) -> dict[str, Any]:
+    """
+    sections をセクション表 {名前: 内容} にする（戻り値は共有されるので変更しないこと）。
+
+    JSON オブジェクトならトップレベルのキー、JSON でなければ Markdown の見出しで分ける。
+    見出しもなければ全体を "design" セクションとして扱う。
+    """
+    try:
+        data = json.loads(sections) if sections else {}
+    except (json.JSONDecodeError, TypeError):
+        data = None
+    if isinstance(data, dict):
+        return data
+    if isinstance(data, list):
+        table = {}
+        for i, item in enumerate(data):
+            if isinstance(item, dict):
+                name = item.get("name") or item.get("title") or f"section_{i}"
+                table[str(name)] = item.get("content", item)
+        if table:
+            return table
+    parts = re.split(r"^#{1,3}\s+(.+)$", sections or "", flags=re.MULTILINE)
+    if len(parts) > 1:
+        table = {"preamble": parts[0].strip()} if parts[0].strip() else {}
+        for name, body in zip(parts[1::2], parts[2::2]):
+            table[name.strip()] = body.strip()
+        return table
+    return {"design": sections} if sections else {}
+
+
+def sections_for(filekey: str | None) -> list[str] | None:
+    """filekey が使うセクション名。宣言がなければ None（全セクションを対象にする）。"""
+    if filekey:
+        for key, names in config.FILE_SECTIONS.items():
+            # キーは routes/*.py のようなパターンでもよい。refactor では structure.json の written（絶対パス）が
+            # 渡るので末尾一致も許す
+            if fnmatch(filekey, key) or fnmatch(filekey, "*/" + key):
+                return names
+    return None
+
+
+def _summary(text: str) -> str:
+    text = text.strip()
+    if "\n" not in text and len(text) <= config.SECTION_SUMMARY_CHARS:
+        return text  # 名前などの短い値はそのまま
+    first = text.splitlines()[0] if text else ""
+    if len(first) > config.SECTION_SUMMARY_CHARS:
+        first = first[:config.SECTION_SUMMARY_CHARS] + "…"
+    return SUMMARY_MARK + first
+
+
+def pack_sections(table: dict[str, Any], wanted: list[str] | None, budget: int | None = None) -> str:
+    """
+    セクション表を予算内の JSON 文字列にする。
+
+    Args:
+        table: parse_sections の結果
+        wanted: 全文で渡すセクション名。None なら全セクション
+        budget: 上限トークン数（省略時 config.SECTION_TOKEN_BUDGET）
+    """
+    budget = budget or config.SECTION_TOKEN_BUDGET
+    primary = [k for k in table if wanted is None or k in wanted]
+    # 宣言したセクションが 1 つもなければ、全セクションを候補にする（構造化に失敗した設計など）
+    if not primary:
+        primary = list(table)
+    texts = {k: _render(table[k]) for k in primary}
+    total = sum(estimate_tokens(t) for t in texts.values())
+
+    packed: dict[str, Any] = {}
+    if total > budget:
+        for k in primary:
+            share = max(budget * len(texts[k]) // max(sum(len(t) for t in texts.values()), 1), 1)
+            limit = share * config.CHARS_PER_TOKEN
+            packed[k] = texts[k] if len(texts[k]) <= limit else texts[k][:limit] + TRIM_MARK
+        return json.dumps(packed, ensure_ascii=False, indent=2)
+
+    packed = {k: table[k] for k in primary}
+    remaining = budget - total
+    for k, value in table.items():
+        if k in packed:
+            continue
+        summary = _summary(_render(value))
+        cost = estimate_tokens(summary) + estimate_tokens(k) + 2
+        if cost > remaining:
+            break
+        packed[k] = summary
+        remaining -= cost
+    return json.dumps(packed, ensure_ascii=False, indent=2)
+
+
+def sections_prompt(sections: str, filekey: str | None) -> str:
+    """filekey 向けに予算内へ詰めた設計セクション。"""
+    return pack_sections(parse_sections(sections or ""), sections_for(filekey))
+
+
+def files_prompt(files: tuple[str, ...] | list[str]) -> str:
+    """プロジェクトのファイル一覧（main.py が全ルーターを組み込めるよう、各ファイルに同じものを渡す）。"""
+    return "\n".join(f"- {f}" for f in files)
+
+
+@lru_cache(maxsize=8)
+def shared_prefix(sections: str, files: tuple[str, ...] = ()) -> str:
+    """全ファイル共通の system メッセージ。ファイルに依らず同じ文字列になるようにする。"""
+    prefix = f"{SYSTEM_PROMPT}\n\n## Design sections\n{pack_sections(parse_sections(sections or ''), None)}"
+    return prefix + (f"\n\n## Project files\n{files_prompt(files)}" if files else "")
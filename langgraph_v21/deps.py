@@ -0,0 +1,109 @@
+# langgraph_v21/deps.py
+"""
+生成プロジェクトの依存モジュール抽出（finalize / structure.json / dashboard / CLI 共通）
+
+ツリーを 1 回だけ走査し、Python は ast で import を読み取って
+標準ライブラリ（sys.stdlib_module_names）とプロジェクト内モジュールを除外する。
+Node は frontend/package.json の dependencies を読む。
+ファイルごとの解析結果は (mtime, size) が変わらない限り再利用する。
+"""
+import ast
+import json
+import os
+import pathlib
+import sys
+import threading
+from typing import TypedDict
+
+SKIP_DIRS = {"node_modules", ".git", "__pycache__", ".venv", "venv", ".graphforge_cache"}
+
+
+class Dependencies(TypedDict):
+    python: list[str]
+    node: dict[str, str]
+
+
+_memo: dict[str, tuple[int, int, object]] = {}  # パス → (mtime_ns, size, 解析結果)
+_memo_lock = threading.Lock()
+
+
+def _memoized(path: str, parse):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    with _memo_lock:
+        hit = _memo.get(path)
+    if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+        return hit[2]
+    try:
+        value = parse(pathlib.Path(path).read_text(encoding="utf-8"))
+    except (OSError, UnicodeDecodeError):
+        value = None
+    with _memo_lock:
+        _memo[path] = (st.st_mtime_ns, st.st_size, value)
+    return value
+
+
+def _import_roots(text: str) -> frozenset[str]:
+    """絶対 import のトップレベル名。構文エラーのファイルは無視する。"""
+    try:
+        tree = ast.parse(text)
+    except SyntaxError:
+        return frozenset()
+    roots = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            roots.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            roots.add(node.module.split(".")[0])
+    return frozenset(roots)
+
+
+def _node_deps(text: str) -> dict[str, str]:
+    try:
+        pkg = json.loads(text)
+    except json.JSONDecodeError:
+        return {}
+    deps = pkg.get("dependencies", {}) if isinstance(pkg, dict) else {}
+    return deps if isinstance(deps, dict) else {}
+
+
+def scan_dependencies(project_dir: str) -> Dependencies:
+    """
+    project_dir 以下の外部依存を 1 回の走査で抽出する。
+
+    Returns:
+        {"python": ソート済みのモジュール名, "node": package.json の dependencies}
+    """
+    root = pathlib.Path(project_dir)
+    local: set[str] = set()
+    imports: set[str] = set()
+    for dirpath, dirs, names in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        rel = pathlib.Path(dirpath).relative_to(root)
+        for name in names:
+            if not name.endswith(".py"):
+                continue
+            # プロジェクト直下のモジュール名 / パッケージ名は自前のモジュール
+            local.add(rel.parts[0] if rel.parts else name[:-3])
+            imports |= _memoized(os.path.join(dirpath, name), _import_roots) or frozenset()
+    stdlib = set(sys.stdlib_module_names) | {"__future__"}
+    node = _memoized(str(root / "frontend" / "package.json"), _node_deps) or {}
+    return Dependencies(python=sorted(imports - stdlib - local), node=dict(node))
+
+
+def write_requirements(project_dir: str, python_deps: list[str]) -> bool:
+    """
+    requirements.txt を書き出す。内容が変わらなければ書かない（mtime が変わると
+    ダッシュボードのファイル索引・zip の指紋・依存のメモが無効になるため）。書いたら True。
+    """
+    path = pathlib.Path(project_dir) / "requirements.txt"
+    text = "\n".join(sorted(python_deps))
+    try:
+        if path.read_text(encoding="utf-8") == text:
+            return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    path.write_text(text, encoding="utf-8")
+    return True
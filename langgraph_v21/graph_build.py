@@ -1,5 +1,6 @@
 import argparse
-import re
+import ast
+import asyncio
 import pathlib
 import hashlib
 import os
@@ -7,60 +8,155 @@ import sys
 import time
 import random
 import json
-from typing import Dict, TypedDict, NotRequired
-from langchain_community.chat_models.ollama import ChatOllama
+import re
+import threading
+from fnmatch import fnmatch
+from typing import Annotated, Callable, Dict, TypedDict, NotRequired
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph
-from langchain_core.runnables import RunnableLambda
-from langgraph_v21.consistency import quick_check
+from langgraph_v21.boilerplate import render_boilerplate
+from langgraph_v21.checkpoint import has_checkpoint, open_checkpointer, run_config
+from langgraph_v21.context import files_prompt, parse_sections, sections_for, sections_prompt, shared_prefix
+from langgraph_v21.consistency import Issue, analyze_project, format_issue
+from langgraph_v21.deps import Dependencies, scan_dependencies, write_requirements
+from langgraph_v21.graph_registry import compiled, with_checkpointer
+from langgraph_v21.llm_cache import get_cache, make_key, normalize_payload
+from langgraph_v21.router import current_file, get_router, routing_for, served_by_fallback
+from langgraph_v21.sanitizer import astrip_think, clean_llm_output as _clean_llm_output, strip_think
+from langgraph_v21.structure_writer import load_structure, record_structure, update_structure
+from langgraph_v21.validation import ValidationReport, validate_project
+from langgraph_v21.telemetry import (
+    annotate, critical_path, current_trace, load_trace, logger, setup_logging, span, traced_node,
+)
 import config
 
 # ---------- 状態定義 ----------
+def merge_files(left: dict[str, str] | None, right: dict[str, str] | None) -> dict[str, str]:
+    """並列ノードから返された生成ファイル辞書をマージする reducer。"""
+    return {**(left or {}), **(right or {})}
+
+def merge_written(left: list[str] | None, right: list[str] | None) -> list[str]:
+    """書き出し済みパスを重複なしで追記する reducer。"""
+    merged = list(left or [])
+    merged.extend(p for p in (right or []) if p not in merged)
+    return merged
+
 class AppState(TypedDict):
     design: str
     sections: NotRequired[str]
     check_result: NotRequired[str]
-    written: NotRequired[list[str]]
+    files: NotRequired[Annotated[dict[str, str], merge_files]]
+    written: NotRequired[Annotated[list[str], merge_written]]
+    design_hash: NotRequired[str]
+    fingerprints: NotRequired[Annotated[dict[str, str], merge_files]]
+    flagged: NotRequired[list[str]]
+    issues: NotRequired[list[Issue]]
+    repair_attempts: NotRequired[Annotated[dict[str, int], merge_files]]
+    deps: NotRequired[Dependencies]
+    plan: NotRequired[Annotated[list[str], merge_written]]   # 生成するファイル（parse_design が設計から決める）
+    db_schema: NotRequired[dict]                             # {"db_type": ..., "tables": [...]}。DB がなければ {}
+    db_config: NotRequired[dict[str, str]]                   # docker-compose.yml の値（省略時 config.DB_DEFAULTS）
+    validation: NotRequired[ValidationReport]
     progress: NotRequired[list[str]]
     project_dir: NotRequired[str]
 
 # ---------- ステップログ用 ----------
-step_counter = {"i": 0}
-
+# ステップ番号はビルドごとのトレース（setup_logging）で数える
 def log_progress(state: AppState, step_desc: str):
-    step_counter["i"] += 1
-    msg = f"[STEP {step_counter['i']}] {step_desc}"
-    print(msg, flush=True)
+    msg = f"[STEP {current_trace().next_step()}] {step_desc}"
+    logger.info(msg)
     state.setdefault("progress", []).append(msg)
+    emit_event({"progress": msg})
     return {}
 
-# ---------- LLMセットアップ ----------
-llm = ChatOllama(model=config.MODEL, base_url=config.OLLAMA_BASE_URL)
-
-def safe_invoke(prompt: str) -> str:
+def emit_event(event: dict):
+    """graph.stream(stream_mode="custom") の購読者へ進捗を逐次送る。グラフ外では何もしない。"""
     try:
-        res = llm.invoke(prompt)
-        if isinstance(res, str):
-            return res
-        if hasattr(res, "content"):
-            return res.content
-        return str(res)
-    except Exception as e:
-        raise RuntimeError(f"LLM invoke error: {e}")
+        get_stream_writer()(event)
+    except RuntimeError:
+        pass
+
+# ---------- LLM 呼び出し ----------
+# 応答は Ollama からトークン単位でストリーム受信し、<think> は受信しながら取り除く
+# モデル / サーバーは router が生成中のファイルキー（routing_for）に応じて選ぶ
+# 呼び出しごとに kind="llm" のスパンを記録する（キャッシュ / 初トークンまでの時間 / トークン数）
+def safe_invoke(prompt: str | list[dict[str, str]], use_cache: bool = True, on_token: Callable[[str], None] | None = None) -> str:
+    cache = get_cache()
+    router = get_router()
+    key = make_key(*router.cache_identity(current_file()), prompt)
+    with span("llm", current_file() or "-", prompt_chars=len(normalize_payload(prompt))) as s:
+        hit = cache.get(key) if use_cache else None
+        if hit is not None:
+            s["cache"] = "hit"
+            return hit
+        s["cache"] = "miss" if use_cache else "bypass"
+        started = time.perf_counter()
+        try:
+            tokens = []
+            for token in strip_think(router.stream(prompt)):
+                if not tokens:
+                    s["ttft"] = round(time.perf_counter() - started, 4)
+                tokens.append(token)
+                if on_token:
+                    on_token(token)
+            text = "".join(tokens)
+        except Exception as e:
+            raise RuntimeError(f"LLM invoke error: {e}")
+        s["response_chars"] = len(text)
+    # キーは専用ティアのモデルなので、フォールバック先の応答をそのモデルの応答として残さない
+    if not served_by_fallback(s):
+        cache.put(key, text)
+    return text
+
+async def async_invoke(prompt: str | list[dict[str, str]], use_cache: bool = True, on_token: Callable[[str], None] | None = None) -> str:
+    """safe_invoke の非同期版。イベントループ上で複数ファイルを同時に生成するために使う。"""
+    cache = get_cache()
+    router = get_router()
+    key = make_key(*router.cache_identity(current_file()), prompt)
+    with span("llm", current_file() or "-", prompt_chars=len(normalize_payload(prompt))) as s:
+        hit = await asyncio.to_thread(cache.get, key) if use_cache else None
+        if hit is not None:
+            s["cache"] = "hit"
+            return hit
+        s["cache"] = "miss" if use_cache else "bypass"
+        started = time.perf_counter()
+        try:
+            tokens = []
+            async for token in astrip_think(router.astream(prompt)):
+                if not tokens:
+                    s["ttft"] = round(time.perf_counter() - started, 4)
+                tokens.append(token)
+                if on_token:
+                    on_token(token)
+            text = "".join(tokens)
+        except Exception as e:
+            raise RuntimeError(f"LLM invoke error: {e}")
+        s["response_chars"] = len(text)
+    if not served_by_fallback(s):
+        await asyncio.to_thread(cache.put, key, text)
+    return text
+
+# ---------- ファイル書き出し ----------
+_write_lock = threading.Lock()
+
+def write_file(path: pathlib.Path, content: str):
+    """並列生成から安全に呼べるファイル書き込み。"""
+    with _write_lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
 
 # ---------- ヘルパー関数 ----------
-def remove_think_tags(text: str) -> str:
-    return re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
-
-def remove_after_last_fence(text: str) -> str:
-    idx = text.rfind('```')
-    return text[:idx] if idx != -1 else text
-
-def remove_code_fences(text: str) -> str:
-    text = re.sub(r'^```[^\n]*\n', '', text, flags=re.MULTILINE)
-    return re.sub(r'\n```', '\n', text)
-
-def trim_backtick_content(text: str) -> str:
-    return re.sub(r'`([^`]*)`', lambda m: f"`{m.group(1).strip()}`", text)
+def text_hash(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def file_fingerprint(filekey: str, prompt: str | list[dict[str, str]]) -> str:
+    """ファイルを生成した入力（モデル + プロンプト）の指紋。プロンプトには sections と依存ファイルが含まれる。"""
+    model, _ = get_router().cache_identity(filekey)
+    return text_hash(model, normalize_payload(prompt))
 
 # ---------- ノード定義 ----------
 def entry_node(state: AppState):
@@ -70,151 +166,523 @@ def entry_node(state: AppState):
     resolved = pathlib.Path(raw).resolve()
     log_progress(state, f"entry_node: project_dir resolved to {resolved}")
     state["project_dir"] = resolved.as_posix()
+    # 既存プロジェクトなら前回ビルドの指紋を引き継ぐ（インクリメンタルビルド）
+    previous = load_structure(state["project_dir"]) or {}
+    if previous.get("fingerprints") and not state.get("fingerprints"):
+        state["fingerprints"] = previous["fingerprints"]
+        # 前回チェックで解決しなかったファイルは再生成する
+        state["flagged"] = previous.get("flagged", [])
+        if previous.get("design_hash") == text_hash(state["design"]) and previous.get("sections"):
+            state["design_hash"] = previous["design_hash"]
+            state["sections"] = previous["sections"]
+            if "db_schema" in previous:
+                state["db_schema"] = previous["db_schema"]
+        log_progress(state, f"entry_node: 前回ビルドの指紋を読み込み ({len(previous['fingerprints'])} files)")
     return state
 
 def parse_design(state: AppState):
+    design_hash = text_hash(state["design"])
+    if state.get("sections") and state.get("design_hash") == design_hash:
+        log_progress(state, "parse_design: 設計に変更なし（前回の sections を再利用）")
+        return {"plan": file_plan(state["sections"])}
     log_progress(state, "parse_design: 構造化中")
-    raw = safe_invoke(f"Segment the following design document into JSON sections:\n\n{state['design']}\n")
-    raw = remove_think_tags(raw)
-    raw = remove_after_last_fence(raw)
-    raw = remove_code_fences(raw)
-    sections = trim_backtick_content(raw)
-    return {"sections": sections}
-
-def gen_and_write(state: AppState, filekey: str):
-    log_progress(state, f"gen: {filekey} を生成中")
-    prompt = f"Generate `{filekey}` according to these design sections:\n{state['sections']}"
+    raw = safe_invoke(
+        "Segment the following design document into a JSON object. Use a top-level \"title\" "
+        f"(project name) and these keys: {', '.join(config.DESIGN_SECTIONS)}. "
+        "Put every requirement under the key it belongs to; use \"\" for keys the document does not cover. "
+        "Also add \"entities\": a JSON list of the resources the API manages, as singular snake_case names."
+        f"\n\n{state['design']}\n",
+        on_token=lambda t: emit_event({"node": "parse", "token": t}),
+    )
+    sections = _clean_llm_output(raw)
+    plan = file_plan(sections)
+    entities = ", ".join(entity_names(sections))
+    log_progress(state, f"parse_design: ファイル計画 {len(plan)} files（エンティティ: {entities}）")
+    return {"sections": sections, "design_hash": design_hash, "plan": plan}
+
+DB_SCHEMA_PROMPT = """
+Extract the database schema from the following design document as a JSON object:
+{{"db_type": "postgresql" or "sqlite", "tables": [{{"name": "...", "columns": [{{"name": "...", "type": "...",
+"primary_key": true/false, "nullable": true/false, "foreign_key": "table.column" or null}}]}}]}}
+Return {{}} if the application does not store data. Return only the JSON object.
+
+{design}
+"""
+
+def parse_db_schema(state: AppState):
+    """設計から DB スキーマを取り出す（parse_design と並行して走る DB 層のブランチの入口）。"""
+    if "db_schema" in state and state.get("design_hash") == text_hash(state["design"]):
+        log_progress(state, "parse_db_schema: 設計に変更なし（前回のスキーマを再利用）")
+        return {}
+    log_progress(state, "parse_db_schema: DB スキーマ抽出中")
+    with routing_for("models.py"):
+        raw = safe_invoke(DB_SCHEMA_PROMPT.format(design=state["design"]))
     try:
-        raw = safe_invoke(prompt)
-        log_progress(state, f"← LLM 応答受信: {filekey}")
-    except Exception as e:
-        log_progress(state, f"!! LLM 呼び出しエラー ({filekey}): {e}")
+        schema = json.loads(_clean_llm_output(raw) or "{}")
+    except json.JSONDecodeError:
+        log_progress(state, "parse_db_schema: JSON として読めないため DB 層を作りません")
+        return {"db_schema": {}}
+    tables = schema.get("tables") if isinstance(schema, dict) else None
+    if not isinstance(tables, list) or not all(isinstance(t, dict) and t.get("name") for t in tables) or not tables:
+        return {"db_schema": {}}
+    return {"db_schema": {"db_type": str(schema.get("db_type") or "sqlite").lower(), "tables": tables}}
+
+def missing_tables(models: str, tables: list[dict]) -> list[str]:
+    """models.py に __tablename__ の定義がないテーブル（単数形 / 複数形の違いは許す）。構文エラーなら全部。"""
+    try:
+        tree = ast.parse(models)
+    except SyntaxError:
+        return [t["name"] for t in tables]
+    defined = {
+        node.value.value.lower().rstrip("s")
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+        and any(isinstance(t, ast.Name) and t.id == "__tablename__" for t in node.targets)
+    }
+    return [t["name"] for t in tables if str(t["name"]).lower().rstrip("s") not in defined]
+
+def render_compose(db_type: str, db_config: dict[str, str] | None) -> str | None:
+    """PostgreSQL 用の docker-compose.yml（config.DOCKER_COMPOSE_TEMPLATE）。SQLite なら不要なので None。"""
+    if not db_type.startswith("postgres"):
+        return None
+    values = {**config.DB_DEFAULTS, **(db_config or {})}
+    return config.DOCKER_COMPOSE_TEMPLATE.lstrip().format(**{f"db_{k}": v for k, v in values.items()})
+
+async def gen_db_files(state: AppState):
+    """
+    models.py と database.py を同時に生成し、docker-compose.yml はテンプレートから作る。
+    models.py がスキーマのテーブルを定義していなければ、DB 層は何も書き出さない。
+    """
+    schema = state.get("db_schema") or {}
+    if not schema.get("tables"):
+        return {}
+    log_progress(state, f"gen_db_files: DB 層を生成中（{len(schema['tables'])} tables）")
+    tables = json.dumps(schema["tables"], ensure_ascii=False, indent=2)
+    prompts = {
+        "models.py": config.MODELS_PROMPT_TEMPLATE.format(schema=tables),
+        "database.py": config.DATABASE_PROMPT_TEMPLATE.format(db_type=schema.get("db_type", "sqlite")),
+    }
+
+    async def run(filekey: str) -> str | None:
+        with span("file", filekey):
+            existing = await reusable_content(state, filekey, prompts[filekey])
+            if existing is not None:
+                return existing
+            annotate(source="llm")
+            try:
+                with routing_for(filekey):
+                    return _clean_llm_output(await async_invoke(prompts[filekey]))
+            except Exception as e:
+                log_progress(state, f"!! LLM 呼び出しエラー ({filekey}): {e}")
+                return None
+
+    models, database = await asyncio.gather(run("models.py"), run("database.py"))
+    missing = missing_tables(models or "", schema["tables"])
+    if models is None or missing:
+        log_progress(state, f"gen_db_files: models.py にテーブルがありません（{', '.join(missing)}）— DB 層を出力しません")
         return {}
 
-    raw = remove_think_tags(raw)
-    raw = remove_after_last_fence(raw)
-    raw = remove_code_fences(raw)
-    content = trim_backtick_content(raw)
+    files = {"models.py": models}
+    if database is not None:
+        files["database.py"] = database
+    compose = render_compose(schema.get("db_type", "sqlite"), state.get("db_config"))
+    if compose is not None:
+        files["docker-compose.yml"] = compose
+    base = pathlib.Path(state["project_dir"])
+    for filekey, content in files.items():
+        await asyncio.to_thread(write_file, base / filekey, content)
+        log_progress(state, f"write: {base / filekey}")
+    return {
+        "files": files,
+        "written": [str(base / k) for k in files],
+        "fingerprints": {k: file_fingerprint(k, prompts[k]) for k in files if k in prompts},
+        "plan": list(files),
+    }
+
+def build_file_prompt(state: AppState, filekey: str) -> str | list[dict[str, str]]:
+    # 依存ファイルが生成済みなら参照用に添える
+    files = state.get("files", {})
+    plan = tuple(state.get("plan") or ())
+    existing = "".join(
+        f"\n\nExisting `{dep}`:\n{files[dep]}"
+        for dep in file_dependencies(plan or (filekey, *files)).get(filekey, []) if dep in files
+    )
+    if config.SHARED_PROMPT_PREFIX:
+        # 共通の system メッセージを先頭に、ファイルごとの指示を後ろに置く（サーバー側で先頭の KV を再利用させる）
+        focus = sections_for(filekey)
+        instruction = f"Generate `{filekey}`." + (f" Focus on these sections: {', '.join(focus)}." if focus else "")
+        return [
+            {"role": "system", "content": shared_prefix(state["sections"], plan)},
+            {"role": "user", "content": instruction + existing},
+        ]
+    # このファイルが使うセクションだけを全文で、残りは要約して予算内に収める
+    prompt = f"Generate `{filekey}` according to these design sections:\n{sections_prompt(state['sections'], filekey)}"
+    if plan:
+        prompt += f"\n\nProject files:\n{files_prompt(plan)}"
+    return prompt + existing
+
+async def reusable_content(state: AppState, filekey: str, prompt: str | list[dict[str, str]]) -> str | None:
+    """入力が前回と同じで、チェックにも引っかかっていなければ既存ファイルの内容を返す。"""
+    out_path = pathlib.Path(state["project_dir"]) / filekey
+    if filekey in state.get("flagged", []) or not out_path.exists() \
+            or state.get("fingerprints", {}).get(filekey) != file_fingerprint(filekey, prompt):
+        return None
+    existing = await asyncio.to_thread(out_path.read_text, encoding="utf-8")
+    if not existing.strip():
+        return None
+    log_progress(state, f"skip: {filekey}（入力に変更なし）")
+    annotate(source="reuse")
+    return existing
+
+async def gen_and_write(state: AppState, filekey: str) -> str | None:
+    prompt = build_file_prompt(state, filekey)
+    out_path = pathlib.Path(state["project_dir"]) / filekey
+    flagged = filekey in state.get("flagged", [])
+    existing = await reusable_content(state, filekey, prompt)
+    if existing is not None:
+        return existing
+
+    # 定型ファイルはテンプレートから描画し、LLM を呼ばない
+    content = render_boilerplate(filekey, state.get("sections", ""))
+    if content is not None:
+        log_progress(state, f"template: {filekey} をテンプレートから生成")
+        annotate(source="template")
+    else:
+        annotate(source="llm")
+        log_progress(state, f"gen: {filekey} を{'再' if flagged else ''}生成中")
+        try:
+            # 指摘されたファイルは同じ応答を返さないようキャッシュを使わない
+            with routing_for(filekey):
+                raw = await (async_invoke(prompt, use_cache=False) if flagged else async_invoke(prompt))
+            log_progress(state, f"← LLM 応答受信: {filekey}")
+        except Exception as e:
+            log_progress(state, f"!! LLM 呼び出しエラー ({filekey}): {e}")
+            return None
+        content = _clean_llm_output(raw)
 
     try:
-        base = pathlib.Path(state["project_dir"])
-        out_path = base / filekey
-        out_path.parent.mkdir(parents=True, exist_ok=True)
-        out_path.write_text(content, encoding="utf-8")
+        await asyncio.to_thread(write_file, out_path, content)
         log_progress(state, f"write: {out_path}")
     except Exception as e:
         log_progress(state, f"!! ファイル書き込みエラー ({filekey}): {e}")
-        return {}
+        return None
+
+    return content
+
+async def gen_files_parallel(state: AppState, keys: list[str], concurrency: int | None = None,
+                             deps: dict[str, list[str]] | None = None) -> dict[str, str]:
+    """
+    keys の各ファイルを同時に生成し、成功したものを {ファイルキー: 内容} で返す。
+
+    Args:
+        state: 現在の状態（sections / project_dir を参照）
+        keys: 生成するファイルキー
+        concurrency: 同時に LLM へ投げるリクエスト数の上限（省略時は全件同時）
+        deps: ファイル → 先に生成して参照するファイル。依存先が終わり次第（レイヤーの完了を待たずに）始める
+    """
+    deps = deps or {}
+    sem = asyncio.Semaphore(concurrency or max(len(keys), 1))
+    generated: dict[str, str] = {}
+    tasks: dict[str, asyncio.Task] = {}
+
+    async def run(key: str):
+        await asyncio.gather(*(tasks[d] for d in deps.get(key, []) if d in tasks))
+        # 依存先の生成結果をプロンプトに添えられるよう、生成済みのファイルを重ねた状態で生成する
+        view = {**state, "files": {**state.get("files", {}), **generated}} if deps.get(key) else state
+        queued = time.perf_counter()
+        async with sem:
+            with span("file", key, wait=round(time.perf_counter() - queued, 4)):
+                content = await gen_and_write(view, key)
+        if content is not None:
+            generated[key] = content
+        return key, content
+
+    # 依存先のタスクを先に作る（循環があれば schedule_layers が ValueError）
+    for key in (k for layer in schedule_layers(keys, deps) for k in layer):
+        tasks[key] = asyncio.ensure_future(run(key))
+    results = await asyncio.gather(*(tasks[k] for k in keys))
+    return {k: content for k, content in results if content is not None}
+
+def schedule_layers(keys: list[str], deps: dict[str, list[str]]) -> list[list[str]]:
+    """
+    依存関係からファイルキーをレイヤーに分ける（Kahn 法）。
+    同じレイヤーのファイルは互いに独立しており、同時に生成できる。
+    keys に含まれない依存先は無視する。
+    """
+    remaining = {k: {d for d in deps.get(k, []) if d in keys and d != k} for k in keys}
+    layers: list[list[str]] = []
+    while remaining:
+        ready = [k for k in keys if k in remaining and not remaining[k]]
+        if not ready:
+            raise ValueError(f"循環依存があります: {sorted(remaining)}")
+        layers.append(ready)
+        for k in ready:
+            del remaining[k]
+        for pending in remaining.values():
+            pending.difference_update(ready)
+    return layers
+
+def make_generate_node(name: str, concurrency: int | None):
+    """ファイル計画（state["plan"]）の全ファイルを依存順に並列生成するノード（sync / async 両対応）を作る。"""
+    async def agenerate(state: AppState):
+        keys = list(state.get("plan") or file_plan(state.get("sections", "")))
+        deps = file_dependencies(tuple(keys))
+        log_progress(state, f"generate: {len(keys)} files（依存の段数 {len(schedule_layers(keys, deps))}）")
+        files = await gen_files_parallel(state, keys, concurrency, deps)
+        base = pathlib.Path(state["project_dir"])
+        view = {**state, "plan": keys, "files": {**state.get("files", {}), **files}}
+        fingerprints = {k: file_fingerprint(k, build_file_prompt(view, k)) for k in files}
+        return {"files": files, "written": [str(base / k) for k in files], "fingerprints": fingerprints}
+
+    def generate(state: AppState):
+        return asyncio.run(agenerate(state))
+
+    return traced_node(name, generate, agenerate)
 
-    state.setdefault("written", []).append(str(out_path))
-    state[filekey] = content
-    return {filekey: content}
+def gen_db(state: AppState):
+    return asyncio.run(gen_db_files(state))
 
 def consistency_check(state: AppState):
     log_progress(state, "consistency_check: 整合性チェック中")
-    files = {k: state[k] for k in state if k.endswith((' .py', '.json', '.jsx')) and isinstance(state[k], str)}
-    issues = quick_check(files)
+    generated = state.get("files", {})
+    files = {k: v for k, v in generated.items() if k.endswith(('.py', '.json', '.jsx', '.js'))}
+    # 生成対象外でもディスク上にあるフロントエンドのファイルは import 先として扱う
+    on_disk = set()
+    for root, dirs, names in os.walk(pathlib.Path(state["project_dir"]) / "frontend"):
+        dirs[:] = [d for d in dirs if d != "node_modules"]
+        rel = pathlib.Path(root).relative_to(state["project_dir"])
+        on_disk.update((rel / n).as_posix() for n in names)
+    issues = analyze_project(files, on_disk)
+    flagged = list(dict.fromkeys(i["file"] for i in issues))
     if issues:
-        log_progress(state, "consistency_check: STATIC_ISSUES 検出")
-        return {"check_result": "STATIC_ISSUES " + "; ".join(issues)}
+        log_progress(state, f"consistency_check: STATIC_ISSUES 検出 ({', '.join(flagged)})")
+        return {
+            "check_result": "STATIC_ISSUES " + "; ".join(format_issue(i) for i in issues),
+            "flagged": flagged,
+            "issues": issues,
+        }
     log_progress(state, "consistency_check: OK")
-    return {"check_result": "OK"}
+    return {"check_result": "OK", "flagged": [], "issues": []}
+
+def repairable_files(state: AppState) -> list[str]:
+    """リトライ回数が上限に達していない指摘ファイル。"""
+    attempts = state.get("repair_attempts", {})
+    return [f for f in state.get("flagged", []) if attempts.get(f, 0) < config.MAX_REPAIR_ATTEMPTS]
+
+def route_after_check(state: AppState) -> str:
+    if repairable_files(state):
+        return "repair"
+    return "validate" if config.VALIDATE_BUILD and not state.get("flagged") else "finalize"
+
+def route_after_validate(state: AppState) -> str:
+    return "repair" if repairable_files(state) else "finalize"
+
+def validation_issues(report: ValidationReport, files: list[str]) -> list[Issue]:
+    """失敗したスモーク検証を、出力に名前の出てくる生成ファイルへの指摘にする。"""
+    issues: list[Issue] = []
+    owners = {"package_json": ["frontend/package.json"], "app_import": ["main.py"], "tests": ["tests/test_main.py"]}
+    for check in report["checks"]:
+        if check["status"] != "failed":
+            continue
+        # トレースバックに出てくる Python ファイル（routes/task.py など）も修復対象にする
+        mentioned = [f for f in files if f.endswith(".py") and f in check["detail"]]
+        for f in dict.fromkeys(owners.get(check["name"], []) + mentioned):
+            issues.append(Issue(file=f, kind="runtime", line=None,
+                                message=f"smoke {check['name']} failed:\n{check['detail']}"))
+    return issues
+
+def validate(state: AppState):
+    """生成したアプリを実際に import・起動し、生成されたテストを実行する。"""
+    log_progress(state, "validate: スモーク検証中")
+    report = validate_project(state["project_dir"])
+    for check in report["checks"]:
+        log_progress(state, f"validate: {check['name']} {check['status']} ({check['seconds']}s)")
+    issues = validation_issues(report, list(state.get("files", {})))
+    if not issues:
+        return {"validation": report}
+    flagged = list(dict.fromkeys(i["file"] for i in issues))
+    log_progress(state, f"validate: 失敗 ({', '.join(flagged)})")
+    return {
+        "validation": report,
+        "check_result": "SMOKE_FAILED " + "; ".join(format_issue(i).splitlines()[0] for i in issues),
+        "flagged": flagged,
+        "issues": issues,
+    }
+
+def build_repair_prompt(filekey: str, content: str, issues: list[Issue]) -> str:
+    problems = "\n".join(
+        f"- [{i['kind']}] line {i['line']}: {i['message']}" if i["line"] else f"- [{i['kind']}] {i['message']}"
+        for i in issues
+    )
+    return (
+        f"The file `{filekey}` failed static checks:\n{problems}\n\n"
+        f"Fix only these problems and return the complete corrected `{filekey}`.\n\n"
+        f"Current `{filekey}`:\n{content}"
+    )
+
+async def repair_file(state: AppState, filekey: str, attempt: int) -> str | None:
+    # 同じ失敗を繰り返すモデルで GPU を占有しないよう、試行ごとに待ち時間を倍にする
+    delay = config.REPAIR_BACKOFF * (2 ** (attempt - 1))
+    if delay > 0:
+        await asyncio.sleep(delay)
+    log_progress(state, f"repair: {filekey} を修復中（{attempt}/{config.MAX_REPAIR_ATTEMPTS} 回目）")
+    issues = [i for i in state.get("issues", []) if i["file"] == filekey]
+    prompt = build_repair_prompt(filekey, state.get("files", {}).get(filekey, ""), issues)
+    try:
+        with routing_for(filekey):
+            raw = await async_invoke(prompt)
+    except Exception as e:
+        log_progress(state, f"!! LLM 呼び出しエラー ({filekey}): {e}")
+        return None
+
+    content = _clean_llm_output(raw)
+
+    try:
+        await asyncio.to_thread(write_file, pathlib.Path(state["project_dir"]) / filekey, content)
+    except Exception as e:
+        log_progress(state, f"!! ファイル書き込みエラー ({filekey}): {e}")
+        return None
+    return content
+
+async def arepair(state: AppState):
+    """指摘されたファイルだけを、そのエラー内容と一緒に LLM へ送り直す。"""
+    targets = repairable_files(state)
+    attempts = state.get("repair_attempts", {})
+    next_attempts = {f: attempts.get(f, 0) + 1 for f in targets}
+    async def run(filekey: str):
+        with span("file", filekey, repair=next_attempts[filekey]):
+            return await repair_file(state, filekey, next_attempts[filekey])
+
+    results = await asyncio.gather(*(run(f) for f in targets))
+    files = {f: content for f, content in zip(targets, results) if content is not None}
+    return {"files": files, "repair_attempts": next_attempts}
+
+def repair(state: AppState):
+    return asyncio.run(arepair(state))
 
 def finalize(state: AppState):
-    log_progress(state, "build 完了 🎉")
-    # structure.json 書き出し
+    if state.get("flagged"):
+        log_progress(state, f"build 完了（修復リトライ上限到達・未解決: {', '.join(state['flagged'])}）")
+    else:
+        log_progress(state, "build 完了 🎉")
+    # structure.json 書き出し（refactor_ui / インクリメンタルビルドが参照する）
     project_dir = pathlib.Path(state['project_dir'])
-    app_dir = project_dir / 'app'
-    app_dir.mkdir(parents=True, exist_ok=True)
+    deps = scan_dependencies(str(project_dir))
     structure = {
         'sections': state.get('sections', ''),
         'written': state.get('written', []),
-        'python_deps': sorted(list(extract_python_dependencies(str(project_dir)))),
-        'node_deps': extract_node_dependencies(str(project_dir)),
-        'file_keys': FILE_KEYS
+        'python_deps': deps['python'],
+        'node_deps': deps['node'],
+        'file_keys': state.get('plan') or file_plan(state.get('sections', '')),
+        'db_schema': state.get('db_schema', {}),
+        'design_hash': state.get('design_hash', ''),
+        'fingerprints': state.get('fingerprints', {}),
+        'flagged': state.get('flagged', []),
+    }
+    update_structure(str(project_dir), structure)
+    log_progress(state, f"structure.json を書き出し: {project_dir / 'structure.json'}")
+    # record_structure / dashboard / CLI はこの結果を再利用する
+    return {"deps": deps}
+
+# ---------- ファイル計画 ----------
+# 生成時に参照するファイル（先に生成される）。依存先は計画中のファイルへのパターン。
+# ここにないファイルは互いに独立して同時生成する
+FILE_DEPENDENCIES: dict[str, list[str]] = {
+    "tests/test_main.py": ["main.py", "routes/*.py"],
+}
+
+def entity_names(sections: str) -> list[str]:
+    """sections の "entities" を snake_case の名前にする。なければ config.DEFAULT_ENTITIES。"""
+    raw = parse_sections(sections or "").get("entities")
+    names = raw if isinstance(raw, list) else re.split(r"[,\s]+", raw) if isinstance(raw, str) else []
+    slugs: list[str] = []
+    for name in names:
+        slug = re.sub(r"[^a-z0-9]+", "_", re.sub(r"(?<=[a-z0-9])([A-Z])", r"_\1", str(name)).lower()).strip("_")
+        if slug and not slug[0].isdigit() and slug not in slugs:
+            slugs.append(slug)
+    return slugs[:config.MAX_ENTITIES] or list(config.DEFAULT_ENTITIES)
+
+def file_plan(sections: str) -> list[str]:
+    """共通のファイル（config.FILE_KEYS）と、エンティティごとのファイル（config.ENTITY_FILE_KEYS）。"""
+    keys = list(config.FILE_KEYS)
+    for name in entity_names(sections):
+        camel = "".join(part.capitalize() for part in name.split("_"))
+        keys.extend(k.format(name=name, Name=camel) for k in config.ENTITY_FILE_KEYS)
+    return keys
+
+def file_dependencies(keys: tuple[str, ...]) -> dict[str, list[str]]:
+    """FILE_DEPENDENCIES のパターンを計画中のファイルに当てはめる。"""
+    return {
+        key: [k for pattern in patterns for k in keys if k != key and fnmatch(k, pattern)]
+        for key, patterns in FILE_DEPENDENCIES.items() if key in keys
     }
-    struct_path = app_dir / 'structure.json'
-    with struct_path.open('w', encoding='utf-8') as f:
-        json.dump(structure, f, ensure_ascii=False, indent=2)
-    log_progress(state, f"structure.json を書き出し: {struct_path}")
-    return {}
-
-# ---------- ファイル依存抽出 ----------
-def extract_python_dependencies(project_dir: str) -> set[str]:
-    stdlib_ignore = {"os", "sys", "time", "random", "re", "pathlib", "hashlib", "typing", "argparse", "json", "traceback"}
-    deps = set()
-    for py_file in pathlib.Path(project_dir).rglob("*.py"):
-        try:
-            text = py_file.read_text(encoding="utf-8")
-        except Exception:
-            continue
-        imports = re.findall(r"^\s*(?:import|from)\s+([\w\.]+)", text, re.MULTILINE)
-        for imp in imports:
-            root = imp.split(".")[0]
-            if root not in stdlib_ignore:
-                deps.add(root)
-    return deps
-
-def extract_node_dependencies(project_dir: str) -> dict:
-    pkg_path = pathlib.Path(project_dir) / "frontend" / "package.json"
-    if not pkg_path.exists():
-        return {}
-    try:
-        pkg = json.loads(pkg_path.read_text(encoding="utf-8"))
-        return pkg.get("dependencies", {})
-    except Exception:
-        return {}
-
-# ---------- 出力ファイル一覧 ----------
-FILE_KEYS = [
-    "main.py",
-    "schemas.py",
-    "routes/task.py",
-    "tests/test_main.py",
-    "openapi.json",
-    ".github/workflows/test.yml",
-    "frontend/src/App.jsx",
-    "frontend/src/pages/Home.jsx",
-    "frontend/src/components/TaskCard.jsx",
-    "frontend/package.json",
-    "frontend/vite.config.js",
-    "frontend/index.html",
-]
 
 # ---------- build() ----------
-def build(group_size: int = 3):
+def build(group_size: int = config.DEFAULT_GROUP_SIZE, checkpointer=None):
+    """
+    ビルドグラフを構築する。
+
+        entry ─┬─ parse ── generate ─┬─ check ─ (repair / validate) ─ finalize
+               └─ parse_db ─ gen_db ─┘
+
+    generate は parse_design が決めたファイル計画の全ファイルを asyncio 上で同時に生成し、
+    依存のあるファイル（FILE_DEPENDENCIES）だけが依存先の完了を待つ。DB 層（models.py / database.py /
+    docker-compose.yml）は別ブランチで並行して作り、check で合流する。
+    ファイル数は実行時に決まるので、設計が大きくなってもグラフの段数は増えない。
+
+    Args:
+        group_size: 同時に LLM へ投げる生成リクエスト数の上限
+        checkpointer: ノード完了ごとに state を保存する LangGraph の checkpointer
+    """
     builder = StateGraph(state_schema=AppState)
-    builder.add_node("entry", RunnableLambda(entry_node))
-    builder.add_node("parse", RunnableLambda(parse_design))
-    builder.add_node("check", RunnableLambda(consistency_check))
-    builder.add_node("finalize", RunnableLambda(finalize))
+    builder.add_node("entry", traced_node("entry", entry_node))
+    builder.add_node("parse", traced_node("parse", parse_design))
+    builder.add_node("parse_db", traced_node("parse_db", parse_db_schema))
+    builder.add_node("generate", make_generate_node("generate", group_size))
+    builder.add_node("gen_db", traced_node("gen_db", gen_db, gen_db_files))
+    builder.add_node("check", traced_node("check", consistency_check))
+    builder.add_node("repair", traced_node("repair", repair, arepair))
+    builder.add_node("validate", traced_node("validate", validate))
+    builder.add_node("finalize", traced_node("finalize", finalize))
 
     builder.set_entry_point("entry")
     builder.add_edge("entry", "parse")
-
-    prev_nodes = ["parse"]
-    for i in range(0, len(FILE_KEYS), group_size):
-        group = FILE_KEYS[i : i + group_size]
-        current = []
-        for key in group:
-            def make_fn(k: str):
-                return lambda s: gen_and_write(s, k)
-            node_id = f"gen_{hashlib.md5(key.encode()).hexdigest()}"
-            builder.add_node(node_id, RunnableLambda(make_fn(key)))
-            for p in prev_nodes:
-                builder.add_edge(p, node_id)
-            current.append(node_id)
-        prev_nodes = current
-
-    for p in prev_nodes:
-        builder.add_edge(p, "check")
-
-    builder.add_conditional_edges("check", lambda s: {
-        "parse": ("STATIC_ISSUES" in s.get("check_result", "")),
-        "finalize": not ("STATIC_ISSUES" in s.get("check_result", ""))
-    })
-
-    return builder.compile()
+    builder.add_edge("entry", "parse_db")
+    builder.add_edge("parse", "generate")
+    builder.add_edge("parse_db", "gen_db")
+    builder.add_edge(["generate", "gen_db"], "check")
+
+    # 静的チェックの指摘はファイル単位で repair へ送り、上限到達後は finalize へ抜ける。
+    # 静的チェックを通ったら実際に起動・テストし、失敗はその出力とともに repair へ送る
+    builder.add_conditional_edges("check", route_after_check, ["repair", "validate", "finalize"])
+    builder.add_conditional_edges("validate", route_after_validate, ["repair", "finalize"])
+    builder.add_edge("repair", "check")
+    builder.set_finish_point("finalize")
+
+    return builder.compile(checkpointer=checkpointer)
+
+def build_key(group_size: int) -> tuple:
+    """
+    コンパイル結果を決める構成。ファイル計画は実行時の state、モデルの振り分けは呼び出し時に router が
+    決めるので、グラフの形を変えるのは同時生成数だけ。
+    """
+    return (group_size,)
+
+def get_build_graph(group_size: int = config.DEFAULT_GROUP_SIZE, checkpointer=None):
+    """build(group_size) を構成ごとに 1 回だけコンパイルして使い回す。"""
+    return with_checkpointer(compiled("build", lambda: build(group_size), *build_key(group_size)), checkpointer)
+
+def resumable_build(project_dir: str, resume: bool = False, group_size: int = config.DEFAULT_GROUP_SIZE):
+    """
+    project_dir にチェックポイントを残すビルドグラフと実行設定を返す。
+
+    resume=True なら前回のチェックポイントを引き継ぎ、graph.invoke(None, run_config) で
+    完了済みのノードを飛ばして続きから実行する。False なら前回分を破棄して新しく始める。
+    """
+    if resume and not has_checkpoint(project_dir):
+        raise FileNotFoundError(f"再開できるチェックポイントがありません: {project_dir}")
+    checkpointer = open_checkpointer(project_dir, fresh=not resume)
+    return get_build_graph(group_size, checkpointer), run_config()
 
 # ---------- モジュール実行用ユーティリティ ----------
 def prepare_state(design: str, out_dir: str = None) -> Dict:
@@ -230,16 +698,45 @@ def prepare_state(design: str, out_dir: str = None) -> Dict:
 # ---------- モジュール実行用 ----------
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="LangGraph Codegen")
-    parser.add_argument("--design", "-d", required=True, help="設計文書をここに渡す")
+    parser.add_argument("--design", "-d", default=None, help="設計文書をここに渡す")
     parser.add_argument("--out", "-o", default=None, help="出力先フォルダ名（省略時自動生成）")
+    parser.add_argument("--resume", "-r", default=None, metavar="PROJECT_DIR",
+                        help="中断したビルドを、このプロジェクトのチェックポイントから再開する")
+    parser.add_argument("--group-size", "-g", type=int, default=config.DEFAULT_GROUP_SIZE, help="同時生成数の上限")
+    parser.add_argument("--no-cache", action="store_true", help="LLM 応答キャッシュを使わない")
+    parser.add_argument("--yes", "-y", action="store_true", help="開始前の確認をしない（複数件は langgraph_v21.batch）")
     args = parser.parse_args()
+    if not args.design and not args.resume:
+        parser.error("--design か --resume のどちらかが必要です")
+    get_cache().bypass = args.no_cache
 
-    state = prepare_state(args.design, args.out)
-    print(f"CLI: using output folder {state['project_dir']}")
-    input("Enterキーでビルドを開始します（確認後に進めたい場合）→ ")
+    if args.resume:
+        state = {"project_dir": os.path.abspath(args.resume)}
+        print(f"CLI: resuming build in {state['project_dir']}")
+    else:
+        state = prepare_state(args.design, args.out)
+        print(f"CLI: using output folder {state['project_dir']}")
+        if not args.yes and sys.stdin.isatty():
+            input("Enterキーでビルドを開始します（確認後に進めたい場合）→ ")
 
-    graph = build(group_size=3)
-    result = graph.invoke(state)
+    try:
+        graph, run_cfg = resumable_build(state["project_dir"], resume=bool(args.resume), group_size=args.group_size)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    trace = setup_logging(state["project_dir"])
+    result = graph.invoke(None if args.resume else state, run_cfg)
+    record_structure(result)
+    cache_stats = get_cache().stats()
+    print(f"\n=== LLM CACHE === hits={cache_stats['hits']} misses={cache_stats['misses']}")
+    print("\n=== MODEL LATENCY ===")
+    for row in get_router().report():
+        print(f" - {row['model']} @ {row['base_url']}: calls={row['calls']} errors={row['errors']} "
+              f"avg={row['avg_sec']}s max={row['max_sec']}s")
+
+    print(f"\n=== CRITICAL PATH === (build {trace.build_id})")
+    for row in critical_path(load_trace(state["project_dir"], trace.build_id)):
+        slowest = f" ← {row['slowest_file']} {row['file_duration']}s" if row["slowest_file"] else ""
+        print(f" - {row['node']}: {row['duration']}s ({row['share']:.0%}){slowest}")
 
     print("\n=== BUILD PROGRESS ===")
     for msg in result.get("progress", []):
@@ -251,20 +748,19 @@ if __name__ == "__main__":
         print(" -", p)
 
     print("\n=== PYTHON DEPENDENCIES ===")
-    py_deps = extract_python_dependencies(state["project_dir"])
+    deps = result.get("deps") or scan_dependencies(state["project_dir"])
+    py_deps = deps["python"]
     if py_deps:
         sorted_deps = sorted(py_deps)
         for dep in sorted_deps:
             print(" -", dep)
-        req_txt = "\n".join(sorted_deps)
-        req_path = pathlib.Path(state["project_dir"]) / "requirements.txt"
-        req_path.write_text(req_txt, encoding="utf-8")
-        print(f"\n📝 requirements.txt を生成しました → {req_path}")
+        if write_requirements(state["project_dir"], sorted_deps):
+            print(f"\n📝 requirements.txt を生成しました → {pathlib.Path(state['project_dir']) / 'requirements.txt'}")
     else:
         print("（外部依存モジュールなし）")
 
     print("\n=== NODE DEPENDENCIES (from package.json) ===")
-    node_deps = extract_node_dependencies(state["project_dir"])
+    node_deps = deps["node"]
     if node_deps:
         for k, v in node_deps.items():
             print(f" - {k}: {v}")
@@ -0,0 +1,56 @@
+# langgraph_v21/graph_registry.py
+"""
+コンパイル済みグラフのプロセス内レジストリ
+
+グラフの組み立てとコンパイル（ノード・エッジの登録、チャネルの生成）は構成が同じなら毎回同じ結果になるので、
+(グラフ名, 構成キー) ごとに 1 回だけ行い、ジョブ・Streamlit のセッション・バッチビルドの間で使い回す。
+コンパイル済みグラフは状態を持たず、複数スレッドから同時に invoke / stream してよい。
+チェックポイントのようにビルドごとに異なるものは with_checkpointer で浅いコピーに付ける。
+"""
+import threading
+from typing import Any, Callable, TypedDict
+
+_graphs: dict[tuple[str, tuple], Any] = {}
+_lock = threading.Lock()
+
+
+class Topology(TypedDict):
+    name: str
+    key: tuple
+    nodes: list[str]
+    edges: list[tuple[str, str, bool]]   # (source, target, conditional)
+
+
+def compiled(name: str, factory: Callable[[], Any], *key: Any) -> Any:
+    """(name, key) のグラフを返す。未登録なら factory() でコンパイルして登録する。"""
+    with _lock:
+        graph = _graphs.get((name, key))
+        if graph is None:
+            graph = _graphs[(name, key)] = factory()
+        return graph
+
+
+def with_checkpointer(graph: Any, checkpointer: Any) -> Any:
+    """graph の浅いコピーに checkpointer を付ける（ノードやチャネルの定義は共有する）。"""
+    return graph.copy(update={"checkpointer": checkpointer}) if checkpointer is not None else graph
+
+
+def topology(name: str | None = None) -> list[Topology]:
+    """登録済みグラフのノードとエッジ（スケジューリングの確認用）。"""
+    with _lock:
+        items = [(k, g) for k, g in _graphs.items() if name is None or k[0] == name]
+    result = []
+    for (graph_name, key), graph in items:
+        drawable = graph.get_graph()
+        result.append(Topology(
+            name=graph_name,
+            key=key,
+            nodes=[n for n in drawable.nodes if not n.startswith("__")],
+            edges=[(e.source, e.target, e.conditional) for e in drawable.edges],
+        ))
+    return result
+
+
+def clear():
+    with _lock:
+        _graphs.clear()
@@ -0,0 +1,318 @@
+# langgraph_v21/jobs.py
+"""
+ダッシュボード用のバックグラウンドジョブキュー
+
+build / refactor をワーカースレッドで実行し、状態・進捗・受信中テキストを SQLite に保存する。
+Streamlit のスクリプトは submit() して get() をポーリングするだけなので、ページを再読み込みしても
+ジョブは止まらず、ジョブ ID から結果を再表示できる。
+ジョブは投入順に実行し、同時実行数は config.JOB_WORKERS で制限する。
+"""
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, TypedDict
+
+import config
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+MAX_PROGRESS_LINES = 200
+PARTIAL_INTERVAL = 0.5  # 秒。受信中テキストを DB に書く間隔
+
+
+class Job(TypedDict):
+    id: str
+    kind: str
+    status: str
+    payload: dict[str, Any]
+    result: dict[str, Any] | None
+    error: str | None
+    progress: list[str]
+    partial: str
+    created: float
+    started: float | None
+    finished: float | None
+
+
+class JobContext:
+    """ハンドラーから進捗を書き込むためのハンドル。"""
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self.queue = queue
+        self.job_id = job_id
+        self._partial: list[str] = []
+        self._flushed = 0.0
+
+    def progress(self, msg: str):
+        self.queue._append_progress(self.job_id, msg)
+
+    def token(self, token: str):
+        """受信中のトークン。DB への書き込みは PARTIAL_INTERVAL ごとにまとめる。"""
+        self._partial.append(token)
+        if time.monotonic() - self._flushed >= PARTIAL_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self._flushed = time.monotonic()
+        self.queue._update(self.job_id, partial="".join(self._partial))
+
+
+Handler = Callable[[dict[str, Any], JobContext], dict[str, Any]]
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    SQLite に永続化するジョブキューとワーカープール。
+
+    Args:
+        path: SQLite ファイルのパス
+        workers: 同時に実行するジョブ数
+        handlers: {ジョブ種別: ハンドラー}。ハンドラーは payload と JobContext を受け取り結果の dict を返す
+    """
+
+    def __init__(self, path: str, workers: int = 1, handlers: dict[str, Handler] | None = None):
+        self.path = path
+        self.workers = workers
+        self.handlers = handlers if handlers is not None else dict(HANDLERS)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._stop = threading.Event()
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL,"
+            " payload TEXT NOT NULL, result TEXT, error TEXT,"
+            " progress TEXT NOT NULL DEFAULT '[]', partial TEXT NOT NULL DEFAULT '',"
+            " owner INTEGER, created REAL NOT NULL, started REAL, finished REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created)")
+        self._conn.commit()
+
+    # ---- 参照 / 投入 ----
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Job:
+        return Job(
+            id=row["id"], kind=row["kind"], status=row["status"],
+            payload=json.loads(row["payload"]),
+            result=json.loads(row["result"]) if row["result"] else None,
+            error=row["error"], progress=json.loads(row["progress"]), partial=row["partial"],
+            created=row["created"], started=row["started"], finished=row["finished"],
+        )
+
+    def submit(self, kind: str, payload: dict[str, Any]) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"未知のジョブ種別: {kind}")
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(payload, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def list(self, limit: int = 20, kind: str | None = None) -> list[Job]:
+        sql = "SELECT * FROM jobs" + (" WHERE kind = ?" if kind else "") + " ORDER BY created DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, ((kind,) if kind else ()) + (limit,)).fetchall()
+        return [self._to_job(r) for r in rows]
+
+    def position(self, job_id: str) -> int:
+        """待ち行列での順番（0 なら次に実行）。キュー待ちでなければ -1。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND created < "
+                "(SELECT created FROM jobs WHERE id = ? AND status = ?)",
+                (QUEUED, job_id, QUEUED),
+            ).fetchone()
+            queued = self._conn.execute(
+                "SELECT 1 FROM jobs WHERE id = ? AND status = ?", (job_id, QUEUED)).fetchone()
+        return row[0] if queued else -1
+
+    # ---- 更新 ----
+    def _update(self, job_id: str, **fields: Any):
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def _append_progress(self, job_id: str, msg: str):
+        with self._lock:
+            row = self._conn.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            lines = (json.loads(row[0]) if row else []) + [msg]
+            self._conn.execute("UPDATE jobs SET progress = ? WHERE id = ?",
+                               (json.dumps(lines[-MAX_PROGRESS_LINES:], ensure_ascii=False), job_id))
+            self._conn.commit()
+
+    def _claim(self) -> Job | None:
+        """最も古いキュー待ちジョブを取り出して実行中にする（他プロセスのワーカーとも排他）。"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, owner = ?, started = ? WHERE id = ?",
+                        (RUNNING, os.getpid(), time.time(), row["id"]),
+                    )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return self.get(row["id"]) if row else None
+
+    def recover(self):
+        """終了したプロセスが実行中のまま残したジョブを、続きから再開する指定を付けてキューに戻す。"""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, owner, payload FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+            for row in rows:
+                if row["owner"] is None or not _pid_alive(row["owner"]):
+                    payload = dict(json.loads(row["payload"]), resume=True)
+                    self._conn.execute("UPDATE jobs SET status = ?, owner = NULL, payload = ? WHERE id = ?",
+                                       (QUEUED, json.dumps(payload, ensure_ascii=False), row["id"]))
+            self._conn.commit()
+
+    # ---- ワーカー ----
+    def run_one(self) -> bool:
+        """キュー待ちのジョブを 1 件実行する。なければ False。"""
+        job = self._claim()
+        if job is None:
+            return False
+        ctx = JobContext(self, job["id"])
+        try:
+            result = self.handlers[job["kind"]](job["payload"], ctx)
+            ctx.flush()
+            self._update(job["id"], status=DONE, finished=time.time(),
+                         result=json.dumps(result, ensure_ascii=False, default=str))
+        except Exception as e:
+            self._update(job["id"], status=FAILED, finished=time.time(), error=f"{type(e).__name__}: {e}")
+        return True
+
+    def _worker(self):
+        while not self._stop.is_set():
+            if not self.run_one():
+                self._wake.wait(timeout=1.0)
+                self._wake.clear()
+
+    def start(self):
+        """ワーカースレッドを起動する（二重起動しない）。"""
+        with self._lock:
+            if self._threads:
+                return
+        self.recover()
+        with self._lock:
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"graphforge-job-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+
+# ---------- ハンドラー ----------
+def run_build_job(payload: dict[str, Any], ctx: JobContext) -> dict[str, Any]:
+    """payload: {"design": 設計文書, "project_dir": 出力先, "resume": チェックポイントから再開するか}"""
+    from langgraph_v21.checkpoint import has_checkpoint
+    from langgraph_v21.deps import scan_dependencies, write_requirements
+    from langgraph_v21.graph_build import prepare_state, resumable_build
+    from langgraph_v21.structure_writer import record_structure
+    from langgraph_v21.telemetry import setup_logging
+
+    state = prepare_state(payload["design"], out_dir=payload["project_dir"])
+    trace = setup_logging(state["project_dir"], build_id=ctx.job_id)
+    resume = bool(payload.get("resume")) and has_checkpoint(state["project_dir"])
+    if resume:
+        ctx.progress("チェックポイントから再開します")
+    graph, run_cfg = resumable_build(state["project_dir"], resume=resume)
+    result = state
+    for mode, chunk in graph.stream(None if resume else state, run_cfg, stream_mode=["custom", "values"]):
+        if mode == "values":
+            result = chunk
+        elif "progress" in chunk:
+            ctx.progress(chunk["progress"])
+    record_structure(result)
+    # ダッシュボードは表示だけにし、requirements.txt はビルドの完了時に 1 回だけ書く
+    deps = result.get("deps") or scan_dependencies(result["project_dir"])
+    if deps["python"]:
+        write_requirements(result["project_dir"], deps["python"])
+    summary = {key: result.get(key) for key in ("project_dir", "check_result", "written", "flagged", "deps")}
+    return dict(summary, build_id=trace.build_id)
+
+
+def run_refactor_job(payload: dict[str, Any], ctx: JobContext) -> dict[str, Any]:
+    """payload: prepare_refactor_state の引数"""
+    from langgraph_v21.refactor_graph import get_refactor_graph, prepare_refactor_state
+    from langgraph_v21.telemetry import setup_logging
+
+    setup_logging(payload["project_dir"], build_id=ctx.job_id)
+    state = prepare_refactor_state(**{k: v for k, v in payload.items() if k != "resume"})
+    result = state
+    for mode, chunk in get_refactor_graph().stream(state, stream_mode=["custom", "values"]):
+        if mode == "values":
+            result = chunk
+        elif "token" in chunk:
+            ctx.token(chunk["token"])
+    for msg in result.get("progress", []):
+        ctx.progress(msg)
+    return {key: result.get(key, "") for key in ("revised_code", "diff", "check_result")}
+
+
+def run_batch_refactor_job(payload: dict[str, Any], ctx: JobContext) -> dict[str, Any]:
+    """payload: prepare_batch_state の引数"""
+    from langgraph_v21.batch_refactor import get_batch_refactor_graph, prepare_batch_state
+    from langgraph_v21.telemetry import setup_logging
+
+    setup_logging(payload["project_dir"], build_id=ctx.job_id)
+    state = prepare_batch_state(**{k: v for k, v in payload.items() if k != "resume"})
+    result = get_batch_refactor_graph().invoke(state)
+    for msg in result.get("progress", []):
+        ctx.progress(msg)
+    return {key: result.get(key) for key in ("files", "revised", "diffs", "issues", "check_result", "applied")}
+
+
+HANDLERS: dict[str, Handler] = {
+    "build": run_build_job, "refactor": run_refactor_job, "batch_refactor": run_batch_refactor_job,
+}
+
+_queue: JobQueue | None = None
+_queue_lock = threading.Lock()
+
+
+def get_queue() -> JobQueue:
+    """プロセス共有のキュー。初回呼び出しでワーカーを起動する（Streamlit の再実行をまたいで残る）。"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(config.JOB_DB_PATH, workers=config.JOB_WORKERS)
+            _queue.start()
+        return _queue
@@ -1,22 +1,232 @@
+# langgraph_v21/llm.py
+"""
+Ollama チャット API（/api/chat, stream=true）への共有ゲートウェイ
+
+応答全体を待たず、トークンが届いた順にジェネレータ / 非同期イテレータで返す。
+build / refactor / dashboard の全呼び出しがここを通り、以下を共有する:
+- keep-alive するプール済み HTTP セッション
+- 接続・受信タイムアウトとリクエスト全体の期限
+- 一時的なエラー（接続失敗・429・5xx）へのジッター付きリトライ
+- Ollama の OLLAMA_NUM_PARALLEL に合わせた同時リクエスト数の上限
+
+requests は最初のリクエストで import する（ダッシュボードの再実行や CLI の起動を軽くするため）。
+"""
+import asyncio
+import contextvars
+import json
+import random
+import threading
 import time
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Iterator
+
+import config
+from langgraph_v21.sanitizer import strip_think
+from langgraph_v21.telemetry import annotate, count
+
+if TYPE_CHECKING:
+    import requests
+
+
+def to_messages(prompt: str | list[Any]) -> list[dict[str, str]]:
+    """プロンプト文字列または LangChain 形式のメッセージ列を Ollama の messages に変換する。"""
+    if isinstance(prompt, str):
+        return [{"role": "user", "content": prompt}]
+    roles = {"human": "user", "ai": "assistant"}
+    messages = []
+    for m in prompt:
+        if isinstance(m, dict):
+            messages.append({"role": m["role"], "content": m["content"]})
+        else:
+            role = getattr(m, "type", "user")
+            messages.append({"role": roles.get(role, role), "content": m.content})
+    return messages
+
+
+# ---------- 共有セッション / 同時実行数 ----------
+RETRY_STATUS = {429, 500, 502, 503, 504}
+TOKEN_COUNT_FIELDS = (("prompt_tokens", "prompt_eval_count"), ("completion_tokens", "eval_count"))
+
+_session: "requests.Session | None" = None
+_slots: dict[str, threading.BoundedSemaphore] = {}  # base URL ごと
+_parallelism: int | None = None  # set_parallelism で全サーバーに指定した上限（未指定なら config.OLLAMA_NUM_PARALLEL）
+_session_lock = threading.Lock()
+
+
+class TransientLLMError(RuntimeError):
+    """リトライで回復しうるエラー（接続失敗・タイムアウト・429/5xx）。"""
+
+
+def get_session() -> "requests.Session":
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=config.OLLAMA_NUM_PARALLEL * 2)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def get_slots(base_url: str) -> threading.BoundedSemaphore:
+    with _session_lock:
+        if base_url not in _slots:
+            _slots[base_url] = threading.BoundedSemaphore(_parallelism or config.OLLAMA_NUM_PARALLEL)
+        return _slots[base_url]
+
 
-# 疑似ストリーム出力で LLM 呼び出しをラップ
-def invoke_streaming(prompt: str, chunk_size: int = 80, delay: float = 0.05) -> str:
-    full_response = llm.chat(prompt) if hasattr(llm, "chat") else llm.invoke(prompt).content
-    streamed = ""
-    for i in range(0, len(full_response), chunk_size):
-        chunk = full_response[i:i+chunk_size]
-        print(chunk, end="", flush=True)  # コンソール即時出力（UIでキャプチャ可）
-        streamed += chunk
-        time.sleep(delay)  # 疑似ストリームの間隔
+def set_parallelism(n: int, base_url: str | None = None):
+    """
+    同時リクエスト数の上限を変更する（サーバー側の OLLAMA_NUM_PARALLEL と合わせる）。
+    上限は base URL ごとにかかる。base_url を省略すると既知の全サーバーと OLLAMA_BASE_URL、
+    以後に初めて使うサーバーをそれぞれ n にするので、複数のサーバーを使うプロセス全体では n × サーバー数まで同時に送る。
+    """
+    global _parallelism
+    with _session_lock:
+        if not base_url:
+            _parallelism = n
+        for url in [base_url] if base_url else list(_slots) + [config.OLLAMA_BASE_URL]:
+            _slots[url.rstrip("/")] = threading.BoundedSemaphore(n)
+
+
+def backoff_delay(attempt: int) -> float:
+    """full jitter の指数バックオフ。"""
+    return random.uniform(0, config.LLM_RETRY_BACKOFF * (2 ** attempt))
+
+
+def _stream_once(url: str, payload: dict, deadline: float, budget: float) -> Iterator[str]:
+    """1 回分のリクエスト。deadline は期限の時刻（time.monotonic）、budget はその長さ（秒、エラー表示用）。"""
+    import requests
+    try:
+        res = get_session().post(
+            url, json=payload, stream=True,
+            timeout=(config.LLM_CONNECT_TIMEOUT, config.LLM_READ_TIMEOUT),
+        )
+    except (requests.ConnectionError, requests.Timeout) as e:
+        raise TransientLLMError(f"Ollama 接続失敗: {e}") from e
+    with res:
+        if res.status_code in RETRY_STATUS:
+            raise TransientLLMError(f"Ollama HTTP {res.status_code}")
+        res.raise_for_status()
+        try:
+            for line in res.iter_lines():
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"LLM 応答が期限 ({budget:g}s) を超えました")
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(data["error"])
+                token = data.get("message", {}).get("content", "")
+                if token:
+                    yield token
+                if data.get("done"):
+                    # Ollama は最終行でプロンプト / 応答のトークン数を返す
+                    annotate(**{name: data[field] for name, field in TOKEN_COUNT_FIELDS if field in data})
+                    break
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise TransientLLMError(f"Ollama 受信失敗: {e}") from e
+
+
+def stream_chat(prompt: str | list[Any], model: str | None = None, base_url: str | None = None,
+                deadline: float | None = None) -> Iterator[str]:
+    """
+    トークンを届いた順に yield する。
+
+    最初のトークンを受け取る前の一時的なエラーはジッター付きでリトライする。
+    受信途中で失敗した場合は、既に返したトークンと矛盾しないようそのまま例外にする。
+
+    Args:
+        deadline: リクエスト全体の期限（秒）。省略時は config.LLM_DEADLINE。
+            同時実行数の枠が空くのを待つ時間は含めない（枠を取ってから数える）
+    """
+    server = (base_url or config.OLLAMA_BASE_URL).rstrip("/")
+    url = f"{server}/api/chat"
+    payload = {"model": model or config.MODEL, "messages": to_messages(prompt), "stream": True,
+               "keep_alive": config.OLLAMA_KEEP_ALIVE}
+    budget = deadline or config.LLM_DEADLINE
+    with get_slots(server):
+        limit = time.monotonic() + budget
+        if USE_DUMMY:
+            # 模擬バックエンドにも実サーバーと同じ同時実行数の上限をかける
+            yield from DUMMY_BACKEND.stream(prompt)
+            return
+        attempt = 0
+        while True:
+            received = False
+            try:
+                for token in _stream_once(url, payload, limit, budget):
+                    received = True
+                    yield token
+                return
+            except TransientLLMError:
+                if received or attempt >= config.LLM_MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt)
+                if time.monotonic() + delay > limit:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                count("retries")
+
+
+async def astream_chat(prompt: str | list[Any], model: str | None = None,
+                       base_url: str | None = None, deadline: float | None = None) -> AsyncIterator[str]:
+    """stream_chat の非同期版。受信はワーカースレッドで行い、イベントループはブロックしない。"""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for token in stream_chat(prompt, model, base_url, deadline):
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, token)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    # 呼び出し元のコンテキスト（テレメトリのスパン等）を受信スレッドへ引き継ぐ
+    ctx = contextvars.copy_context()
+    threading.Thread(target=ctx.run, args=(produce,), daemon=True).start()
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+# ストリームをコンソールへ逐次出力しつつ全文を返す
+def invoke_streaming(prompt: str | list[Any], on_token: Callable[[str], None] | None = None) -> str:
+    if on_token is None:
+        on_token = lambda t: print(t, end="", flush=True)  # コンソール即時出力（UIでキャプチャ可）
+    streamed = []
+    for token in strip_think(stream_chat(prompt)):
+        on_token(token)
+        streamed.append(token)
     print()  # 行末改行
-    return streamed
+    return "".join(streamed)
 
 # ダミーLLMの定義（テスト用）
 class DummyLLM:
     def chat(self, prompt):
         return "これは模擬的な応答です。逐次的に表示されるように設計されています。ご確認ください。"
 
+    def stream(self, prompt):
+        for sentence in self.chat(prompt).split("。"):
+            if sentence:
+                yield sentence + "。"
+
 # 使用切り替え（本番 or モック）
 USE_DUMMY = False
-llm = DummyLLM() if USE_DUMMY else ChatOllama(model="qwen3:8b", base_url="http://localhost:11434")
+# USE_DUMMY 時の応答元。stream(prompt) を持つオブジェクトに差し替えられる（benchmarks/fake_llm.py など）
+DUMMY_BACKEND = DummyLLM()
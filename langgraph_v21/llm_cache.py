@@ -0,0 +1,163 @@
+# langgraph_v21/llm_cache.py
+"""
+LLM 応答のコンテンツアドレス型キャッシュ
+
+model + base_url + 正規化したプロンプト（またはメッセージ列）のハッシュをキーに、
+応答テキストを SQLite に保存する。件数・サイズ・経過時間で LRU 削除する。
+"""
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import Any
+
+import config
+
+
+def normalize_payload(payload: str | list[Any]) -> str:
+    """
+    プロンプトまたはメッセージ列をキー計算用の文字列に正規化する。
+    改行コードと行末空白の違いは同一プロンプトとして扱う。
+    """
+    def norm(text: str) -> str:
+        lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        return "\n".join(line.rstrip() for line in lines).strip()
+
+    if isinstance(payload, str):
+        return norm(payload)
+    messages = []
+    for m in payload:
+        if isinstance(m, dict):
+            role, content = m.get("role", ""), m.get("content", "")
+        else:
+            role, content = getattr(m, "type", ""), getattr(m, "content", str(m))
+        messages.append({"role": role, "content": norm(str(content))})
+    return json.dumps(messages, ensure_ascii=False, sort_keys=True)
+
+
+def make_key(model: str, base_url: str, payload: str | list[Any]) -> str:
+    h = hashlib.sha256()
+    for part in (model, base_url.rstrip("/"), normalize_payload(payload)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class LLMCache:
+    """
+    SQLite バックエンドの LRU キャッシュ。スレッドから共有して使える。
+
+    Args:
+        path: SQLite ファイルのパス
+        max_entries: 保持する最大件数
+        max_bytes: 応答テキストの合計サイズ上限
+        max_age: エントリの有効期間（秒）。None なら無期限
+        bypass: True なら読み書きせず常にミス扱い
+    """
+
+    def __init__(self, path: str, max_entries: int = 5000, max_bytes: int = 200 * 1024 * 1024,
+                 max_age: float | None = 30 * 24 * 3600, bypass: bool = False):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            pathlib.Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> str | None:
+        if self.bypass:
+            return None
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age is not None and now - row[1] > self.max_age:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        if self.bypass or not value:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            self._evict(conn, now)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        if self.max_age is not None:
+            conn.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age,))
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # 最終アクセスが古い順に上限内へ収まるまで削除
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            count, total = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": total}
+
+
+_cache: LLMCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> LLMCache:
+    """プロセス共有のキャッシュを返す。GRAPHFORGE_CACHE_BYPASS=1 で無効化できる。"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(
+                config.LLM_CACHE_PATH,
+                max_entries=config.LLM_CACHE_MAX_ENTRIES,
+                max_bytes=config.LLM_CACHE_MAX_BYTES,
+                max_age=config.LLM_CACHE_MAX_AGE,
+                bypass=os.getenv("GRAPHFORGE_CACHE_BYPASS") == "1",
+            )
+        return _cache
@@ -0,0 +1,207 @@
+# langgraph_v21/patching.py
+"""
+大きな Python ファイルを関数・クラス単位に分け、LLM が返した差分（unified diff のハンク）を手元で当てる
+
+改修対象をファイル全体ではなく指示に関係するユニットだけにすることで、
+LLM の出力トークン数と待ち時間を変更の大きさに比例させる（refactor_graph の chunked モード）。
+ハンクの行番号は当てにせず、コンテキスト行と削除行の並びを探して適用する。
+"""
+import ast
+import difflib
+import re
+from dataclasses import dataclass
+
+import config
+
+NO_CHANGE = "NO_CHANGE"
+_NAME = re.compile(r"[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*")
+_IMPORT = re.compile(r"^(import|from)\s+\S+")
+
+
+class PatchError(ValueError):
+    """ハンクの適用先が見つからない。"""
+
+
+@dataclass
+class Unit:
+    """改修の単位（トップレベルの関数・クラス、または大きなクラスのメソッド）。行番号は 1 始まりで end を含む。"""
+    name: str
+    start: int
+    end: int
+    code: str
+
+
+@dataclass
+class Hunk:
+    old: list[str]   # コンテキスト行 + 削除行
+    new: list[str]   # コンテキスト行 + 追加行
+    hint: int = 0    # @@ -hint,... の行番号（探索の起点。0 なら先頭）
+
+
+# ---------- 分割 ----------
+def _node_range(node: ast.AST) -> tuple[int, int]:
+    decorators = getattr(node, "decorator_list", [])
+    start = min([node.lineno] + [d.lineno for d in decorators])
+    return start, node.end_lineno
+
+
+def _unit(name: str, node: ast.AST, lines: list[str]) -> Unit:
+    start, end = _node_range(node)
+    return Unit(name, start, end, "\n".join(lines[start - 1:end]))
+
+
+def split_units(code: str) -> tuple[int, list[Unit]] | None:
+    """
+    (ヘッダーの最終行, ユニット) を返す。ヘッダーは先頭の import 群。構文エラーなら None。
+
+    config.REFACTOR_UNIT_MAX_LINES より長いクラスはメソッドごとのユニットに分ける。
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    lines = code.splitlines()
+    header_end = 0
+    units: list[Unit] = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)) and not units:
+            header_end = node.end_lineno
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            units.append(_unit(node.name, node, lines))
+        elif isinstance(node, ast.ClassDef):
+            start, end = _node_range(node)
+            methods = [n for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            if end - start + 1 > config.REFACTOR_UNIT_MAX_LINES and methods:
+                units.extend(_unit(f"{node.name}.{m.name}", m, lines) for m in methods)
+            else:
+                units.append(_unit(node.name, node, lines))
+    return header_end, units
+
+
+def select_units(units: list[Unit], instruction: str) -> list[Unit]:
+    """
+    指示で名前が挙がっているユニット（関数名・クラス名・Class.method・メソッド名）。
+    名前が挙がっていなければ空（ファイル全体の改修にする）。使っている識別子からの推測はしない。
+    """
+    names = _NAME.findall(instruction)
+    words = set(names) | {part for name in names for part in name.split(".")}
+    return [u for u in units if u.name in words or u.name.rsplit(".", 1)[-1] in words]
+
+
+def parses(code: str) -> bool:
+    """code が Python として構文解析できるか。"""
+    try:
+        ast.parse(code)
+    except SyntaxError:
+        return False
+    return True
+
+
+# ---------- ハンク ----------
+def parse_hunks(text: str) -> list[Hunk]:
+    """unified diff の本文からハンクを取り出す。--- / +++ のファイル見出しや前後の説明文は無視する。"""
+    hunks: list[Hunk] = []
+    current: Hunk | None = None
+    for line in text.splitlines():
+        if line.startswith("@@"):
+            m = re.match(r"@@ -(\d+)", line)
+            current = Hunk([], [], int(m.group(1)) if m else 0)
+            hunks.append(current)
+        elif current is None or line.startswith(("--- ", "+++ ", "```")):
+            continue
+        elif line.startswith("-"):
+            current.old.append(line[1:])
+        elif line.startswith("+"):
+            current.new.append(line[1:])
+        elif line.startswith(" ") or line == "":
+            current.old.append(line[1:])
+            current.new.append(line[1:])
+        elif line.startswith("\\"):
+            continue  # "\ No newline at end of file"
+        else:
+            current = None  # ハンクの後ろの説明文
+    # 末尾の空行だけのコンテキストは探索の妨げになるので落とす
+    for h in hunks:
+        while h.old and h.new and h.old[-1] == h.new[-1] == "":
+            h.old.pop()
+            h.new.pop()
+    return [h for h in hunks if h.old != h.new]
+
+
+def _find(lines: list[str], block: list[str], start: int, hint: int) -> int:
+    """block が現れる位置。複数あれば hint に近いもの。行末空白の違いは無視する。"""
+    if not block:
+        return max(min(hint - 1, len(lines)), start) if hint else len(lines)
+    target = [b.rstrip() for b in block]
+    stripped = [l.rstrip() for l in lines]
+    found = [i for i in range(start, len(lines) - len(block) + 1) if stripped[i:i + len(block)] == target]
+    if not found:
+        raise PatchError("ハンクの適用先が見つかりません:\n" + "\n".join(block[:5]))
+    return min(found, key=lambda i: abs(i + 1 - hint)) if hint else found[0]
+
+
+def apply_hunks(code: str, hunks: list[Hunk]) -> str:
+    """ハンクを上から順に当てる（後のハンクは前のハンクより下を探す）。"""
+    lines = code.splitlines()
+    pos = 0
+    for h in hunks:
+        i = _find(lines, h.old, pos, h.hint)
+        lines[i:i + len(h.old)] = h.new
+        pos = i + len(h.new)
+    return "\n".join(lines) + ("\n" if code.endswith("\n") else "")
+
+
+def partition_hunks(hunks: list[Hunk]) -> tuple[list[Hunk], list[str]]:
+    """
+    ユニットに当てるハンクと、ファイル先頭に足す import 文に分ける。
+    追加行がトップレベルの import 文だけのハンクは、ユニットの外（ヘッダー）への変更とみなす。
+    """
+    unit_hunks, imports = [], []
+    for h in hunks:
+        added = [line for line in h.new if line not in h.old]
+        if added and all(_IMPORT.match(line) for line in added):
+            imports.extend(added)
+        else:
+            unit_hunks.append(h)
+    return unit_hunks, imports
+
+
+def splice(code: str, header_end: int, imports: list[str],
+           replaced: dict[tuple[int, int], str]) -> tuple[str, dict[tuple[int, int], str]]:
+    """
+    元コードの行範囲を改修後のユニットで置き換え、足りない import をヘッダーの後ろに足す。
+
+    Returns:
+        (改修後のコード, 適用した置き換え)。import の追加は (header_end + 1, header_end) への挿入として含む
+    """
+    lines = code.splitlines()
+    changes = dict(replaced)
+    new_imports = list(dict.fromkeys(i for i in imports if i not in lines))
+    if new_imports:
+        changes[(header_end + 1, header_end)] = "\n".join(new_imports)
+    for (start, end), text in sorted(changes.items(), reverse=True):
+        lines[start - 1:end] = text.splitlines()
+    return "\n".join(lines) + ("\n" if code.endswith("\n") else ""), changes
+
+
+def unit_diff(original: str, changes: dict[tuple[int, int], str], filename: str) -> str:
+    """
+    置き換えごとの unified diff を元ファイルの行番号でつなげる（ファイル全体を difflib にかけない）。
+
+    Args:
+        changes: splice が返した {元の行範囲: 置き換え後のテキスト}
+    """
+    lines = original.splitlines()
+    out = [f"--- a/{filename}", f"+++ b/{filename}"]
+    offset = 0
+    for (start, end), text in sorted(changes.items()):
+        old = lines[start - 1:end]
+        new = text.splitlines()
+        for line in list(difflib.unified_diff(old, new, lineterm="", n=3))[2:]:
+            m = re.match(r"@@ -(\d+)(,\d+)? \+(\d+)(,\d+)? @@", line)
+            if m:
+                a, b = int(m.group(1)) + start - 1, int(m.group(3)) + start - 1 + offset
+                line = f"@@ -{a}{m.group(2) or ''} +{b}{m.group(4) or ''} @@"
+            out.append(line)
+        offset += len(new) - len(old)
+    return "\n".join(out) if len(out) > 2 else ""
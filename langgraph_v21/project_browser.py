@@ -0,0 +1,189 @@
+# langgraph_v21/project_browser.py
+"""
+ダッシュボード用のプロジェクトブラウザ（ファイル一覧の索引・必要時の読み込み・zip 書き出し）
+
+Streamlit は操作のたびにスクリプト全体を再実行するので、ファイルの中身は選ばれたときだけ読み、
+一覧はディレクトリの mtime が変わらない限り使い回す。ファイルの追加・削除・改名は親ディレクトリの
+mtime を変えるので、再検証はディレクトリ数ぶんの stat で済む（ファイルサイズは索引作成時の値）。
+"""
+import hashlib
+import json
+import os
+import pathlib
+import re
+import tempfile
+import threading
+import zipfile
+from typing import Any, TypedDict
+
+import config
+from langgraph_v21.deps import SKIP_DIRS
+
+PAGE_SIZE = 50
+PREVIEW_BYTES = 200 * 1024
+ZIP_DIR = pathlib.Path(config.LLM_CACHE_PATH).parent / "zips"
+# 状態表示でファイル本文の代わりにサイズだけを出すキー
+BODY_KEYS = {"files", "revised", "originals", "original_code", "revised_code", "design", "sections", "partial"}
+
+
+class FileEntry(TypedDict):
+    path: str   # ルートからの相対パス（POSIX 形式）
+    size: int
+    mtime: float
+
+
+class _Index(TypedDict):
+    dirs: dict[str, int]   # ディレクトリ → mtime_ns
+    files: list[FileEntry]
+
+
+_indexes: dict[str, _Index] = {}
+_json_cache: dict[str, tuple[tuple[int, int], Any]] = {}
+_projects: dict[str, tuple[int, list[str]]] = {}
+_lock = threading.Lock()
+
+
+# ---------- 索引 ----------
+def _scan(root: pathlib.Path) -> _Index:
+    dirs: dict[str, int] = {}
+    files: list[FileEntry] = []
+    for dirpath, dirnames, names in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        dirs[dirpath] = os.stat(dirpath).st_mtime_ns
+        rel = pathlib.Path(dirpath).relative_to(root)
+        for name in sorted(names):
+            try:
+                st = os.stat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            files.append(FileEntry(path=(rel / name).as_posix(), size=st.st_size, mtime=st.st_mtime))
+    return _Index(dirs=dirs, files=files)
+
+
+def _unchanged(index: _Index) -> bool:
+    try:
+        return all(os.stat(d).st_mtime_ns == m for d, m in index["dirs"].items())
+    except OSError:
+        return False
+
+
+def index_project(root: str | pathlib.Path) -> list[FileEntry]:
+    """root 以下のファイル一覧（依存物・キャッシュのディレクトリは除く）。変化がなければ前回の結果を返す。"""
+    key = str(pathlib.Path(root).resolve())
+    with _lock:
+        cached = _indexes.get(key)
+    if cached is not None and _unchanged(cached):
+        return cached["files"]
+    index = _scan(pathlib.Path(key)) if os.path.isdir(key) else _Index(dirs={}, files=[])
+    with _lock:
+        _indexes[key] = index
+    return index["files"]
+
+
+def signature(entries: list[FileEntry]) -> str:
+    """一覧の内容（パス・サイズ・更新時刻）の指紋。zip の再利用判定に使う。"""
+    h = hashlib.sha256()
+    for e in entries:
+        h.update(f"{e['path']}\0{e['size']}\0{e['mtime']}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def paginate(entries: list[FileEntry], page: int, query: str = "",
+             per_page: int = PAGE_SIZE) -> tuple[list[FileEntry], int]:
+    """(ページのエントリ, ページ数)。query はパスの部分一致（大文字小文字を区別しない）。"""
+    if query:
+        q = query.lower()
+        entries = [e for e in entries if q in e["path"].lower()]
+    pages = max(-(-len(entries) // per_page), 1)
+    page = min(max(page, 1), pages)
+    return entries[(page - 1) * per_page:page * per_page], pages
+
+
+# ---------- 読み込み ----------
+def read_preview(root: str | pathlib.Path, rel: str, limit: int = PREVIEW_BYTES) -> tuple[str, bool]:
+    """(先頭 limit バイトのテキスト, 切り詰めたか)。ルート外へのパスは拒否する。"""
+    base = pathlib.Path(root).resolve()
+    path = (base / rel).resolve()
+    if base not in path.parents:
+        raise ValueError(f"プロジェクト外のパスです: {rel}")
+    with open(path, "rb") as f:
+        data = f.read(limit + 1)
+    return data[:limit].decode("utf-8", errors="replace"), len(data) > limit
+
+
+def load_json(path: str | pathlib.Path) -> Any:
+    """JSON ファイルを読む。mtime とサイズが変わらなければ前回の結果を返す（戻り値は変更しないこと）。"""
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    key = str(path)
+    with _lock:
+        cached = _json_cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    data = json.loads(pathlib.Path(path).read_text(encoding="utf-8"))
+    with _lock:
+        _json_cache[key] = (stamp, data)
+    return data
+
+
+def list_projects(build_root: str | pathlib.Path) -> list[str]:
+    """build/ 直下のプロジェクト名。build/ の mtime が変わるまで一覧を使い回す。"""
+    root = pathlib.Path(build_root)
+    if not root.is_dir():
+        return []
+    key = str(root.resolve())
+    mtime = os.stat(root).st_mtime_ns
+    with _lock:
+        cached = _projects.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    names = sorted(p.name for p in root.iterdir() if p.is_dir())
+    with _lock:
+        _projects[key] = (mtime, names)
+    return names
+
+
+# ---------- zip ----------
+def build_zip(root: str | pathlib.Path, name: str | None = None) -> pathlib.Path:
+    """
+    プロジェクトを zip に書き出してパスを返す。ファイルは 1 つずつ圧縮するのでメモリは増えない。
+    同じ内容の zip が既にあれば作り直さない。作り直したら同じプロジェクトの古い zip は消す。
+    """
+    root = pathlib.Path(root)
+    name = name or root.name
+    # 上書き保存はディレクトリの mtime を変えないので、索引は使わずファイルを stat し直す
+    entries = _scan(root)["files"]
+    ZIP_DIR.mkdir(parents=True, exist_ok=True)
+    out = ZIP_DIR / f"{name}-{signature(entries)}.zip"
+    if out.exists():
+        return out
+    # 同じ内容を同時に書き出す再実行どうしがぶつからないよう、一時ファイルは毎回別の名前にする
+    with tempfile.NamedTemporaryFile(dir=ZIP_DIR, suffix=".zip.tmp", delete=False) as f:
+        tmp = pathlib.Path(f.name)
+    try:
+        with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for e in entries:
+                zf.write(root / e["path"], arcname=e["path"])
+        os.replace(tmp, out)
+    finally:
+        tmp.unlink(missing_ok=True)
+    stale = re.compile(re.escape(name) + r"-[0-9a-f]{16}\.zip")
+    for old in ZIP_DIR.iterdir():
+        if old != out and stale.fullmatch(old.name):
+            old.unlink(missing_ok=True)
+    return out
+
+
+# ---------- 状態表示 ----------
+def summarize_state(value: Any, key: str | None = None) -> Any:
+    """LangGraph の状態を表示用に縮める。ファイル本文などはサイズだけにする。"""
+    if key in BODY_KEYS:
+        if isinstance(value, dict):
+            return {k: f"<{len(v) if isinstance(v, str) else '?'} chars>" for k, v in value.items()}
+        if isinstance(value, str):
+            return f"<{len(value)} chars>"
+    if isinstance(value, dict):
+        return {k: summarize_state(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [summarize_state(v) for v in value]
+    return value
@@ -1,12 +1,23 @@
 # refactor_graph.py
 
+import contextvars
 import pathlib
-import re
 import json
-from typing import TypedDict, NotRequired
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, TypedDict, NotRequired
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph
-from langchain_core.runnables import RunnableLambda
-from langchain_community.chat_models.ollama import ChatOllama
+from langgraph_v21.context import sections_prompt
+from langgraph_v21.graph_registry import compiled
+from langgraph_v21.llm_cache import get_cache, make_key
+from langgraph_v21.patching import (
+    NO_CHANGE, PatchError, Unit, apply_hunks, parse_hunks, parses, partition_hunks, select_units, split_units,
+    splice, unit_diff,
+)
+from langgraph_v21.router import get_router, served_by_fallback
+from langgraph_v21.sanitizer import clean_llm_output, strip_think
+from langgraph_v21.telemetry import current_trace, span, traced_node
 import config
 
 # ---------- 状態定義 ----------
@@ -17,32 +28,16 @@ class RefactorState(TypedDict):
     prompt: str
     sections: str
     revised_code: NotRequired[str]
+    diff: NotRequired[str]          # chunked モードのときのユニットごとの差分
     check_result: NotRequired[str]
     progress: NotRequired[list[str]]
 
 # ---------- 進捗ログ用 ----------
-step_counter = {"i": 0}
 def log_progress(state: RefactorState, step_desc: str):
-    step_counter["i"] += 1
-    msg = f"[STEP {step_counter['i']}] {step_desc}"
+    msg = f"[STEP {current_trace().next_step()}] {step_desc}"
     state.setdefault("progress", []).append(msg)
     return {}
 
-# ---------- コードクレンジングヘルパー ----------
-def remove_think_tags(text: str) -> str:
-    return re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
-
-def remove_after_last_fence(text: str) -> str:
-    idx = text.rfind('```')
-    return text[:idx] if idx != -1 else text
-
-def remove_code_fences(text: str) -> str:
-    text = re.sub(r'^```[^\n]*\n', '', text, flags=re.MULTILINE)
-    return re.sub(r'\n```', '\n', text)
-
-def trim_backtick_content(text: str) -> str:
-    return re.sub(r'`([^`]*)`', lambda m: f"`{m.group(1).strip()}`", text)
-
 # ---------- 簡易静的チェック ----------
 def quick_check(files: dict) -> list[str]:
     issues = []
@@ -51,36 +46,171 @@ def quick_check(files: dict) -> list[str]:
             issues.append(f"{filename}: 関数も import も見つかりません")
     return issues
 
-# ---------- LLM インスタンス ----------
-llm = ChatOllama(model=config.MODEL, base_url=config.OLLAMA_BASE_URL)
+# ---------- ストリーム送出 ----------
+def emit_token(token: str):
+    """graph.stream(stream_mode="custom") で改修コードを受信中に表示できるよう送る。"""
+    try:
+        get_stream_writer()({"token": token})
+    except RuntimeError:
+        pass
+
+# ---------- LLM 呼び出し ----------
+REFACTOR_SYSTEM = "以下のコードを、ユーザーの指示と設計セクション構造に基づいて改善してください。"
+PATCH_SYSTEM = (
+    "以下の関数（またはクラス）を、ユーザーの指示と設計セクション構造に基づいて改善してください。\n"
+    "応答は unified diff のハンク（@@ で始まる行から）だけにし、コード全体は返さないでください。"
+    "変更箇所の前後 2〜3 行を変更のないコンテキスト行として含めてください。\n"
+    "新しい import が必要なら、ファイル先頭の import 行をコンテキストにしたハンクで追加してください。\n"
+    f"変更が不要なら {NO_CHANGE} とだけ答えてください。"
+)
+
+
+def sections_message(state: RefactorState) -> dict[str, str]:
+    return {"role": "user", "content": f"## 全体設計セクション:\n{sections_prompt(state['sections'], state['target_file'])}"}
+
+
+def stream_cached(messages: list[dict[str, str]], target_file: str, name: str,
+                  on_token: Callable[[str], None] | None = None) -> str:
+    """キャッシュを確認してから LLM に問い合わせ、応答全文を返す。"""
+    cache = get_cache()
+    router = get_router()
+    key = make_key(*router.cache_identity(target_file), messages)
+    with span("llm", name) as s:
+        raw_content = cache.get(key)
+        s["cache"] = "hit" if raw_content is not None else "miss"
+        if raw_content is None:
+            started = time.perf_counter()
+            try:
+                tokens = []
+                for token in strip_think(router.stream(messages, target_file)):
+                    if not tokens:
+                        s["ttft"] = round(time.perf_counter() - started, 4)
+                    tokens.append(token)
+                    if on_token:
+                        on_token(token)
+                raw_content = "".join(tokens)
+            except Exception as e:
+                raise RuntimeError(f"LLM 改修呼び出しエラー: {e}")
+            if not served_by_fallback(s):
+                cache.put(key, raw_content)
+        s["response_chars"] = len(raw_content)
+    return raw_content
 
 # ---------- 改修実行ノード ----------
+def plan_units(state: RefactorState) -> tuple[int, list[Unit]] | None:
+    """
+    大きな Python ファイルなら (ヘッダーの最終行, 指示に関係するユニット) を返す。
+    小さいファイル・Python 以外・関係するユニットが特定できない指示は None（ファイル全体を改修する）。
+    """
+    code = state["original_code"]
+    if not state["target_file"].endswith(".py") or code.count("\n") < config.REFACTOR_CHUNK_MIN_LINES:
+        return None
+    split = split_units(code)
+    if split is None:
+        return None
+    header_end, units = split
+    selected = select_units(units, state["prompt"])
+    return (header_end, selected) if selected else None
+
+
+def refactor_unit(state: RefactorState, header: str, unit: Unit) -> tuple[str, list[str], str]:
+    """ユニットを差分で改修し、(改修後のユニット, 追加する import, LLM の応答) を返す。"""
+    name = f"{state['target_file']}::{unit.name}"
+    user_code = (
+        f"## 改修対象ファイル: {state['target_file']}\n\n"
+        f"### ファイル先頭（参照のみ）\n```\n{header}\n```\n\n"
+        f"### 改修対象: {unit.name}（{unit.start}〜{unit.end} 行目）\n```\n{unit.code}\n```"
+    )
+    messages = [
+        {"role": "system", "content": PATCH_SYSTEM},
+        {"role": "user", "content": user_code},
+        {"role": "user", "content": f"## 改修指示:\n{state['prompt']}"},
+        sections_message(state),
+    ]
+    with span("file", name) as s:
+        raw = stream_cached(messages, state["target_file"], name)
+        if raw.strip() == NO_CHANGE:
+            s["patch"] = "no_change"
+            return unit.code, [], raw
+        hunks, imports = partition_hunks(parse_hunks(raw))
+        if not hunks and not imports:
+            # 差分でなくユニット全体が返ってきた（構文は組み戻した後にファイル全体で確かめる）
+            s["patch"] = "whole_unit"
+            return clean_llm_output(raw), [], raw
+        try:
+            revised = apply_hunks(unit.code, hunks)
+            s["patch"] = "applied"
+        except PatchError:
+            # 当たらない差分はユニット全体の書き直しでやり直す（ファイル全体よりは小さい）
+            s["patch"] = "fallback"
+            messages[0] = {"role": "system",
+                           "content": REFACTOR_SYSTEM + "\n改修後の関数（またはクラス）全体をコードだけで返してください。"}
+            raw = stream_cached(messages, state["target_file"], name)
+            revised = clean_llm_output(raw)
+    return revised, imports, raw
+
+
+def run_chunked_refactor(state: RefactorState, header_end: int, units: list[Unit]) -> bool:
+    """
+    関係するユニットだけを並行して差分で改修し、元のファイルに組み戻す。
+    組み戻したファイルが構文エラーになるユニットは元のままにする。それでもファイル全体が
+    構文解析できなければ False を返す（呼び出し元がファイル全体の改修に切り替える）。
+    """
+    code = state["original_code"]
+    header = "\n".join(code.splitlines()[:header_end])
+    log_progress(state, f"ユニット単位で改修: {', '.join(u.name for u in units)}")
+
+    replaced: dict[tuple[int, int], str] = {}
+    imports: list[str] = []
+    with ThreadPoolExecutor(max_workers=config.REFACTOR_UNIT_CONCURRENCY) as pool:
+        # テレメトリのスパンを引き継ぐため、呼び出し元のコンテキストで実行する
+        futures = {
+            pool.submit(contextvars.copy_context().run, refactor_unit, state, header, unit): unit for unit in units
+        }
+        for future in as_completed(futures):
+            unit = futures[future]
+            revised, added, raw = future.result()
+            # 並行して受信したトークンは混ざるので、ユニットごとに応答をまとめて送る
+            emit_token(f"# ---- {unit.name} ----\n{raw.strip()}\n\n")
+            if (revised != unit.code or added) and \
+                    not parses(splice(code, header_end, added, {(unit.start, unit.end): revised})[0]):
+                log_progress(state, f"構文エラーになるため元のままにします: {unit.name}")
+                revised, added = unit.code, []
+            if revised != unit.code:
+                replaced[(unit.start, unit.end)] = revised
+            imports.extend(added)
+            log_progress(state, f"ユニット改修完了: {unit.name}{'' if revised != unit.code else '（変更なし）'}")
+
+    revised_code, changes = splice(code, header_end, imports, replaced)
+    if not parses(revised_code):
+        log_progress(state, "組み戻したファイルが構文エラーのため、ファイル全体を改修します")
+        return False
+    state["revised_code"] = revised_code
+    state["diff"] = unit_diff(code, changes, state["target_file"])
+    return True
+
+
 def run_refactor(state: RefactorState) -> RefactorState:
     log_progress(state, f"改修開始: {state['target_file']}")
-    
-    system = "以下のコードを、ユーザーの指示と設計セクション構造に基づいて改善してください。"
+
+    plan = plan_units(state)
+    if plan is not None and run_chunked_refactor(state, *plan):
+        log_progress(state, "改修コード取得完了")
+        return state
+
     user_code = f"## 改修対象ファイル: {state['target_file']}\n\n```\n{state['original_code']}\n```"
     user_prompt = f"## 改修指示:\n{state['prompt']}"
-    user_sections = f"## 全体設計セクション:\n{state['sections']}"
 
     messages = [
-        {"role": "system", "content": system},
+        {"role": "system", "content": REFACTOR_SYSTEM},
         {"role": "user",   "content": user_code},
         {"role": "user",   "content": user_prompt},
-        {"role": "user",   "content": user_sections},
+        sections_message(state),
     ]
-
-    try:
-        raw = llm.invoke(messages)
-        raw_content = getattr(raw, "content", str(raw))
-    except Exception as e:
-        raise RuntimeError(f"LLM 改修呼び出しエラー: {e}")
+    raw_content = stream_cached(messages, state["target_file"], state["target_file"], on_token=emit_token)
 
     # クレンジング
-    cleaned = remove_think_tags(raw_content)
-    cleaned = remove_after_last_fence(cleaned)
-    cleaned = remove_code_fences(cleaned)
-    cleaned = trim_backtick_content(cleaned)
+    cleaned = clean_llm_output(raw_content)
 
     state["revised_code"] = cleaned
     log_progress(state, "改修コード取得完了")
@@ -102,20 +232,24 @@ def consistency_check(state: RefactorState) -> RefactorState:
 # ---------- グラフ定義 ----------
 def build_refactor_graph():
     builder = StateGraph(state_schema=RefactorState)
-    builder.add_node("refactor", RunnableLambda(run_refactor))
-    builder.add_node("check",   RunnableLambda(consistency_check))
-    builder.add_node("finalize", RunnableLambda(lambda s: {}))
+    builder.add_node("refactor", traced_node("refactor", run_refactor))
+    builder.add_node("check",   traced_node("check", consistency_check))
+    builder.add_node("finalize", traced_node("finalize", lambda s: {}))
 
     builder.set_entry_point("refactor")
     builder.add_edge("refactor", "check")
     # static issues があれば再度改修ノードへ、なければ終了
-    builder.add_conditional_edges("check", lambda s: {
-        "refactor": s.get("check_result", "").startswith("STATIC_ISSUES"),
-        "finalize": not s.get("check_result", "").startswith("STATIC_ISSUES"),
-    })
+    builder.add_conditional_edges(
+        "check",
+        lambda s: "refactor" if s.get("check_result", "").startswith("STATIC_ISSUES") else "finalize",
+        ["refactor", "finalize"],
+    )
 
     return builder.compile()
 
+def get_refactor_graph():
+    return compiled("refactor", build_refactor_graph)
+
 # ---------- 状態構築ユーティリティ ----------
 def prepare_refactor_state(
     project_dir: pathlib.Path,
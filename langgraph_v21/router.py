@@ -0,0 +1,170 @@
+# langgraph_v21/router.py
+"""
+ファイル単位のモデル振り分けと、複数 Ollama サーバーへの負荷分散
+
+config.MODEL_TIERS に「ティア → モデル + base URL 群」を、config.FILE_MODEL_ROUTES に
+「ファイルキー → ティア」を宣言する。ルールのないファイルは default ティアを使う。
+ティア内では処理中リクエストが最も少ない base URL を選ぶ。
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Iterator, NamedTuple
+
+import config
+from langgraph_v21.llm import astream_chat, stream_chat
+from langgraph_v21.telemetry import annotate, count
+
+DEFAULT_TIER = "default"
+
+# 生成中のファイルキー（asyncio タスク / スレッドごとに独立）
+_current_file: ContextVar[str | None] = ContextVar("graphforge_current_file", default=None)
+
+
+@contextmanager
+def routing_for(filekey: str | None):
+    """この with 内の LLM 呼び出しを filekey のルールで振り分ける。"""
+    token = _current_file.set(filekey)
+    try:
+        yield
+    finally:
+        _current_file.reset(token)
+
+
+def current_file() -> str | None:
+    return _current_file.get()
+
+
+class Backend(NamedTuple):
+    tier: str
+    model: str
+    base_url: str
+
+
+class ModelRouter:
+    """
+    Args:
+        tiers: {ティア名: {"model": str, "base_urls": [str, ...]}}
+        rules: {ファイルキー: ティア名}
+    """
+
+    def __init__(self, tiers: dict[str, dict[str, Any]], rules: dict[str, str]):
+        if DEFAULT_TIER not in tiers:
+            raise ValueError(f"MODEL_TIERS に '{DEFAULT_TIER}' がありません")
+        self.tiers = tiers
+        self.rules = rules
+        self._lock = threading.Lock()
+        self._inflight: dict[str, int] = {}
+        self._stats: dict[tuple[str, str], dict[str, float]] = {}
+
+    def tier_for(self, filekey: str | None) -> str:
+        if filekey:
+            for key, tier in self.rules.items():
+                # structure.json の written は絶対パスなので末尾一致も許す
+                if filekey == key or filekey.endswith("/" + key):
+                    return tier if tier in self.tiers else DEFAULT_TIER
+        return DEFAULT_TIER
+
+    def _pick(self, tier: str) -> Backend:
+        spec = self.tiers[tier]
+        with self._lock:
+            url = min(spec["base_urls"], key=lambda u: self._inflight.get(u, 0))
+        return Backend(tier, spec["model"], url)
+
+    def candidates(self, filekey: str | None = None) -> list[Backend]:
+        """試す順のバックエンド。専用ティアで失敗したら default へフォールバックする。"""
+        tier = self.tier_for(filekey)
+        backends = [self._pick(tier)]
+        if tier != DEFAULT_TIER:
+            backends.append(self._pick(DEFAULT_TIER))
+        return backends
+
+    def cache_identity(self, filekey: str | None = None) -> tuple[str, str]:
+        """
+        キャッシュキー用の (model, base_url)。負荷分散先によってキーが変わらないよう代表 URL を使う。
+        キーはティアのモデルなので、フォールバック先が答えた応答は保存しないこと（served_by_fallback）。
+        """
+        spec = self.tiers[self.tier_for(filekey)]
+        return spec["model"], spec["base_urls"][0]
+
+    @contextmanager
+    def track(self, backend: Backend):
+        with self._lock:
+            self._inflight[backend.base_url] = self._inflight.get(backend.base_url, 0) + 1
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._inflight[backend.base_url] -= 1
+                s = self._stats.setdefault((backend.model, backend.base_url),
+                                           {"calls": 0, "errors": 0, "total_sec": 0.0, "max_sec": 0.0})
+                s["calls"] += 1
+                s["errors"] += 0 if ok else 1
+                s["total_sec"] += elapsed
+                s["max_sec"] = max(s["max_sec"], elapsed)
+
+    def stream(self, prompt: str | list[Any], filekey: str | None = None) -> Iterator[str]:
+        backends = self.candidates(filekey if filekey is not None else current_file())
+        for i, backend in enumerate(backends):
+            received = False
+            annotate(model=backend.model, base_url=backend.base_url)
+            if i:
+                count("fallbacks")
+            try:
+                with self.track(backend):
+                    for token in stream_chat(prompt, backend.model, backend.base_url):
+                        received = True
+                        yield token
+                return
+            except Exception:
+                if received or i == len(backends) - 1:
+                    raise
+
+    async def astream(self, prompt: str | list[Any], filekey: str | None = None) -> AsyncIterator[str]:
+        backends = self.candidates(filekey if filekey is not None else current_file())
+        for i, backend in enumerate(backends):
+            received = False
+            annotate(model=backend.model, base_url=backend.base_url)
+            if i:
+                count("fallbacks")
+            try:
+                with self.track(backend):
+                    async for token in astream_chat(prompt, backend.model, backend.base_url):
+                        received = True
+                        yield token
+                return
+            except Exception:
+                if received or i == len(backends) - 1:
+                    raise
+
+    def report(self) -> list[dict[str, Any]]:
+        """モデル / サーバーごとの呼び出し回数とレイテンシ。"""
+        with self._lock:
+            return [
+                {"model": model, "base_url": url, "calls": int(s["calls"]), "errors": int(s["errors"]),
+                 "avg_sec": round(s["total_sec"] / s["calls"], 3) if s["calls"] else 0.0,
+                 "max_sec": round(s["max_sec"], 3)}
+                for (model, url), s in sorted(self._stats.items())
+            ]
+
+
+def served_by_fallback(llm_span: dict[str, Any]) -> bool:
+    """stream / astream を囲んだ LLM スパンの応答が、専用ティアの失敗後に default ティアから得たものか。"""
+    return bool(llm_span.get("fallbacks"))
+
+
+_router: ModelRouter | None = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter(config.MODEL_TIERS, config.FILE_MODEL_ROUTES)
+        return _router
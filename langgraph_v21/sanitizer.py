@@ -0,0 +1,232 @@
+# langgraph_v21/sanitizer.py
+"""
+LLM 出力のクレンジング（build / refactor 共通）
+
+従来の 4 段階の正規表現処理
+  remove_think_tags → remove_after_last_fence → remove_code_fences → trim_backtick_content
+と同じ結果を、1 回の走査で得る。チャンク単位で feed できるため、ストリーム受信中にも使える。
+"""
+from typing import AsyncIterator, Iterable, Iterator
+
+FENCE = "```"
+
+
+class ThinkStripper:
+    """
+    <think>…</think> をストリーム上で取り除く。
+    タグがチャンク境界で分割されていても扱え、think の中身はバッファしない。
+    """
+    OPEN, CLOSE = "<think>", "</think>"
+
+    def __init__(self):
+        self.inside = False
+        self.pending = ""
+
+    @staticmethod
+    def _partial_suffix(text: str, tag: str) -> int:
+        """text の末尾が tag の先頭と一致する最大長。"""
+        if "<" not in text[-(len(tag) - 1):]:
+            return 0
+        for n in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:n]):
+                return n
+        return 0
+
+    def feed(self, chunk: str) -> str:
+        buf = self.pending + chunk
+        self.pending = ""
+        out = []
+        while buf:
+            tag = self.CLOSE if self.inside else self.OPEN
+            idx = buf.find(tag)
+            if idx == -1:
+                keep = self._partial_suffix(buf, tag)
+                if not self.inside:
+                    out.append(buf[:len(buf) - keep])
+                self.pending = buf[len(buf) - keep:] if keep else ""
+                break
+            if not self.inside:
+                out.append(buf[:idx])
+            buf = buf[idx + len(tag):]
+            self.inside = not self.inside
+        return "".join(out)
+
+    def flush(self) -> str:
+        rest = "" if self.inside else self.pending
+        self.pending = ""
+        return rest
+
+
+class Sanitizer:
+    """
+    ストリーム対応の LLM 出力クレンジング。feed() で受け取った分から確定した部分を返し、
+    finish() で残りを返す。
+
+    - <think>…</think> を除去（中身はバッファしない）
+    - 最後の ``` 以降を捨てる
+    - ``` で始まるフェンス行を除去
+    - `inline` のバッククォート内の前後空白を除去
+    - 全体の前後空白を除去
+
+    最後の ``` より後ろは、さらに後ろにフェンスが来るか終端に達するまで保留する。
+    """
+
+    def __init__(self):
+        self._think = ThinkStripper()
+        self._cur: list[str] = []          # 改行待ちの行
+        self._held: list[str] | None = None  # 最後のフェンスを含む行とそれ以降の行（フェンス出現後のみ）
+        self._kept_line = False            # フェンス行除去後に 1 行以上出力したか
+        self._tick: list[str] | None = None  # 閉じ待ちのインライン ` の中身
+        self._started = False              # 先頭空白を除去し終えたか
+        self._ws = ""                      # 末尾空白として保留中の文字列
+
+    # ---- 行単位の処理（フェンス） ----
+    def _take_block(self, block: str, out: list[str]):
+        """改行で終わる完全な行の塊を、フェンスを含む行とそれ以外に分けて処理する。"""
+        pos = 0
+        while True:
+            f = block.find(FENCE, pos)
+            if f == -1:
+                self._take_plain(block[pos:], out)
+                return
+            start = max(block.rfind("\n", pos, f) + 1, pos)
+            end = block.find("\n", f) + 1
+            self._take_plain(block[pos:start], out)
+            # 新しいフェンスより前の保留行は出力確定
+            if self._held:
+                self._emit_lines(self._held, out)
+            self._held = [block[start:end]]
+            pos = end
+
+    def _take_plain(self, lines: str, out: list[str]):
+        if not lines:
+            return
+        if self._held is not None:
+            self._held.append(lines)
+        else:
+            self._emit_lines([lines], out)
+
+    def _emit_lines(self, blocks: list[str], out: list[str]):
+        # フェンスを含む行は 1 行単位、それ以外はフェンスを含まない行の塊
+        kept = [b for b in blocks if not b.startswith(FENCE)]
+        if kept:
+            self._kept_line = True
+            self._emit("".join(kept), out)
+
+    def _emit_tail(self, tail: str, out: list[str]):
+        # 改行で終わらない最終行: 直前が改行なら先頭の ``` だけ除去する
+        if self._kept_line and tail.startswith(FENCE):
+            tail = tail[len(FENCE):]
+        self._emit(tail, out)
+
+    # ---- 文字単位の処理（インライン ` と前後空白） ----
+    def _emit(self, text: str, out: list[str]):
+        pieces = []
+        pos = 0
+        while True:
+            idx = text.find("`", pos)
+            if self._tick is None:
+                if idx == -1:
+                    pieces.append(text[pos:])
+                    break
+                pieces.append(text[pos:idx + 1])
+                self._tick = []
+            else:
+                if idx == -1:
+                    self._tick.append(text[pos:])
+                    break
+                self._tick.append(text[pos:idx])
+                pieces.append("".join(self._tick).strip() + "`")
+                self._tick = None
+            pos = idx + 1
+        self._push("".join(pieces), out)
+
+    def _push(self, text: str, out: list[str]):
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return
+            self._started = True
+        text = self._ws + text
+        body = text.rstrip()
+        self._ws = text[len(body):]
+        if body:
+            out.append(body)
+
+    # ---- 公開 API ----
+    def feed(self, chunk: str) -> str:
+        text = self._think.feed(chunk)
+        if not text:
+            return ""
+        nl = text.rfind("\n")
+        if nl == -1:
+            self._cur.append(text)
+            return ""
+        out: list[str] = []
+        self._cur.append(text[:nl + 1])
+        block = "".join(self._cur)
+        self._cur = [text[nl + 1:]] if nl + 1 < len(text) else []
+        self._take_block(block, out)
+        return "".join(out)
+
+    def finish(self) -> str:
+        out: list[str] = []
+        rest = self._think.flush()
+        if rest:
+            self._cur.append(rest)
+        last = "".join(self._cur)
+        self._cur = []
+        if FENCE in last:
+            if self._held:
+                self._emit_lines(self._held, out)
+            self._emit_tail(last[:last.rfind(FENCE)], out)
+        elif self._held:
+            line = self._held[0]
+            self._emit_tail(line[:line.rfind(FENCE)], out)
+        else:
+            self._emit_tail(last, out)
+        self._held = None
+        if self._tick is not None:
+            self._push("".join(self._tick), out)
+            self._tick = None
+        return "".join(out)
+
+
+def clean_llm_output(text: str) -> str:
+    """LLM 応答全体をクレンジングする。"""
+    s = Sanitizer()
+    return s.feed(text) + s.finish()
+
+
+def clean_stream(chunks: Iterable[str]) -> Iterator[str]:
+    s = Sanitizer()
+    for chunk in chunks:
+        text = s.feed(chunk)
+        if text:
+            yield text
+    rest = s.finish()
+    if rest:
+        yield rest
+
+
+def strip_think(chunks: Iterable[str]) -> Iterator[str]:
+    """<think> だけを除去するストリーム（チャット表示用）。"""
+    stripper = ThinkStripper()
+    for chunk in chunks:
+        text = stripper.feed(chunk)
+        if text:
+            yield text
+    rest = stripper.flush()
+    if rest:
+        yield rest
+
+
+async def astrip_think(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    stripper = ThinkStripper()
+    async for chunk in chunks:
+        text = stripper.feed(chunk)
+        if text:
+            yield text
+    rest = stripper.flush()
+    if rest:
+        yield rest
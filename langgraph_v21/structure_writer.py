@@ -16,16 +16,30 @@ def load_structure(project_dir: str) -> dict[str, Any] | None:
     except Exception:
         return None
 
+def update_structure(project_dir: str, fields: dict[str, Any]):
+    """既存の structure.json に fields をマージして保存する（fingerprints 等を消さないため）。"""
+    structure = load_structure(project_dir) or {}
+    structure.update(fields)
+    save_structure(project_dir, structure)
+
 # --- build用追記 ---
 def record_structure(state: dict):
-    from config import FILE_KEYS
-    from .graph_build import extract_python_dependencies
+    from .deps import scan_dependencies
+    from .graph_build import file_plan
     project_dir = state.get("project_dir")
     if not project_dir:
         return
+    # finalize が抽出済みならそれを使い、ツリーを再走査しない
+    deps = state.get("deps") or scan_dependencies(project_dir)
     structure = {
         "sections": state.get("sections"),
-        "file_keys": FILE_KEYS,
-        "python_deps": sorted(extract_python_dependencies(project_dir))
+        # plan がない state（古いチェックポイントなど）でも設計のエンティティごとのファイルを含める
+        "file_keys": state.get("plan") or file_plan(state.get("sections") or ""),
+        "python_deps": deps["python"],
+        "node_deps": deps["node"],
     }
-    save_structure(project_dir, structure)
+    # インクリメンタルビルド用の指紋（ビルド結果の state から渡された場合のみ）
+    for key in ("design_hash", "fingerprints", "db_schema"):
+        if state.get(key):
+            structure[key] = state[key]
+    update_structure(project_dir, structure)
@@ -0,0 +1,210 @@
+# langgraph_v21/telemetry.py
+"""
+ビルドのテレメトリ（ノード / ファイル / LLM 呼び出しのスパンを JSONL に記録する）
+
+ビルドごとに BuildTrace を作って有効化すると、そのコンテキスト（asyncio タスク・
+LangGraph のノード実行を含む）で開いたスパンが build_id 付きで 1 行ずつ書き出される。
+同時に走る複数のビルドはそれぞれ別の BuildTrace を持つので、ステップ番号も混ざらない。
+
+スパンの例:
+  {"build_id": "...", "span_id": 3, "parent_id": 1, "kind": "llm", "name": "main.py",
+   "start": 1700000000.1, "end": 1700000012.4, "duration": 12.3, "status": "ok",
+   "cache": "miss", "ttft": 1.8, "prompt_tokens": 812, "completion_tokens": 640, "retries": 0}
+"""
+import itertools
+import json
+import logging
+import pathlib
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+TRACE_FILE = ".graphforge_trace.jsonl"
+
+logger = logging.getLogger("graphforge")
+
+
+class Span(dict):
+    """記録中のスパン。終了時に JSONL へ書き出される。"""
+
+    def add(self, key: str, n: int | float = 1):
+        self[key] = self.get(key, 0) + n
+
+
+class BuildTrace:
+    """
+    1 ビルド分のスパンの書き出し先。
+
+    Args:
+        path: JSONL の出力先。None なら記録せずステップ番号だけ数える
+        build_id: 省略時は自動採番
+    """
+
+    def __init__(self, path: str | pathlib.Path | None = None, build_id: str | None = None):
+        self.path = pathlib.Path(path) if path else None
+        self.build_id = build_id or uuid.uuid4().hex[:12]
+        self._ids = itertools.count(1)
+        self._steps = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_step(self) -> int:
+        with self._lock:
+            return next(self._steps)
+
+    def new_span_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+    def write(self, record: dict[str, Any]):
+        if self.path is None:
+            return
+        line = json.dumps({"build_id": self.build_id, **record}, ensure_ascii=False, default=str)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+_trace: ContextVar[BuildTrace | None] = ContextVar("graphforge_trace", default=None)
+_span: ContextVar[Span | None] = ContextVar("graphforge_span", default=None)
+_untraced = BuildTrace()  # トレース未設定時（ノード単体のテストなど）の受け皿
+
+
+def current_trace() -> BuildTrace:
+    return _trace.get() or _untraced
+
+
+def current_span() -> Span | None:
+    return _span.get()
+
+
+def setup_logging(project_dir: str | None = None, build_id: str | None = None,
+                  level: int = logging.INFO) -> BuildTrace:
+    """
+    ビルドのトレースを作り、現在のコンテキストで有効にする。
+
+    Args:
+        project_dir: 指定すると <project_dir>/.graphforge_trace.jsonl にスパンを追記する
+        build_id: トレースの ID。省略時は自動採番
+        level: "graphforge" ロガーのレベル
+    """
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+    trace = BuildTrace(pathlib.Path(project_dir) / TRACE_FILE if project_dir else None, build_id)
+    _trace.set(trace)
+    return trace
+
+
+@contextmanager
+def span(kind: str, name: str, **attrs: Any) -> Iterator[Span]:
+    """kind: "node" | "file" | "llm" など。with 内で開いたスパンは子になる。"""
+    trace = current_trace()
+    parent = _span.get()
+    s = Span(span_id=trace.new_span_id(), parent_id=parent["span_id"] if parent else None,
+             kind=kind, name=name, start=time.time(), **attrs)
+    token = _span.set(s)
+    started = time.perf_counter()
+    try:
+        yield s
+        s.setdefault("status", "ok")
+    except BaseException as e:
+        s["status"] = "error"
+        s["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _span.reset(token)
+        s["duration"] = round(time.perf_counter() - started, 4)
+        s["end"] = s["start"] + s["duration"]
+        trace.write(dict(s))
+
+
+def annotate(**attrs: Any):
+    """現在のスパンに属性を付ける（スパン外なら何もしない）。"""
+    s = _span.get()
+    if s is not None:
+        s.update(attrs)
+
+
+def count(key: str, n: int | float = 1):
+    """現在のスパンの数値属性を加算する（リトライ回数など）。"""
+    s = _span.get()
+    if s is not None:
+        s.add(key, n)
+
+
+# ---------- LangGraph ノード ----------
+def traced_node(name: str, func, afunc=None):
+    """ノード関数の実行を kind="node" のスパンで囲んだ RunnableLambda を返す。"""
+    from langchain_core.runnables import RunnableLambda
+
+    def run(state):
+        with span("node", name):
+            return func(state)
+
+    if afunc is None:
+        return RunnableLambda(run, name=name)
+
+    async def arun(state):
+        with span("node", name):
+            return await afunc(state)
+
+    return RunnableLambda(run, afunc=arun, name=name)
+
+
+# ---------- 読み出し / 集計 ----------
+def load_trace(project_dir: str, build_id: str | None = None) -> list[dict[str, Any]]:
+    """トレースを読む。build_id 省略時は最後に記録されたビルドのスパンを返す。"""
+    path = pathlib.Path(project_dir) / TRACE_FILE
+    if not path.exists():
+        return []
+    spans = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            spans.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    if build_id is None and spans:
+        build_id = spans[-1]["build_id"]
+    return [s for s in spans if s.get("build_id") == build_id]
+
+
+def critical_path(spans: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    ノードを開始順に並べ、並列生成するノードは最も遅いファイル（= そのノードの所要時間を決めたもの）を添えて返す。
+    share は最初のノードの開始から最後のノードの終了までに対する割合（並行するブランチの分は重なる）。
+    """
+    nodes = sorted((s for s in spans if s.get("kind") == "node"), key=lambda s: s["start"])
+    children: dict[int, list[dict[str, Any]]] = {}
+    for s in spans:
+        if s.get("parent_id") is not None:
+            children.setdefault(s["parent_id"], []).append(s)
+    total = (max(n["start"] + n["duration"] for n in nodes) - nodes[0]["start"] if nodes else 0.0) or 1.0
+
+    def llm_of(s: dict[str, Any]) -> dict[str, Any] | None:
+        llms = [c for c in children.get(s["span_id"], []) if c.get("kind") == "llm"]
+        return max(llms, key=lambda c: c["duration"]) if llms else None
+
+    rows = []
+    for node in nodes:
+        files = [c for c in children.get(node["span_id"], []) if c.get("kind") == "file"]
+        slowest = max(files, key=lambda c: c["duration"]) if files else None
+        llm = llm_of(slowest or node)
+        rows.append({
+            "node": node["name"],
+            "duration": node["duration"],
+            "share": round(node["duration"] / total, 3),
+            "slowest_file": slowest["name"] if slowest else None,
+            "file_duration": slowest["duration"] if slowest else None,
+            "ttft": llm.get("ttft") if llm else None,
+            "completion_tokens": llm.get("completion_tokens") if llm else None,
+            "cache": llm.get("cache") if llm else None,
+            "status": node.get("status"),
+        })
+    return rows
@@ -0,0 +1,276 @@
+# langgraph_v21/validation.py
+"""
+生成したプロジェクトを実際に動かして確かめるスモーク検証
+
+    python -m langgraph_v21.validation PROJECT_DIR [PROJECT_DIR ...] [--workers 8]
+
+1. frontend/package.json が JSON として読め、必要なキーと型を持つか（プロセス内）
+2. main.py を import し、FastAPI の TestClient で GET /openapi.json が 200 を返すか（サブプロセス）
+3. tests/test_main.py を pytest で実行して通るか（サブプロセス）
+
+サブプロセスはタイムアウトとメモリ / CPU 時間の上限付きで動かす。Python の依存はプロジェクトの requirements.txt
+（全行がバージョン固定のときだけ）か、scan_dependencies の結果のうち config.VALIDATION_ALLOWED_PACKAGES にあるものを
+venv に入れ、同じ依存の組み合わせなら venv を使い回す（.graphforge_cache/venvs/<hash>）。
+LLM が書いた import 名をそのまま pip install することはしない。許可リストにない依存があるときや
+venv が作れないなどの環境側の失敗は "error" とし、生成コードの失敗（"failed"）とは分けて報告する。
+複数プロジェクトはスレッドごとに別のサブプロセスで検証するので、コア数に応じて並列に進む。
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import pathlib
+import re
+import subprocess
+import sys
+import threading
+import time
+import venv
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict
+
+import config
+from langgraph_v21.deps import scan_dependencies
+
+PASSED, FAILED, ERROR, SKIPPED = "passed", "failed", "error", "skipped"
+READY_MARK = ".graphforge-ready"
+RESULT_MARK = "@@GRAPHFORGE@@"
+OUTPUT_TAIL = 4000  # 失敗時に残す出力の末尾の文字数
+PINNED = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*(\[[A-Za-z0-9,._-]+\])?==[A-Za-z0-9.+!_-]+$")  # name[extra]==version
+
+# main.py を import して TestClient で起動する（プロジェクト直下で実行する）
+SMOKE_SCRIPT = r"""
+import json, sys, traceback
+sys.path.insert(0, ".")
+try:
+    import main
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as client:
+        res = client.get("/openapi.json")
+    result = {"ok": res.status_code == 200, "detail": f"GET /openapi.json -> {res.status_code}"}
+except BaseException:
+    result = {"ok": False, "detail": traceback.format_exc(limit=8)}
+print("@@GRAPHFORGE@@" + json.dumps(result))
+"""
+
+# リソース上限を設定してから本来のコマンドに置き換わる（preexec_fn はスレッドから使うと危険なため）
+LIMIT_LAUNCHER = r"""
+import os, resource, sys
+mem, cpu = int(sys.argv[1]), int(sys.argv[2])
+if mem:
+    resource.setrlimit(resource.RLIMIT_AS, (mem, mem))
+if cpu:
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+os.execv(sys.argv[3], sys.argv[3:])
+"""
+
+
+class Check(TypedDict):
+    name: str
+    status: str      # passed / failed / error / skipped
+    detail: str
+    seconds: float
+
+
+class ValidationReport(TypedDict):
+    project_dir: str
+    ok: bool         # failed が 1 つもない（環境側の error は含めない）
+    python: str | None
+    checks: list[Check]
+    seconds: float
+
+
+class UnknownPackageError(ValueError):
+    """許可リストにないパッケージが必要（検証用の venv には入れない）。"""
+
+
+# ---------- venv ----------
+_venv_locks: dict[str, threading.Lock] = {}
+_venv_locks_guard = threading.Lock()
+
+
+def pinned_requirements(project_dir: str) -> list[str] | None:
+    """requirements.txt の全行が name==version ならその一覧。ファイルがない・固定されていない行があれば None。"""
+    path = pathlib.Path(project_dir) / "requirements.txt"
+    if not path.exists():
+        return None
+    lines = [line.split("#", 1)[0].strip() for line in path.read_text(encoding="utf-8").splitlines()]
+    lines = [line for line in lines if line]
+    return lines if lines and all(PINNED.match(line) for line in lines) else None
+
+
+def requirements_for(project_dir: str) -> list[str]:
+    """
+    検証用の venv に入れるパッケージ（検証に使うパッケージを足したもの）。
+    バージョン固定の requirements.txt があればそれを、なければ import から求めた pip のパッケージ名を使う。
+    後者に config.VALIDATION_ALLOWED_PACKAGES にないものがあれば UnknownPackageError。
+    """
+    names = pinned_requirements(project_dir)
+    if names is None:
+        names = [config.PIP_PACKAGE_NAMES.get(m, m) for m in scan_dependencies(project_dir)["python"]]
+        allowed = {p.lower() for p in config.VALIDATION_ALLOWED_PACKAGES}
+        unknown = sorted(n for n in names if n.lower() not in allowed)
+        if unknown:
+            raise UnknownPackageError(f"許可リストにないパッケージがあるため venv を作りません: {', '.join(unknown)}")
+    return sorted(set(names) | set(config.VALIDATION_BASE_PACKAGES))
+
+
+@contextlib.contextmanager
+def _venv_lock(key: str):
+    """同じ venv を同時に作らないよう、スレッド間とプロセス間の両方で排他する。"""
+    with _venv_locks_guard:
+        lock = _venv_locks.setdefault(key, threading.Lock())
+    with lock:
+        path = pathlib.Path(config.VENV_CACHE_DIR) / f"{key}.lock"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            try:
+                import fcntl
+                fcntl.flock(f, fcntl.LOCK_EX)
+            except ImportError:
+                pass
+            yield
+
+
+def venv_python(requirements: list[str]) -> pathlib.Path:
+    """
+    requirements を入れた venv の python。同じ組み合わせの venv があれば作り直さない。
+    config.VALIDATION_PYTHON が設定されていれば venv を作らずその python を使う。
+    """
+    if config.VALIDATION_PYTHON:
+        return pathlib.Path(config.VALIDATION_PYTHON)
+    key = hashlib.sha256("\n".join([sys.version, *sorted(requirements)]).encode("utf-8")).hexdigest()[:16]
+    root = pathlib.Path(config.VENV_CACHE_DIR) / key
+    python = root / ("Scripts/python.exe" if os.name == "nt" else "bin/python")
+    if (root / READY_MARK).exists():
+        return python
+    with _venv_lock(key):
+        if (root / READY_MARK).exists():
+            return python
+        venv.create(root, clear=True, with_pip=True)
+        subprocess.run(
+            [str(python), "-m", "pip", "install", "--disable-pip-version-check", "-q", *requirements],
+            check=True, capture_output=True, text=True, timeout=config.VENV_INSTALL_TIMEOUT,
+        )
+        (root / READY_MARK).write_text("\n".join(requirements), encoding="utf-8")
+    return python
+
+
+# ---------- サブプロセス ----------
+def run_limited(cmd: list[str], cwd: str, timeout: float | None = None) -> subprocess.CompletedProcess:
+    """タイムアウト・メモリ・CPU 時間の上限付きで cmd を実行する（上限は POSIX のみ）。"""
+    if sys.platform != "win32":
+        cmd = [cmd[0], "-c", LIMIT_LAUNCHER, str(config.VALIDATION_MEMORY_MB * 1024 * 1024),
+               str(config.VALIDATION_CPU_SECONDS), *cmd]
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1", PYTHONPATH=cwd)
+    return subprocess.run(cmd, cwd=cwd, env=env, capture_output=True, text=True,
+                          timeout=timeout or config.VALIDATION_TIMEOUT)
+
+
+def _tail(text: str) -> str:
+    return text[-OUTPUT_TAIL:]
+
+
+def _timed(name: str, func, *args) -> Check:
+    started = time.perf_counter()
+    try:
+        status, detail = func(*args)
+    except subprocess.TimeoutExpired as e:
+        status, detail = FAILED, f"タイムアウト（{e.timeout:.0f}s）"
+    except Exception as e:
+        status, detail = ERROR, f"{type(e).__name__}: {e}"
+    return Check(name=name, status=status, detail=detail, seconds=round(time.perf_counter() - started, 3))
+
+
+# ---------- 各チェック ----------
+def check_package_json(project_dir: str) -> tuple[str, str]:
+    path = pathlib.Path(project_dir) / "frontend" / "package.json"
+    if not path.exists():
+        return SKIPPED, "frontend/package.json がありません"
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except json.JSONDecodeError as e:
+        return FAILED, f"JSON として読めません: {e.msg} (line {e.lineno})"
+    problems = []
+    if not isinstance(data, dict):
+        return FAILED, "トップレベルがオブジェクトではありません"
+    if not isinstance(data.get("name"), str) or not data.get("name"):
+        problems.append("name がありません")
+    for key in ("dependencies", "devDependencies"):
+        value = data.get(key, {})
+        if not isinstance(value, dict) or not all(isinstance(v, str) for v in value.values()):
+            problems.append(f"{key} は {{パッケージ名: バージョン}} のオブジェクトにしてください")
+    if isinstance(data.get("dependencies"), dict) and "react" not in data["dependencies"]:
+        problems.append("dependencies に react がありません")
+    scripts = data.get("scripts")
+    if not isinstance(scripts, dict) or not ({"dev", "build", "start"} & set(scripts)):
+        problems.append("scripts に dev / build / start のいずれもありません")
+    return (FAILED, "; ".join(problems)) if problems else (PASSED, "ok")
+
+
+def check_app_import(project_dir: str, python: pathlib.Path) -> tuple[str, str]:
+    if not (pathlib.Path(project_dir) / "main.py").exists():
+        return SKIPPED, "main.py がありません"
+    res = run_limited([str(python), "-c", SMOKE_SCRIPT], project_dir)
+    for line in res.stdout.splitlines():
+        if line.startswith(RESULT_MARK):
+            result = json.loads(line[len(RESULT_MARK):])
+            return (PASSED if result["ok"] else FAILED), result["detail"]
+    # 結果が出ないまま終了した（メモリ上限・CPU 時間上限など）
+    return FAILED, f"終了コード {res.returncode}\n{_tail(res.stdout + res.stderr)}"
+
+
+def check_tests(project_dir: str, python: pathlib.Path) -> tuple[str, str]:
+    if not (pathlib.Path(project_dir) / "tests" / "test_main.py").exists():
+        return SKIPPED, "tests/test_main.py がありません"
+    res = run_limited([str(python), "-m", "pytest", "-q", "-x", "-p", "no:cacheprovider", "tests/test_main.py"],
+                      project_dir)
+    if res.returncode == 0:
+        return PASSED, res.stdout.strip().splitlines()[-1] if res.stdout.strip() else "ok"
+    if res.returncode == 5:
+        return FAILED, "テストが 1 件も見つかりません"
+    return FAILED, _tail(res.stdout + res.stderr)
+
+
+# ---------- 検証 ----------
+def validate_project(project_dir: str) -> ValidationReport:
+    started = time.perf_counter()
+    checks = [_timed("package_json", check_package_json, project_dir)]
+    python: pathlib.Path | None = None
+    env = _timed("environment", lambda: (PASSED, str(venv_python(requirements_for(project_dir)))))
+    checks.append(env)
+    if env["status"] == PASSED:
+        python = pathlib.Path(env["detail"])
+        checks.append(_timed("app_import", check_app_import, project_dir, python))
+        checks.append(_timed("tests", check_tests, project_dir, python))
+    return ValidationReport(
+        project_dir=project_dir,
+        ok=not any(c["status"] == FAILED for c in checks),
+        python=str(python) if python else None,
+        checks=checks,
+        seconds=round(time.perf_counter() - started, 3),
+    )
+
+
+def validate_projects(project_dirs: list[str], workers: int | None = None) -> list[ValidationReport]:
+    """複数プロジェクトを同時に検証する（各チェックは別プロセスで動くのでコア数まで並列に進む）。"""
+    with ThreadPoolExecutor(max_workers=workers or config.VALIDATION_WORKERS) as pool:
+        return list(pool.map(validate_project, project_dirs))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="生成したプロジェクトのスモーク検証")
+    parser.add_argument("projects", nargs="+", help="プロジェクトのディレクトリ（main.py のある場所）")
+    parser.add_argument("--workers", "-w", type=int, default=config.VALIDATION_WORKERS, help="同時に検証する数")
+    args = parser.parse_args(argv)
+    reports = validate_projects([os.path.abspath(p) for p in args.projects], args.workers)
+    for report in reports:
+        print(f"{'OK ' if report['ok'] else 'NG '} {report['project_dir']} ({report['seconds']:.1f}s)")
+        for c in report["checks"]:
+            print(f"    {c['status']:<8} {c['name']:<14} {c['detail'].splitlines()[-1] if c['detail'] else ''}")
+    return 0 if all(r["ok"] for r in reports) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
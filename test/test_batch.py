@@ -0,0 +1,59 @@
+import json
+import threading
+
+from langgraph_v21 import batch
+from langgraph_v21.batch import load_manifest, load_specs, run_batch
+
+
+def test_load_specs_from_directory_and_jsonl(tmp_path):
+    specs_dir = tmp_path / "specs"
+    specs_dir.mkdir()
+    (specs_dir / "todo app.md").write_text("# Todo", encoding="utf-8")
+    (specs_dir / "notes.txt").write_text("notes", encoding="utf-8")
+    (specs_dir / "image.png").write_bytes(b"\x89PNG")
+    assert load_specs(specs_dir) == [{"name": "notes", "design": "notes"}, {"name": "todo-app", "design": "# Todo"}]
+
+    jsonl = tmp_path / "specs.jsonl"
+    jsonl.write_text('{"name": "a", "design": "A"}\n\n{"name": "a", "spec": "B"}\n{"design": "C"}\n', encoding="utf-8")
+    assert [s["name"] for s in load_specs(jsonl)] == ["a", "a-2", "spec-4"]
+
+
+class FakeGraph:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = self.peak = 0
+
+    def invoke(self, state):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            if "boom" in state["design"]:
+                raise RuntimeError("LLM down")
+            check = "OK" if "good" in state["design"] else "STATIC_ISSUES main.py: syntax"
+            return {**state, "check_result": check, "written": [state["project_dir"] + "/main.py"]}
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def test_run_batch_writes_manifest(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "record_structure", lambda result: None)
+    specs = [{"name": "a", "design": "good"}, {"name": "b", "design": "meh"}, {"name": "c", "design": "boom"}]
+    graph = FakeGraph()
+    manifest = run_batch(specs, tmp_path / "out", concurrency=2, graph=graph)
+
+    assert manifest == load_manifest(tmp_path / "out")
+    assert manifest["counts"] == {"ok": 1, "issues": 1, "failed": 1}
+    assert [p["name"] for p in manifest["projects"]] == ["a", "b", "c"]
+    assert manifest["projects"][2]["error"] == "RuntimeError: LLM down"
+    assert manifest["projects"][0]["project_dir"].endswith("out/a/app")
+    assert manifest["projects_per_hour"] > 0 and graph.peak <= 2
+
+    # 前回 ok のものは作り直さない
+    graph = FakeGraph()
+    invoked = []
+    graph.invoke = lambda state, _invoke=graph.invoke: invoked.append(state["design"]) or _invoke(state)
+    manifest = run_batch(specs, tmp_path / "out", graph=graph, skip_done=True)
+    assert sorted(invoked) == ["boom", "meh"] and manifest["skipped"] == ["a"]
+    assert json.loads((tmp_path / "out" / "manifest.json").read_text(encoding="utf-8"))["counts"]["ok"] == 1
@@ -0,0 +1,86 @@
+import pytest
+
+from langgraph_v21 import batch_refactor, refactor_graph
+from langgraph_v21.batch_refactor import affected_files, apply_changes, build_batch_refactor_graph, prepare_batch_state
+
+
+def make_project(root):
+    (root / "routes").mkdir()
+    (root / "frontend" / "src").mkdir(parents=True)
+    (root / "schemas.py").write_text(
+        "from pydantic import BaseModel\n\nclass Task(BaseModel):\n    title: str\n    due_date: str | None = None\n",
+        encoding="utf-8")
+    (root / "routes" / "task.py").write_text(
+        "from fastapi import APIRouter\nfrom schemas import Task\n\nrouter = APIRouter()\n\n"
+        "@router.get('/tasks')\ndef list_tasks():\n    return [Task(title='a', due_date=None)]\n", encoding="utf-8")
+    (root / "frontend" / "src" / "TaskCard.jsx").write_text(
+        "export default function TaskCard({ task }) {\n  return <div>{task.due_date}</div>;\n}\n", encoding="utf-8")
+    (root / "main.py").write_text("from fastapi import FastAPI\napp = FastAPI()\n", encoding="utf-8")
+
+
+def fake_stream(messages, target_file, name, on_token=None):
+    code = messages[1]["content"].split("```\n", 1)[1].rsplit("\n```", 1)[0]
+    return "```\n" + code.replace("due_date", "deadline") + "\n```"
+
+
+def test_affected_files_uses_symbol_index(tmp_path):
+    make_project(tmp_path)
+    files = batch_refactor.read_project(str(tmp_path))
+    expected = ["frontend/src/TaskCard.jsx", "routes/task.py", "schemas.py"]
+    assert affected_files("Rename the `due_date` field to deadline", files) == expected
+    assert affected_files("rename due_date everywhere", files) == expected
+    assert affected_files("make FastAPI app docs nicer", files) == ["main.py"]
+
+
+def test_batch_refactor_applies_all_files(tmp_path, monkeypatch):
+    make_project(tmp_path)
+    monkeypatch.setattr(refactor_graph, "stream_cached", fake_stream)
+    result = build_batch_refactor_graph().invoke(
+        prepare_batch_state(tmp_path, "Rename `due_date` to deadline", "{}", apply=True))
+    assert result["check_result"] == "OK" and result["applied"]
+    assert sorted(result["diffs"]) == ["frontend/src/TaskCard.jsx", "routes/task.py", "schemas.py"]
+    assert "task.deadline" in (tmp_path / "frontend" / "src" / "TaskCard.jsx").read_text(encoding="utf-8")
+    assert "deadline: str" in (tmp_path / "schemas.py").read_text(encoding="utf-8")
+
+
+def test_batch_refactor_does_not_apply_when_check_fails(tmp_path, monkeypatch):
+    make_project(tmp_path)
+    monkeypatch.setattr(refactor_graph, "stream_cached", lambda *a, **k: "```\ndef broken(:\n```")
+    result = build_batch_refactor_graph().invoke(
+        prepare_batch_state(tmp_path, "Rename `due_date` to deadline", "{}", files=["schemas.py"], apply=True))
+    assert result["check_result"].startswith("STATIC_ISSUES") and not result["applied"]
+    assert "due_date" in (tmp_path / "schemas.py").read_text(encoding="utf-8")
+
+
+def test_explicit_non_source_file_is_refactored(tmp_path, monkeypatch):
+    make_project(tmp_path)
+    (tmp_path / "docker-compose.yml").write_text("services:\n  app:\n    environment:\n      due_date: x\n",
+                                                encoding="utf-8")
+    monkeypatch.setattr(refactor_graph, "stream_cached", fake_stream)
+    graph = build_batch_refactor_graph()
+    result = graph.invoke(prepare_batch_state(
+        tmp_path, "Rename `due_date` to deadline", "{}", files=["docker-compose.yml"], apply=True))
+    assert list(result["diffs"]) == ["docker-compose.yml"] and result["applied"]
+    assert "deadline: x" in (tmp_path / "docker-compose.yml").read_text(encoding="utf-8")
+    # プロジェクトの外は指定されても読まない
+    (tmp_path.parent / "outside.yml").write_text("due_date: x\n", encoding="utf-8")
+    with pytest.raises(FileNotFoundError):
+        graph.invoke(prepare_batch_state(tmp_path, "Rename `due_date`", "{}", files=["../outside.yml"]))
+
+
+def test_apply_changes_rolls_back_on_failure(tmp_path, monkeypatch):
+    (tmp_path / "a.py").write_text("a = 1\n", encoding="utf-8")
+    (tmp_path / "b.py").write_text("b = 1\n", encoding="utf-8")
+    real_replace = batch_refactor.os.replace
+
+    def flaky_replace(src, dst):
+        if str(dst).endswith("b.py"):
+            raise OSError("disk full")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(batch_refactor.os, "replace", flaky_replace)
+    with pytest.raises(OSError):
+        apply_changes(str(tmp_path), {"a.py": "a = 2\n", "b.py": "b = 2\n"})
+    assert (tmp_path / "a.py").read_text(encoding="utf-8") == "a = 1\n"
+    assert (tmp_path / "b.py").read_text(encoding="utf-8") == "b = 1\n"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.py", "b.py"]
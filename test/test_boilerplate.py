@@ -0,0 +1,29 @@
+import asyncio
+import json
+
+from langgraph_v21 import graph_build
+from langgraph_v21.boilerplate import render_boilerplate, template_context
+
+
+def test_template_context_from_sections():
+    ctx = template_context(json.dumps({"overview": {"title": "Task Board"}}))
+    assert ctx["title"] == "Task Board" and ctx["package_name"] == "task-board"
+    assert template_context("not json")["package_name"] == "graphforge-app"
+
+def test_render_boilerplate_and_fallback():
+    pkg = json.loads(render_boilerplate("frontend/package.json", '{"name": "Demo"}'))
+    assert pkg["name"] == "demo" and "react" in pkg["dependencies"]
+    assert render_boilerplate("main.py", "{}") is None
+
+def test_templated_files_skip_llm(monkeypatch, tmp_path):
+    calls = []
+
+    async def fake_async_invoke(prompt: str) -> str:
+        calls.append(prompt)
+        return "print('ok')"
+    monkeypatch.setattr('langgraph_v21.graph_build.async_invoke', fake_async_invoke)
+    state = {"sections": "{}", "project_dir": str(tmp_path)}
+    results = asyncio.run(graph_build.gen_files_parallel(state, ["frontend/index.html", "main.py"]))
+    assert set(results) == {"frontend/index.html", "main.py"}
+    assert len(calls) == 1
+    assert (tmp_path / "frontend/index.html").read_text(encoding="utf-8").startswith("<!doctype html>")
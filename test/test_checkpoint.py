@@ -0,0 +1,75 @@
+from typing import TypedDict
+
+import sqlite3
+
+import pytest
+from langgraph.graph import StateGraph
+
+import config
+from langgraph_v21.checkpoint import checkpoint_path, has_checkpoint, open_checkpointer, run_config
+from langgraph_v21 import graph_build
+
+
+@pytest.fixture(autouse=True)
+def checkpoint_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+
+
+class S(TypedDict):
+    log: list[str]
+
+
+def make_graph(checkpointer, calls, fail):
+    def step(name):
+        def node(state):
+            calls.append(name)
+            if name == "b" and fail:
+                raise RuntimeError("killed")
+            return {"log": state["log"] + [name]}
+        return node
+
+    builder = StateGraph(S)
+    for name in ("a", "b", "c"):
+        builder.add_node(name, step(name))
+    builder.set_entry_point("a")
+    builder.add_edge("a", "b")
+    builder.add_edge("b", "c")
+    builder.set_finish_point("c")
+    return builder.compile(checkpointer=checkpointer)
+
+
+def test_resume_skips_completed_nodes(tmp_path):
+    calls = []
+    project = tmp_path / "project"
+    graph = make_graph(open_checkpointer(str(project), fresh=True), calls, fail=True)
+    with pytest.raises(RuntimeError):
+        graph.invoke({"log": []}, run_config())
+    assert calls == ["a", "b"] and has_checkpoint(str(project))
+
+    # 別プロセス相当: ファイルから読み直して続きを実行する
+    calls.clear()
+    graph = make_graph(open_checkpointer(str(project)), calls, fail=False)
+    assert graph.invoke(None, run_config()) == {"log": ["a", "b", "c"]}
+    assert calls == ["b", "c"]
+    assert not project.exists()  # 生成物のディレクトリには何も書かない
+
+
+def test_checkpoints_are_appended_not_rewritten(tmp_path):
+    saver = open_checkpointer(str(tmp_path), fresh=True)
+    graph = make_graph(saver, [], fail=False)
+    graph.invoke({"log": []}, run_config())
+    conn = sqlite3.connect(checkpoint_path(str(tmp_path)))
+    rows = conn.execute("SELECT checkpoint_id, type FROM checkpoints").fetchall()
+    # 1 ステップごとに 1 行ずつ増え（入力 + a, b, c）、pickle の値は保存しない
+    assert len(rows) == len(saver.storage["build"][""]) == 5
+    assert not conn.execute("SELECT 1 FROM blobs WHERE type = 'pickle' UNION ALL "
+                            "SELECT 1 FROM writes WHERE type = 'pickle'").fetchall()
+    conn.execute("UPDATE blobs SET type = 'pickle'")
+    conn.commit()
+    with pytest.raises(ValueError):
+        open_checkpointer(str(tmp_path))
+
+
+def test_resumable_build_requires_checkpoint(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        graph_build.resumable_build(str(tmp_path), resume=True)
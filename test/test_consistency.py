@@ -0,0 +1,91 @@
+from langgraph_v21.consistency import analyze_project, check_files, quick_check
+from langgraph_v21 import graph_build
+
+
+def test_check_files_structured():
+    issues = check_files({"a.py": "x = 1\n# TODO fix\n", "b.json": "{bad", "c.py": "def f(:\n"})
+    kinds = {(i["file"], i["kind"], i["line"]) for i in issues}
+    assert ("a.py", "todo", 2) in kinds
+    assert ("b.json", "json", 1) in kinds
+    assert ("c.py", "syntax", 1) in kinds
+    assert quick_check({"a.py": ""}) == ["a.py is empty"]
+
+def test_repair_route_is_bounded(monkeypatch):
+    monkeypatch.setattr("config.MAX_REPAIR_ATTEMPTS", 2)
+    state = {"flagged": ["a.json"], "repair_attempts": {"a.json": 1}}
+    assert graph_build.route_after_check(state) == "repair"
+    state["repair_attempts"] = {"a.json": 2}
+    assert graph_build.route_after_check(state) == "finalize"
+    monkeypatch.setattr("config.VALIDATE_BUILD", True)
+    assert graph_build.route_after_check({"flagged": []}) == "validate"
+    monkeypatch.setattr("config.VALIDATE_BUILD", False)
+    assert graph_build.route_after_check({"flagged": []}) == "finalize"
+
+def test_analyze_project_cross_file():
+    files = {
+        "schemas.py": "class TaskCreate: pass\n",
+        "routes/task.py": (
+            "from fastapi import APIRouter\n"
+            "from schemas import TaskCreate, TaskOut\n"
+            "router = APIRouter(prefix='/tasks')\n"
+            "@router.get('/')\ndef list_tasks(): return []\n"
+            "@router.post('/{task_id}')\ndef update(task_id: int): return {}\n"
+        ),
+        "main.py": (
+            "from fastapi import FastAPI\nfrom routes import task\n"
+            "app = FastAPI()\napp.include_router(task.router, prefix='/api')\n"
+        ),
+        "openapi.json": '{"paths": {"/api/tasks": {"get": {}}, "/api/tasks/{id}": {"post": {}}, "/api/users": {"get": {}}}}',
+        "frontend/src/App.jsx": "import TaskList from './components/TaskList'\nimport React from 'react'\n",
+        "frontend/src/main.jsx": "import App from './App'\n",
+    }
+    issues = analyze_project(files)
+    messages = [i["message"] for i in issues]
+    assert any(i["file"] == "routes/task.py" and i["kind"] == "import" and "TaskOut" in i["message"] for i in issues)
+    assert [m for m in messages if "openapi.json" in m] == [
+        "openapi.json declares GET /api/users but no FastAPI route implements it"]
+    # 計画（openapi.json）にないルーターがないので、実装すべきなのはアプリ側
+    assert [i["file"] for i in issues if "/api/users" in i["message"]] == ["main.py"]
+    spec = '{"paths": {"/api/tasks": {"get": {}}, "/api/tasks/{id}": {"post": {}}, "/api/tasks/{id}/done": {"put": {}}}}'
+    routed = analyze_project(dict(files, **{"openapi.json": spec}))
+    assert [i["file"] for i in routed if i["kind"] == "route"] == ["routes/task.py"]
+    jsx = [i for i in issues if i["kind"] == "jsx_import"]
+    assert [(i["file"], i["line"]) for i in jsx] == [("frontend/src/App.jsx", 1)]
+    assert analyze_project(files, {"frontend/src/components/TaskList.jsx"}) == [
+        i for i in issues if i["kind"] != "jsx_import"]
+
+def test_unincluded_router_is_reported():
+    files = {
+        "main.py": "from fastapi import FastAPI\napp = FastAPI()\n",
+        "routes/task.py": "from fastapi import APIRouter\nrouter = APIRouter()\n@router.get('/t')\ndef f(): pass\n",
+    }
+    issues = analyze_project(files)
+    # 直すのは include_router を書くアプリ側
+    assert [(i["kind"], i["file"]) for i in issues] == [("route", "main.py")]
+    undocumented = analyze_project(dict(files, **{
+        "main.py": "from fastapi import FastAPI\nfrom routes.task import router\napp = FastAPI()\n"
+                   "app.include_router(router)\n",
+        "openapi.json": '{"paths": {"/x": {"get": {}}}}',
+    }))
+    assert [(i["file"], i["message"].split(" ", 1)[1]) for i in undocumented] == [
+        ("main.py", "declares GET /x but no FastAPI route implements it"),
+        ("routes/task.py", "does not document GET /t, which the FastAPI app implements")]
+
+
+def test_many_new_files_are_summarized_in_spawned_workers(monkeypatch):
+    from langgraph_v21 import consistency
+
+    monkeypatch.setattr(consistency, "_summary_cache", consistency.OrderedDict())
+    started = []
+    real_pool = consistency.ProcessPoolExecutor
+
+    def pool(**kw):
+        started.append(kw["mp_context"].get_start_method())
+        return real_pool(**kw)
+
+    monkeypatch.setattr(consistency, "ProcessPoolExecutor", pool)
+    files = {f"m{i}.py": f"from fastapi import FastAPI\napp_{i} = FastAPI()\n"
+             for i in range(consistency.PARALLEL_THRESHOLD)}
+    summaries = consistency._summaries(files)
+    assert started == ["spawn"]
+    assert summaries["m3.py"] == consistency.summarize_python(files["m3.py"])
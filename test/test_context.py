@@ -0,0 +1,60 @@
+import json
+
+from langgraph_v21.context import (
+    SUMMARY_MARK, TRIM_MARK, pack_sections, parse_sections, sections_for, sections_prompt,
+)
+
+
+def test_parse_sections_fallbacks():
+    assert parse_sections('{"api": "CRUD"}') == {"api": "CRUD"}
+    assert parse_sections('[{"name": "api", "content": "CRUD"}]') == {"api": "CRUD"}
+    assert parse_sections("intro\n## api\nCRUD\n## frontend\ncards") == \
+        {"preamble": "intro", "api": "CRUD", "frontend": "cards"}
+    assert parse_sections("just text") == {"design": "just text"}
+    assert parse_sections("") == {}
+
+
+def test_sections_for_matches_suffix():
+    assert sections_for("schemas.py") == ["data_model"]
+    assert sections_for("/tmp/out/app/routes/task.py") == ["api", "data_model"]
+    assert sections_for("unknown.py") is None
+    assert sections_for(None) is None
+
+
+def test_pack_sections_selects_and_summarizes():
+    table = {"title": "Tasks", "api": "GET /tasks", "frontend": "cards\nwith a due date badge", "testing": "x" * 400}
+    packed = json.loads(pack_sections(table, ["api"]))
+    assert packed["api"] == "GET /tasks"
+    assert packed["title"] == "Tasks"
+    assert packed["frontend"] == SUMMARY_MARK + "cards"
+    assert packed["testing"].startswith(SUMMARY_MARK) and len(packed["testing"]) < 200
+
+    # 予算が足りなければ要約は入れない
+    assert json.loads(pack_sections(table, ["api"], budget=4)) == {"api": "GET /tasks"}
+
+    # 対象セクションだけで予算を超えたら比例して切り詰める
+    big = {"api": "a" * 4000, "data_model": "b" * 1000}
+    packed = json.loads(pack_sections(big, ["api", "data_model"], budget=100))
+    assert packed["api"].endswith(TRIM_MARK) and packed["data_model"].endswith(TRIM_MARK)
+    assert len(packed["api"]) > len(packed["data_model"])
+    assert sum(len(v) for v in packed.values()) <= 100 * 4 + 2 * len(TRIM_MARK)
+
+
+def test_sections_prompt_without_matching_sections_sends_everything():
+    assert json.loads(sections_prompt("free form design", "main.py")) == {"design": "free form design"}
+    assert sections_prompt("{}", "main.py") == "{}"
+
+
+def test_shared_prefix_is_identical_across_files(monkeypatch):
+    from langgraph_v21 import graph_build
+
+    monkeypatch.setattr(graph_build.config, "SHARED_PROMPT_PREFIX", True)
+    state = {"sections": '{"api": "GET /tasks", "frontend": "cards"}', "files": {"main.py": "app = FastAPI()"}}
+    main, schemas, tests = (graph_build.build_file_prompt(state, k) for k in ("main.py", "schemas.py", "tests/test_main.py"))
+    assert main[0] == schemas[0] == tests[0] and main[0]["role"] == "system"
+    assert "GET /tasks" in main[0]["content"] and "cards" in main[0]["content"]
+    assert tests[1]["content"].startswith("Generate `tests/test_main.py`. Focus on these sections: api, testing.")
+    assert "Existing `main.py`:\napp = FastAPI()" in tests[1]["content"]
+
+    monkeypatch.setattr(graph_build.config, "SHARED_PROMPT_PREFIX", False)
+    assert isinstance(graph_build.build_file_prompt(state, "main.py"), str)
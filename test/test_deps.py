@@ -0,0 +1,41 @@
+import os
+
+from langgraph_v21 import deps
+from langgraph_v21.deps import scan_dependencies
+
+
+def test_scan_dependencies(tmp_path, monkeypatch):
+    (tmp_path / "routes").mkdir()
+    (tmp_path / "frontend" / "node_modules" / "x").mkdir(parents=True)
+    (tmp_path / "main.py").write_text(
+        "import datetime, typing\nfrom __future__ import annotations\n"
+        "from fastapi import FastAPI\nfrom routes.task import router\nimport schemas\n", encoding="utf-8")
+    (tmp_path / "schemas.py").write_text("from pydantic import BaseModel\nfrom . import x\n", encoding="utf-8")
+    (tmp_path / "routes" / "task.py").write_text("import sqlalchemy.orm\n", encoding="utf-8")
+    (tmp_path / "broken.py").write_text("import requests\ndef f(:\n", encoding="utf-8")
+    (tmp_path / "frontend" / "node_modules" / "x" / "setup.py").write_text("import numpy\n", encoding="utf-8")
+    (tmp_path / "frontend" / "package.json").write_text('{"dependencies": {"react": "^18"}}', encoding="utf-8")
+
+    result = scan_dependencies(str(tmp_path))
+    assert result == {"python": ["fastapi", "pydantic", "sqlalchemy"], "node": {"react": "^18"}}
+
+    # 変更のないファイルは再解析しない
+    parsed = []
+    monkeypatch.setattr(deps, "_import_roots", lambda text: parsed.append(text) or frozenset())
+    assert scan_dependencies(str(tmp_path)) == result
+    assert parsed == []
+    (tmp_path / "schemas.py").write_text("import httpx\n", encoding="utf-8")
+    os.utime(tmp_path / "schemas.py", ns=(1, 1))
+    scan_dependencies(str(tmp_path))
+    assert parsed == ["import httpx\n"]
+
+
+def test_write_requirements_only_when_changed(tmp_path):
+    assert deps.write_requirements(str(tmp_path), ["pydantic", "fastapi"])
+    path = tmp_path / "requirements.txt"
+    assert path.read_text(encoding="utf-8") == "fastapi\npydantic"
+    os.utime(path, ns=(1, 1))
+    # 同じ内容なら書かない（mtime が変わるとダッシュボードの索引・zip の指紋が無効になる）
+    assert not deps.write_requirements(str(tmp_path), ["fastapi", "pydantic"])
+    assert path.stat().st_mtime_ns == 1
+    assert deps.write_requirements(str(tmp_path), ["fastapi"])
@@ -0,0 +1,54 @@
+import json
+
+from langgraph_v21 import graph_build
+
+SECTIONS = json.dumps({"title": "Todo", "api": "CRUD", "entities": ["Task", "UserProfile", "task"]})
+MODELS = (
+    "from sqlalchemy import Column, Integer\nfrom sqlalchemy.orm import declarative_base\nBase = declarative_base()\n"
+    "class Task(Base):\n    __tablename__ = 'tasks'\n    id = Column(Integer, primary_key=True)\n"
+)
+
+
+def test_file_plan_follows_entities():
+    plan = graph_build.file_plan(SECTIONS)
+    assert graph_build.entity_names(SECTIONS) == ["task", "user_profile"]
+    assert {"routes/task.py", "routes/user_profile.py", "frontend/src/components/UserProfileCard.jsx"} <= set(plan)
+    assert graph_build.file_dependencies(tuple(plan))["tests/test_main.py"] == [
+        "main.py", "routes/task.py", "routes/user_profile.py"]
+    assert "routes/task.py" in graph_build.file_plan("{}")
+
+
+def test_build_runs_db_branch_alongside_generation(monkeypatch, tmp_path):
+    monkeypatch.setattr("config.VALIDATE_BUILD", False)
+    prompts = {}
+
+    def fake_safe_invoke(prompt, **kw):
+        if "database schema" in prompt:
+            return json.dumps({"db_type": "postgresql", "tables": [{"name": "tasks", "columns": [{"name": "id"}]}]})
+        return SECTIONS
+
+    async def fake_async_invoke(prompt, **kw):
+        text = json.dumps(prompt)
+        prompts[text] = prompt
+        if "`models.py` using SQLAlchemy" in text:
+            return MODELS
+        return "x = 1\n" if "`tests/test_main.py`" not in text else "def test_ok():\n    assert True\n"
+
+    monkeypatch.setattr(graph_build, "safe_invoke", fake_safe_invoke)
+    monkeypatch.setattr(graph_build, "async_invoke", fake_async_invoke)
+    result = graph_build.build(4).invoke(graph_build.prepare_state("todo app", out_dir=str(tmp_path)))
+
+    for key in ("routes/user_profile.py", "models.py", "database.py", "docker-compose.yml"):
+        assert (tmp_path / key).exists(), key
+    assert "POSTGRES_USER: app" in (tmp_path / "docker-compose.yml").read_text(encoding="utf-8")
+    assert {"models.py", "database.py", "docker-compose.yml"} <= set(result["plan"])
+    tests_prompt = next(p for t, p in prompts.items() if "Generate `tests/test_main.py`" in t)
+    assert "Existing `routes/user_profile.py`" in tests_prompt
+    assert "- routes/user_profile.py" in tests_prompt
+
+
+def test_record_structure_falls_back_to_file_plan(tmp_path):
+    from langgraph_v21.structure_writer import load_structure, record_structure
+
+    record_structure({"project_dir": str(tmp_path), "sections": SECTIONS, "deps": {"python": [], "node": {}}})
+    assert load_structure(str(tmp_path))["file_keys"] == graph_build.file_plan(SECTIONS)
@@ -0,0 +1,46 @@
+from typing import TypedDict
+
+from langgraph.graph import StateGraph
+
+import config
+from langgraph_v21 import graph_build, graph_registry
+from langgraph_v21.checkpoint import open_checkpointer, run_config
+from langgraph_v21.refactor_graph import get_refactor_graph
+
+
+class S(TypedDict):
+    n: int
+
+
+def test_build_graph_is_compiled_once_per_configuration(monkeypatch):
+    graph_registry.clear()
+    calls = []
+    real_build = graph_build.build
+    monkeypatch.setattr(graph_build, "build", lambda g, checkpointer=None: calls.append(g) or real_build(g))
+
+    first = graph_build.get_build_graph(4)
+    assert graph_build.get_build_graph(4) is first
+    assert graph_build.get_build_graph(2) is not first
+    assert calls == [4, 2]
+    assert get_refactor_graph() is get_refactor_graph()
+
+    shapes = {t["key"][0]: t for t in graph_registry.topology("build")}
+    assert {"parse", "parse_db", "generate", "gen_db", "check", "validate", "finalize"} <= set(shapes[2]["nodes"])
+    assert ("check", "validate", True) in shapes[2]["edges"]
+
+
+def test_checkpointer_is_attached_per_build(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    graph_registry.clear()
+    builder = StateGraph(S)
+    builder.add_node("inc", lambda s: {"n": s["n"] + 1})
+    builder.set_entry_point("inc")
+    builder.set_finish_point("inc")
+    shared = graph_registry.compiled("toy", builder.compile)
+
+    saver = open_checkpointer(str(tmp_path / "a"))
+    graph = graph_registry.with_checkpointer(shared, saver)
+    assert graph.invoke({"n": 1}, run_config()) == {"n": 2}
+    assert shared.checkpointer is None
+    assert graph.get_state(run_config()).values == {"n": 2}
+    assert graph_registry.with_checkpointer(shared, None) is shared
@@ -0,0 +1,27 @@
+import asyncio
+from langgraph_v21 import graph_build
+
+
+def test_gen_skips_unchanged_and_regenerates_flagged(monkeypatch, tmp_path):
+    calls = []
+
+    async def fake_async_invoke(prompt: str, use_cache: bool = True) -> str:
+        calls.append(use_cache)
+        return "print('new')"
+    monkeypatch.setattr('langgraph_v21.graph_build.async_invoke', fake_async_invoke)
+
+    state = {"sections": "{}", "project_dir": str(tmp_path)}
+    for key in ("a.py", "b.py"):
+        (tmp_path / key).write_text("print('old')", encoding="utf-8")
+    state["fingerprints"] = {
+        k: graph_build.file_fingerprint(k, graph_build.build_file_prompt(state, k)) for k in ("a.py", "b.py")
+    }
+    state["flagged"] = ["b.py"]
+
+    results = asyncio.run(graph_build.gen_files_parallel(state, ["a.py", "b.py"]))
+    assert results == {"a.py": "print('old')", "b.py": "print('new')"}
+    assert calls == [False]
+
+def test_schedule_layers_respects_dependencies():
+    layers = graph_build.schedule_layers(["t", "a", "b"], {"t": ["a", "b"], "a": ["missing"]})
+    assert layers == [["a", "b"], ["t"]]
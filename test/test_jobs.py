@@ -0,0 +1,69 @@
+import threading
+
+from langgraph_v21.jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue
+
+
+def test_jobs_run_in_order_and_persist(tmp_path):
+    order = []
+
+    def echo(payload, ctx):
+        order.append(payload["n"])
+        ctx.progress(f"step {payload['n']}")
+        ctx.token("ab")
+        ctx.token("c")
+        return {"n": payload["n"]}
+
+    def boom(payload, ctx):
+        raise ValueError("bad")
+
+    path = str(tmp_path / "jobs.sqlite3")
+    queue = JobQueue(path, handlers={"echo": echo, "boom": boom})
+    first = queue.submit("echo", {"n": 1})
+    failing = queue.submit("boom", {})
+    second = queue.submit("echo", {"n": 2})
+    assert queue.position(second) == 2
+    while queue.run_one():
+        pass
+    assert order == [1, 2]
+
+    # 別インスタンス（ページ再読み込み・再起動後）からも結果を読める
+    reopened = JobQueue(path, handlers={})
+    job = reopened.get(first)
+    assert job["status"] == DONE and job["result"] == {"n": 1}
+    assert job["progress"] == ["step 1"] and job["partial"] == "abc"
+    assert reopened.get(failing)["status"] == FAILED
+    assert reopened.get(failing)["error"] == "ValueError: bad"
+
+
+def test_recover_requeues_jobs_of_dead_process(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), handlers={"echo": lambda p, c: {}})
+    job_id = queue.submit("echo", {})
+    queue._update(job_id, status=RUNNING, owner=2 ** 22 + 12345)
+    queue.recover()
+    assert queue.get(job_id)["status"] == QUEUED
+    assert queue.get(job_id)["payload"] == {"resume": True}
+
+
+def test_workers_bound_concurrency(tmp_path):
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+
+    def slow(payload, ctx):
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        threading.Event().wait(0.05)
+        with lock:
+            running["now"] -= 1
+        return {}
+
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), workers=2, handlers={"slow": slow})
+    ids = [queue.submit("slow", {}) for _ in range(6)]
+    queue.start()
+    for _ in range(200):
+        if all(queue.get(i)["status"] == DONE for i in ids):
+            break
+        threading.Event().wait(0.05)
+    queue.stop()
+    assert all(queue.get(i)["status"] == DONE for i in ids)
+    assert running["max"] == 2
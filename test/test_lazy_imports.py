@@ -0,0 +1,25 @@
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.bench_import import HEAVY_PACKAGES, LIGHT_MODULES
+
+CODE = "import sys, {module}; print(','.join(sorted({{m.split('.')[0] for m in sys.modules}})))"
+
+
+@pytest.mark.parametrize("module", [m for m in LIGHT_MODULES if m.startswith("langgraph_v21.")])
+def test_light_modules_do_not_import_heavy_packages(module):
+    res = subprocess.run([sys.executable, "-c", CODE.format(module=module)],
+                         capture_output=True, text=True, check=True)
+    assert set(res.stdout.strip().split(",")) & HEAVY_PACKAGES == set()
+
+
+def test_checkpoint_saver_is_built_on_first_use(tmp_path, monkeypatch):
+    import config
+    from langgraph_v21 import checkpoint
+
+    monkeypatch.setattr(config, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    saver = checkpoint.open_checkpointer(str(tmp_path))
+    assert isinstance(saver, checkpoint.FileCheckpointSaver)
+    assert checkpoint.saver_class() is checkpoint.FileCheckpointSaver
@@ -0,0 +1,42 @@
+import time
+from langgraph_v21.llm_cache import LLMCache, make_key
+
+
+def test_make_key_normalizes_whitespace():
+    a = make_key("m", "http://x/", "line1  \r\nline2\n")
+    b = make_key("m", "http://x", "line1\nline2")
+    assert a == b
+    assert a != make_key("other", "http://x", "line1\nline2")
+
+def test_make_key_messages():
+    msgs = [{"role": "user", "content": "hi "}]
+    assert make_key("m", "u", msgs) == make_key("m", "u", [{"role": "user", "content": "hi"}])
+    assert make_key("m", "u", msgs) != make_key("m", "u", "hi")
+
+def test_cache_hit_miss(tmp_path):
+    cache = LLMCache(str(tmp_path / "c.sqlite3"))
+    assert cache.get("k") is None
+    cache.put("k", "v")
+    assert cache.get("k") == "v"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_cache_lru_eviction(tmp_path):
+    cache = LLMCache(str(tmp_path / "c.sqlite3"), max_entries=2)
+    cache.put("a", "1")
+    time.sleep(0.01)
+    cache.put("b", "2")
+    time.sleep(0.01)
+    cache.get("a")  # a を最近使ったことにする
+    time.sleep(0.01)
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+
+def test_cache_max_age_and_bypass(tmp_path):
+    cache = LLMCache(str(tmp_path / "c.sqlite3"), max_age=0)
+    cache.put("k", "v")
+    time.sleep(0.01)
+    assert cache.get("k") is None
+    bypass = LLMCache(str(tmp_path / "d.sqlite3"), bypass=True)
+    bypass.put("k", "v")
+    assert bypass.get("k") is None
@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import config
+
+from langgraph_v21 import llm
+from langgraph_v21.llm import stream_chat
+from langgraph_v21.sanitizer import ThinkStripper, strip_think
+
+
+@pytest.fixture
+def ollama_stub():
+    """/api/chat をストリーミング応答する最小のスタブサーバー。"""
+    stub = {"tokens": ["<thi", "nk>reason", "ing</th", "ink>print(", "'ok')"],
+            "fail_first": 0, "delay": 0.0, "requests": 0, "active": 0, "max_active": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            assert body["stream"] is True
+            with lock:
+                stub["requests"] += 1
+                stub["active"] += 1
+                stub["max_active"] = max(stub["max_active"], stub["active"])
+                fail = stub["requests"] <= stub["fail_first"]
+            try:
+                if fail:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                for t in stub["tokens"]:
+                    time.sleep(stub["delay"])
+                    self.wfile.write((json.dumps({"message": {"content": t}, "done": False}) + "\n").encode())
+                    self.wfile.flush()
+                self.wfile.write((json.dumps({"message": {"content": ""}, "done": True}) + "\n").encode())
+            finally:
+                with lock:
+                    stub["active"] -= 1
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub["url"] = f"http://127.0.0.1:{server.server_port}"
+    yield stub
+    server.shutdown()
+
+def test_think_stripper_split_tags():
+    s = ThinkStripper()
+    out = s.feed("a<thi") + s.feed("nk>hidden</thi") + s.feed("nk>b<") + s.feed("c") + s.flush()
+    assert out == "ab<c"
+
+def test_stream_chat_yields_tokens(ollama_stub):
+    tokens = list(stream_chat("hi", model="m", base_url=ollama_stub["url"]))
+    assert len(tokens) == 5
+    assert "".join(strip_think(tokens)) == "print('ok')"
+
+def test_stream_chat_retries_transient_errors(monkeypatch, ollama_stub):
+    monkeypatch.setattr("config.LLM_RETRY_BACKOFF", 0.01)
+    ollama_stub["fail_first"] = 2
+    assert len(list(stream_chat("hi", base_url=ollama_stub["url"]))) == 5
+    assert ollama_stub["requests"] == 3
+
+def test_stream_chat_deadline(ollama_stub):
+    ollama_stub["delay"] = 0.2
+    with pytest.raises(TimeoutError):
+        list(stream_chat("hi", base_url=ollama_stub["url"], deadline=0.3))
+
+def test_stream_chat_deadline_starts_after_slot(monkeypatch, ollama_stub):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(llm, "_slots", {ollama_stub["url"]: slots})
+    slots.acquire()
+    # 枠を期限より長く塞いでおき、待っていた呼び出しが期限切れにならないことを確かめる
+    threading.Timer(0.5, slots.release).start()
+    assert len(list(stream_chat("hi", base_url=ollama_stub["url"], deadline=0.3))) == 5
+
+    ollama_stub["delay"] = 0.2
+    with pytest.raises(TimeoutError, match=r"\(0.3s\)"):
+        list(stream_chat("hi", base_url=ollama_stub["url"], deadline=0.3))
+
+def test_stream_chat_parallel_limit(monkeypatch, ollama_stub):
+    monkeypatch.setattr(llm, "_slots", {ollama_stub["url"]: threading.BoundedSemaphore(2)})
+    ollama_stub["delay"] = 0.05
+    threads = [threading.Thread(target=lambda: list(stream_chat("hi", base_url=ollama_stub["url"])))
+               for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert ollama_stub["requests"] == 6
+    assert ollama_stub["max_active"] <= 2
+
+def test_set_parallelism_caps_each_server(monkeypatch):
+    monkeypatch.setattr(llm, "_slots", {})
+    monkeypatch.setattr(llm, "_parallelism", None)
+    llm.set_parallelism(3)
+    # 上限はサーバーごと（後から使い始めたサーバーにも同じ値がかかる）
+    for url in (config.OLLAMA_BASE_URL.rstrip("/"), "http://gpu-2:11434"):
+        slots = llm.get_slots(url)
+        assert all(slots.acquire(blocking=False) for _ in range(3)) and not slots.acquire(blocking=False)
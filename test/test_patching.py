@@ -0,0 +1,88 @@
+from langgraph_v21 import refactor_graph
+from langgraph_v21.patching import (
+    PatchError, apply_hunks, parse_hunks, partition_hunks, select_units, splice, split_units, unit_diff,
+)
+import pytest
+
+CODE = "import os\n\n" + "".join(
+    f"def handler_{i}(request):\n    value = request.get({i})\n    return value\n\n\n" for i in range(80)
+)
+
+
+def test_split_and_select_units():
+    header_end, units = split_units(CODE)
+    assert header_end == 1 and len(units) == 80
+    assert (units[3].name, units[3].start, units[3].end) == ("handler_3", 18, 20)
+    assert [u.name for u in select_units(units, "handler_3 で None を返さないように")] == ["handler_3"]
+    assert select_units(units, "add type hints everywhere") == []
+    # 名前が挙がっていなければ、使っている識別子が一致してもファイル全体の改修にする
+    assert select_units(units, "request.get の戻り値を検証する") == []
+    assert split_units("def f(:\n") is None
+
+
+def test_apply_hunks_ignores_line_numbers_and_prose():
+    unit = "def f(x):\n    y = x + 1\n    return y\n"
+    hunks = parse_hunks(
+        "Here is the patch:\n```diff\n--- a/m.py\n+++ b/m.py\n@@ -40,2 +40,2 @@\n     y = x + 1\n"
+        "-    return y\n+    return y * 2\n```\nDone."
+    )
+    assert apply_hunks(unit, hunks) == "def f(x):\n    y = x + 1\n    return y * 2\n"
+    with pytest.raises(PatchError):
+        apply_hunks(unit, parse_hunks("@@ -1 +1 @@\n-    missing\n+    other\n"))
+
+
+def test_splice_adds_imports_and_diffs_only_changed_units():
+    header_end, units = split_units(CODE)
+    unit = units[5]
+    hunks, imports = partition_hunks(parse_hunks(
+        "@@ -1,1 +1,2 @@\n import os\n+import json\n"
+        "@@ -2,2 +2,2 @@\n     value = request.get(5)\n-    return value\n+    return json.dumps(value)\n"
+    ))
+    assert imports == ["import json"]
+    revised, changes = splice(CODE, header_end, imports, {(unit.start, unit.end): apply_hunks(unit.code, hunks)})
+    assert revised.startswith("import os\nimport json\n")
+    assert "    return json.dumps(value)" in revised and revised.count("json.dumps") == 1
+
+    diff = unit_diff(CODE, changes, "app.py")
+    assert diff.splitlines()[:4] == ["--- a/app.py", "+++ b/app.py", "@@ -1,0 +2 @@", "+import json"]
+    assert "@@ -28,3 +29,3 @@" in diff and "+    return json.dumps(value)" in diff
+
+
+def test_run_refactor_patches_selected_units(monkeypatch):
+    calls = []
+
+    def fake_stream(messages, target_file, name, on_token=None):
+        calls.append(name)
+        return "@@ -3 +3 @@\n     value = request.get(7)\n-    return value\n+    return value or 0\n"
+
+    monkeypatch.setattr(refactor_graph, "stream_cached", fake_stream)
+    state = refactor_graph.prepare_refactor_state(".", "routes.py", CODE, "handler_7 should never return None", "{}")
+    result = refactor_graph.run_refactor(state)
+    assert calls == ["routes.py::handler_7"]
+    assert result["revised_code"] == CODE.replace("get(7)\n    return value\n", "get(7)\n    return value or 0\n")
+    assert "+    return value or 0" in result["diff"]
+
+
+def test_run_refactor_keeps_units_that_break_the_file(monkeypatch):
+    def fake_stream(messages, target_file, name, on_token=None):
+        if name == "routes.py":
+            return CODE.replace("return value", "return value or 0")
+        if name.endswith("handler_7"):
+            return "def handler_7(request:\n    return request\n"  # 差分でなく、構文エラーのユニット全体
+        return "@@ -3 +3 @@\n     value = request.get(8)\n-    return value\n+    return value or 0\n"
+
+    monkeypatch.setattr(refactor_graph, "stream_cached", fake_stream)
+    state = refactor_graph.prepare_refactor_state(".", "routes.py", CODE, "fix handler_7 and handler_8", "{}")
+    result = refactor_graph.run_refactor(state)
+    assert result["revised_code"] == CODE.replace("get(8)\n    return value\n", "get(8)\n    return value or 0\n")
+    assert any("handler_7" in p and "元のまま" in p for p in result["progress"])
+
+    # ユニットごとには通っても、組み戻したファイルが構文解析できなければファイル全体の改修に切り替える
+    monkeypatch.setattr(refactor_graph, "parses", lambda code: code.count("or 0") < 2)
+    monkeypatch.setattr(refactor_graph, "stream_cached", lambda messages, target_file, name, on_token=None: (
+        CODE.replace("return value", "return value or 0") if name == "routes.py" else
+        f"@@ -3 +3 @@\n     value = request.get({name[-1]})\n-    return value\n+    return value or 0\n"))
+    result = refactor_graph.run_refactor(
+        refactor_graph.prepare_refactor_state(".", "routes.py", CODE, "fix handler_7 and handler_8", "{}"))
+    assert result["revised_code"] == CODE.replace("return value", "return value or 0").rstrip()
+    assert "diff" not in result
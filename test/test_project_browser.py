@@ -0,0 +1,70 @@
+import zipfile
+
+from langgraph_v21 import project_browser
+from langgraph_v21.project_browser import (
+    build_zip, index_project, list_projects, load_json, paginate, read_preview, summarize_state,
+)
+import pytest
+
+
+def test_index_is_reused_until_a_directory_changes(tmp_path, monkeypatch):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "main.py").write_text("print(1)\n", encoding="utf-8")
+    (tmp_path / "src" / "App.jsx").write_text("x", encoding="utf-8")
+    (tmp_path / "node_modules" / "dep.js").write_text("x", encoding="utf-8")
+    assert [e["path"] for e in index_project(tmp_path)] == ["main.py", "src/App.jsx"]
+
+    scans = []
+    real_scan = project_browser._scan
+    monkeypatch.setattr(project_browser, "_scan", lambda root: scans.append(root) or real_scan(root))
+    index_project(tmp_path)
+    assert scans == []
+    (tmp_path / "src" / "Card.jsx").write_text("y", encoding="utf-8")
+    assert [e["path"] for e in index_project(tmp_path)][-1] == "src/Card.jsx"
+    assert len(scans) == 1
+
+
+def test_paginate_and_preview(tmp_path):
+    entries = [{"path": f"f{i:03}.py", "size": 1, "mtime": 0.0} for i in range(120)]
+    page, pages = paginate(entries, 3)
+    assert pages == 3 and [e["path"] for e in page] == [f"f{i:03}.py" for i in range(100, 120)]
+    assert paginate(entries, 9, query="F11")[0][0]["path"] == "f110.py"
+
+    (tmp_path / "big.txt").write_text("a" * 50, encoding="utf-8")
+    assert read_preview(tmp_path, "big.txt", limit=10) == ("a" * 10, True)
+    with pytest.raises(ValueError):
+        read_preview(tmp_path, "../outside.txt")
+
+
+def test_zip_and_cached_json(tmp_path, monkeypatch):
+    monkeypatch.setattr(project_browser, "ZIP_DIR", tmp_path / "zips")
+    app = tmp_path / "app"
+    (app / "routes").mkdir(parents=True)
+    (app / "routes" / "task.py").write_text("x = 1\n", encoding="utf-8")
+    (app / "structure.json").write_text('{"written": ["a"]}', encoding="utf-8")
+
+    first = build_zip(app, "proj")
+    assert build_zip(app, "proj") == first
+    with zipfile.ZipFile(first) as zf:
+        assert sorted(zf.namelist()) == ["routes/task.py", "structure.json"]
+    # 上書き保存（ディレクトリの mtime は変わらない）でも作り直す
+    (app / "routes" / "task.py").write_text("x = 22\n", encoding="utf-8")
+    second = build_zip(app, "proj")
+    assert second != first
+    # 古い zip と一時ファイルは残さない（名前が前方一致する別プロジェクトの zip は消さない）
+    other = build_zip(app, "proj-2")
+    assert sorted(p.name for p in (tmp_path / "zips").iterdir()) == sorted([second.name, other.name])
+
+    data = load_json(app / "structure.json")
+    assert load_json(app / "structure.json") is data
+    (app / "structure.json").write_text('{"written": ["a", "b"]}', encoding="utf-8")
+    assert load_json(app / "structure.json") == {"written": ["a", "b"]}
+    assert list_projects(tmp_path) == ["app", "zips"]
+
+
+def test_summarize_state_hides_file_bodies():
+    state = {"files": {"main.py": "x" * 10}, "design": "abc", "written": ["main.py"], "check_result": "OK"}
+    assert summarize_state(state) == {
+        "files": {"main.py": "<10 chars>"}, "design": "<3 chars>", "written": ["main.py"], "check_result": "OK",
+    }
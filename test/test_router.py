@@ -0,0 +1,64 @@
+import pytest
+
+from langgraph_v21 import router as router_mod
+from langgraph_v21.router import ModelRouter, routing_for
+
+TIERS = {
+    "default": {"model": "big", "base_urls": ["http://a", "http://b"]},
+    "fast": {"model": "small", "base_urls": ["http://a"]},
+}
+
+
+def test_routes_per_file_key_and_falls_back():
+    r = ModelRouter(TIERS, {"frontend/index.html": "fast"})
+    assert [b.model for b in r.candidates("frontend/index.html")] == ["small", "big"]
+    assert [b.model for b in r.candidates("/abs/proj/frontend/index.html")] == ["small", "big"]
+    assert [b.model for b in r.candidates("main.py")] == ["big"]
+    assert r.cache_identity("main.py") == ("big", "http://a")
+
+def test_stream_uses_current_file_and_reports_latency(monkeypatch):
+    calls = []
+
+    def fake_stream_chat(prompt, model, base_url):
+        calls.append(model)
+        if model == "small":
+            raise RuntimeError("model 'small' not found")
+        yield "ok"
+    monkeypatch.setattr(router_mod, "stream_chat", fake_stream_chat)
+
+    r = ModelRouter(TIERS, {"frontend/index.html": "fast"})
+    with routing_for("frontend/index.html"):
+        assert list(r.stream("p")) == ["ok"]
+    assert calls == ["small", "big"]
+    report = {row["model"]: row for row in r.report()}
+    assert report["small"]["errors"] == 1 and report["big"]["calls"] == 1
+
+def test_least_loaded_base_url():
+    r = ModelRouter(TIERS, {})
+    first = r.candidates()[0]
+    with r.track(first):
+        assert r.candidates()[0].base_url != first.base_url
+
+def test_requires_default_tier():
+    with pytest.raises(ValueError):
+        ModelRouter({"fast": TIERS["fast"]}, {})
+
+def test_fallback_replies_are_not_cached(monkeypatch):
+    from langgraph_v21 import graph_build
+
+    def fake_stream_chat(prompt, model, base_url):
+        if model == "small":
+            raise RuntimeError("model 'small' not found")
+        yield "from big"
+    stored = {}
+    cache = type("Cache", (), {"get": lambda self, k: stored.get(k), "put": lambda self, k, v: stored.update({k: v})})()
+    monkeypatch.setattr(router_mod, "stream_chat", fake_stream_chat)
+    monkeypatch.setattr(graph_build, "get_router", lambda: ModelRouter(TIERS, {"frontend/index.html": "fast"}))
+    monkeypatch.setattr(graph_build, "get_cache", lambda: cache)
+
+    with routing_for("frontend/index.html"):
+        assert graph_build.safe_invoke("p") == "from big"
+    assert stored == {}
+    with routing_for("main.py"):
+        graph_build.safe_invoke("p")
+    assert list(stored.values()) == ["from big"]
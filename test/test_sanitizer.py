@@ -0,0 +1,32 @@
+import random
+import re
+
+from langgraph_v21.sanitizer import Sanitizer, clean_llm_output
+
+
+def legacy_clean(text: str) -> str:
+    """置き換え前の 4 段階正規表現処理（互換性確認用）。"""
+    text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+    idx = text.rfind('```')
+    text = text[:idx] if idx != -1 else text
+    text = re.sub(r'^```[^\n]*\n', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\n```', '\n', text)
+    text = re.sub(r'`([^`]*)`', lambda m: f"`{m.group(1).strip()}`", text)
+    return text.strip()
+
+def test_clean_typical_response():
+    raw = "<think>plan\n```x```</think>Here:\n```python\nx = ` a `\n```\nDone."
+    assert clean_llm_output(raw) == "Here:\nx = `a`"
+
+def test_matches_legacy_pipeline_on_random_input():
+    rng = random.Random(0)
+    atoms = ["```", "```py\n", "\n", "`", " ", "a", "b c", "<think>t</think>", "\n```", "x\n"]
+    for _ in range(3000):
+        raw = "".join(rng.choice(atoms) for _ in range(rng.randint(0, 20)))
+        expected = legacy_clean(raw)
+        assert clean_llm_output(raw) == expected, raw
+        # 任意の位置で分割して feed しても結果は同じ
+        s = Sanitizer()
+        cuts = sorted(rng.sample(range(len(raw) + 1), min(3, len(raw) + 1)))
+        pieces = [raw[i:j] for i, j in zip([0] + cuts, cuts + [len(raw)])]
+        assert "".join(s.feed(p) for p in pieces) + s.finish() == expected, raw
@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from langgraph_v21 import graph_build
+
+
+def test_schedule_layers_orders_and_rejects_cycles():
+    layers = graph_build.schedule_layers(["t", "m", "r", "s"], {"t": ["m", "r"], "r": ["s"]})
+    assert layers == [["m", "s"], ["r"], ["t"]]
+    with pytest.raises(ValueError):
+        graph_build.schedule_layers(["a", "b"], {"a": ["b"], "b": ["a"]})
+
+
+def test_gen_files_parallel_caps_concurrency_and_waits_for_dependencies(monkeypatch, tmp_path):
+    active = {"now": 0, "max": 0}
+    finished = []
+
+    async def fake_async_invoke(prompt, use_cache=True):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        text = str(prompt)
+        finished.append(next(k for k in keys if f"Generate `{k}`" in text))
+        return "x = 1\n"
+
+    monkeypatch.setattr("config.SHARED_PROMPT_PREFIX", False)
+    monkeypatch.setattr(graph_build, "async_invoke", fake_async_invoke)
+    keys = [f"f{i}.py" for i in range(6)] + ["t.py"]
+    state = {"sections": "{}", "project_dir": str(tmp_path)}
+    results = asyncio.run(graph_build.gen_files_parallel(state, keys, 2, {"t.py": ["f0.py", "f5.py"]}))
+
+    assert set(results) == set(keys)
+    assert active["max"] == 2
+    assert finished.index("t.py") > max(finished.index("f0.py"), finished.index("f5.py"))
@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+import pytest
+
+from langgraph_v21 import telemetry
+from langgraph_v21.telemetry import critical_path, load_trace, setup_logging, span, traced_node
+
+
+def test_spans_nest_and_critical_path(tmp_path):
+    trace = setup_logging(str(tmp_path), build_id="b1")
+
+    async def layer(state):
+        async def gen(key, delay):
+            with span("file", key):
+                with span("llm", key, cache="miss") as s:
+                    await asyncio.sleep(delay)
+                    s["ttft"] = 0.01
+                    telemetry.count("retries")
+        await asyncio.gather(gen("a.py", 0.01), gen("b.py", 0.05))
+        return state
+
+    node = traced_node("gen_layer_0", lambda s: asyncio.run(layer(s)), layer)
+    node.invoke({})
+    with pytest.raises(ValueError):
+        traced_node("check", lambda s: (_ for _ in ()).throw(ValueError("x"))).invoke({})
+    assert trace.next_step() == 1
+
+    lines = [json.loads(l) for l in (tmp_path / telemetry.TRACE_FILE).read_text().splitlines()]
+    assert {l["build_id"] for l in lines} == {"b1"}
+    spans = load_trace(str(tmp_path))
+    rows = critical_path(spans)
+    assert [r["node"] for r in rows] == ["gen_layer_0", "check"]
+    assert rows[0]["slowest_file"] == "b.py" and rows[0]["ttft"] == 0.01
+    assert rows[1]["status"] == "error"
+    assert all(s["retries"] == 1 for s in spans if s["kind"] == "llm")
+
+
+def test_concurrent_builds_count_steps_separately():
+    import contextvars
+
+    def run():
+        trace = setup_logging()
+        return [trace.next_step() for _ in range(3)]
+
+    assert contextvars.copy_context().run(run) == [1, 2, 3]
+    assert contextvars.copy_context().run(run) == [1, 2, 3]
@@ -0,0 +1,101 @@
+import json
+import sys
+
+import pytest
+
+from langgraph_v21 import graph_build, validation
+from langgraph_v21.validation import check_package_json, validate_project, validate_projects, venv_python
+
+
+def make_project(root, test_body="def test_ok():\n    assert 1 + 1 == 2\n", main="app = None\n"):
+    (root / "tests").mkdir(parents=True)
+    (root / "frontend").mkdir()
+    (root / "main.py").write_text(main, encoding="utf-8")
+    (root / "tests" / "test_main.py").write_text(test_body, encoding="utf-8")
+    (root / "frontend" / "package.json").write_text(json.dumps({
+        "name": "app", "scripts": {"dev": "vite"}, "dependencies": {"react": "^18.2.0"},
+    }), encoding="utf-8")
+
+
+def test_package_json_shape(tmp_path):
+    make_project(tmp_path)
+    assert check_package_json(str(tmp_path)) == ("passed", "ok")
+    (tmp_path / "frontend" / "package.json").write_text('{"name": "x", "dependencies": ["react"]}', encoding="utf-8")
+    status, detail = check_package_json(str(tmp_path))
+    assert status == "failed" and "dependencies" in detail and "scripts" in detail
+    (tmp_path / "frontend" / "package.json").write_text("{", encoding="utf-8")
+    assert check_package_json(str(tmp_path))[0] == "failed"
+
+
+def test_validate_runs_tests_and_reports_failures(tmp_path, monkeypatch):
+    monkeypatch.setattr("config.VALIDATION_PYTHON", sys.executable)
+    good, bad = tmp_path / "good", tmp_path / "bad"
+    make_project(good)
+    make_project(bad, test_body="from main import missing\n\ndef test_x():\n    pass\n",
+                 main="raise RuntimeError('boom at import')\n")
+    reports = validate_projects([str(good), str(bad)], workers=2)
+    checks = {r["project_dir"]: {c["name"]: c for c in r["checks"]} for r in reports}
+
+    assert checks[str(good)]["tests"]["status"] == "passed"
+    assert checks[str(bad)]["tests"]["status"] == "failed"
+    assert checks[str(bad)]["app_import"]["status"] == "failed"
+    assert "boom at import" in checks[str(bad)]["app_import"]["detail"]
+    assert not reports[1]["ok"]
+
+    issues = graph_build.validation_issues(reports[1], ["main.py", "tests/test_main.py", "schemas.py"])
+    assert {i["file"] for i in issues} == {"main.py", "tests/test_main.py"}
+
+
+def test_validate_times_out(tmp_path, monkeypatch):
+    monkeypatch.setattr("config.VALIDATION_PYTHON", sys.executable)
+    monkeypatch.setattr("config.VALIDATION_TIMEOUT", 2.0)
+    make_project(tmp_path, test_body="import time\n\ndef test_slow():\n    time.sleep(30)\n")
+    report = validate_project(str(tmp_path))
+    tests = next(c for c in report["checks"] if c["name"] == "tests")
+    assert tests["status"] == "failed" and "タイムアウト" in tests["detail"]
+
+
+def test_venv_is_cached_per_requirement_set(tmp_path, monkeypatch):
+    monkeypatch.setattr("config.VALIDATION_PYTHON", None)
+    monkeypatch.setattr("config.VENV_CACHE_DIR", str(tmp_path))
+    created = []
+
+    def fake_create(root, **kw):
+        root.mkdir(parents=True)
+        created.append(root)
+
+    monkeypatch.setattr(validation.venv, "create", fake_create)
+    monkeypatch.setattr(validation.subprocess, "run", lambda *a, **kw: None)
+
+    first = venv_python(["fastapi", "pytest"])
+    assert venv_python(["pytest", "fastapi"]) == first
+    assert venv_python(["fastapi", "pytest", "sqlalchemy"]) != first
+    assert len(created) == 2
+
+
+def test_requirements_come_from_allowlist_or_pinned_file(tmp_path):
+    (tmp_path / "main.py").write_text("import fastapi\nimport yaml\n", encoding="utf-8")
+    assert validation.requirements_for(str(tmp_path)) == ["fastapi", "httpx", "pytest", "pyyaml"]
+
+    # LLM が書いた未知の import 名は pip install しない
+    (tmp_path / "extra.py").write_text("import fastapi_magic_helpers\n", encoding="utf-8")
+    with pytest.raises(validation.UnknownPackageError):
+        validation.requirements_for(str(tmp_path))
+    # 固定されていない requirements.txt（生成時に書き出すもの）は使わない
+    (tmp_path / "requirements.txt").write_text("fastapi\nfastapi_magic_helpers\n", encoding="utf-8")
+    with pytest.raises(validation.UnknownPackageError):
+        validation.requirements_for(str(tmp_path))
+
+    (tmp_path / "requirements.txt").write_text("# pinned\nfastapi==0.115.0\nuvicorn[standard]==0.30.1\n",
+                                               encoding="utf-8")
+    assert validation.requirements_for(str(tmp_path)) == [
+        "fastapi==0.115.0", "httpx", "pytest", "uvicorn[standard]==0.30.1"]
+
+
+def test_unknown_packages_are_an_environment_error(tmp_path, monkeypatch):
+    monkeypatch.setattr("config.VALIDATION_PYTHON", None)
+    make_project(tmp_path, main="import fastapi_magic_helpers\napp = None\n")
+    report = validate_project(str(tmp_path))
+    env = next(c for c in report["checks"] if c["name"] == "environment")
+    assert env["status"] == "error" and "fastapi_magic_helpers" in env["detail"]
+    assert [c["name"] for c in report["checks"]] == ["package_json", "environment"] and report["ok"]